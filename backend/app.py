@@ -1,36 +1,81 @@
 # SETUP: Imports (For Flask)
-from flask import Flask, request, jsonify
+from flask import Blueprint, Flask, current_app, g, request, jsonify, make_response, send_file, Response, stream_with_context
 from flask_cors import CORS
 
 # SETUP: Imports (For DB)
-from dba import db, User, Appointment, Treatment, Department
-from dba import ROLE_ADMIN, ROLE_DOCTOR, ROLE_PATIENT
+from dba import db, User, Appointment, Treatment, Department, DoctorSchedule, DoctorLeave, SlotHold, Job
+from dba import ArchivedAppointment
+from dba import ROLE_ADMIN, ROLE_DOCTOR, ROLE_PATIENT, DATE_FORMAT, TIME_FORMAT, TREATMENT_TEXT_LIMIT
+from dba import DEFAULT_CLINIC_ID
+from migrations import upgrade as upgrade_schema
+from config import configure_database
+import archive       # registers the archive job handler
+import booking
+import counters
+import directory
+import exports
+import imports
+import jobs
+import live
+import metrics
+import notifications
+import reports       # registers the report job handlers
+import search
+import slots
+import sync
+import tenancy
 from authutils import create_token, require_auth, admin_required, doctor_required, patient_required
-import bcrypt
+from authutils import load_profile, invalidate_user
+from pagination import PaginationError, keyset_page, page_size, page_response, NEXT_CURSOR_HEADER
+from filters import parse_date, parse_time, date_arg, int_arg, filter_appointments, filter_users
+from routing import read_replica, replica_keys
+from hashing import HashingBusy, hash_password, check_password, needs_rehash
 from sqlalchemy.exc import IntegrityError  
-
-# SETUP: Imports (Background Task Simulation)
+from sqlalchemy.orm import joinedload, selectinload
+from datetime import date as date_type, timedelta
+import os
+import shutil
 import threading
-import time
-
-# INIT: Flask app
-app = Flask(__name__)
-app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///../instance/hms.db"
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-
-db.init_app(app)
-CORS(
-    app,
-    resources={r"/*": {"origins": ["http://localhost:5173"]}},
-    supports_credentials=True,
-    allow_headers=["Content-Type", "Authorization"],
-    methods=["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],
-)
-
-# --- Force-correct handling for preflight OPTIONS (place this AFTER app = Flask(...) ) ---
-from flask import make_response
-
-@app.before_request
+import click
+
+# INIT: Routes, error handlers and CLI commands live on this blueprint;
+# create_app() below builds an app around it.
+api = Blueprint("api", __name__, cli_group=None)
+
+
+# INIT: Application factory
+# Cheap on purpose: no schema work, seeding or hashing happens here, so every
+# worker, CLI call and test starts fast. Run `flask --app app init-db` once per
+# database; per-process background work starts on the first request.
+# `config` overrides Flask settings (SQLALCHEMY_DATABASE_URI picks the database).
+def create_app(config=None):
+    config = dict(config or {})
+    app = Flask(__name__)
+    configure_database(app, config.pop("SQLALCHEMY_DATABASE_URI", None))
+    app.config.update(config)
+
+    db.init_app(app)
+    jobs.runner.init_app(app)
+    notifications.dispatcher.init_app(app)
+    live.hub.init_app(app)
+    metrics.init_app(app)
+    CORS(
+        app,
+        resources={r"/*": {"origins": ["http://localhost:5173"]}},
+        supports_credentials=True,
+        allow_headers=["Content-Type", "Authorization"],
+        expose_headers=[NEXT_CURSOR_HEADER, "ETag", "Retry-After"],
+        methods=["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],
+    )
+    app.before_request(_handle_options_preflight)
+    if live.LIVE_ONLY:
+        app.before_request(_live_only)
+    app.before_request(_start_background)
+    app.register_blueprint(api)
+    return app
+
+
+# --- Force-correct handling for preflight OPTIONS (registered before the auth hooks) ---
 def _handle_options_preflight():
     # allow immediate OK for OPTIONS preflights so auth decorators don't block them
     if request.method == "OPTIONS":
@@ -42,34 +87,205 @@ def _handle_options_preflight():
         return resp
 # -------------------------------------------------------------------------------
 
-# INIT: Create tables and default admin user
-with app.app_context():
-    db.create_all()
 
-    from dba import User, ROLE_ADMIN
-    import bcrypt
+# ROUTE: Event process (LIVE_ONLY=1): everything but the live stream is served elsewhere
+def _live_only():
+    if request.endpoint != "api.live_events":
+        return jsonify({"error": "Not found"}), 404
+
+
+# PROCESS: Per-process background work, started once on the first request
+_background_lock = threading.Lock()
+_background_started = False
+
+
+def _start_background():
+    global _background_started
+    if _background_started or live.LIVE_ONLY:
+        return
+    with _background_lock:
+        if _background_started:
+            return
+        _background_started = True
+    # pick up jobs left queued (or orphaned mid-run) by a previous process
+    jobs.runner.recover()
+    # start draining the notification outbox (NOTIFY_WORKER=0 leaves it to the CLI)
+    notifications.dispatcher.start()
+
+
+# PROCESS: Create / upgrade the schema and seed the default admin (idempotent)
+# Clinics with their own database (CLINIC_DATABASE_URLS) are upgraded too.
+def init_database(admin_password="admin"):
+    for partition in tenancy.partitions():
+        with tenancy.using(partition):
+            upgrade_schema(db.session.get_bind())
+    g.clinic_id = DEFAULT_CLINIC_ID
+    if User.query.filter_by(role=ROLE_ADMIN).first():
+        return False
+
+    admin = User(
+        username="admin",
+        name="Admin",
+        email="admin@example.com",
+        password_hash=hash_password(admin_password),
+        role=ROLE_ADMIN,
+    )
+    db.session.add(admin)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # another process seeded it first
+        db.session.rollback()
+        return False
+    return True
 
-    # only create if no admin exists yet
-    existing_admin = User.query.filter_by(role=ROLE_ADMIN).first()
-    if not existing_admin:
-        pw_hash = bcrypt.hashpw("admin".encode(), bcrypt.gensalt()).decode()
 
-        admin = User(
-            username="admin",
+# CLI: Create / upgrade the database and seed the admin (flask --app app init-db)
+@api.cli.command("init-db")
+@click.option("--admin-password", default="admin", help="Password for a newly seeded admin")
+def init_db_command(admin_password):
+    if init_database(admin_password):
+        print(f"Database ready. Default admin created: admin / {admin_password}")
+    else:
+        print("Database ready. Admin already exists, skipping seed.")
+
+
+# CLI: Add a clinic with its first admin (flask --app app create-clinic north "North Clinic")
+# A clinic listed in CLINIC_DATABASE_URLS needs --id matching its entry and
+# `init-db` run first, so its database exists.
+@api.cli.command("create-clinic")
+@click.argument("slug")
+@click.argument("name")
+@click.option("--id", "clinic_id", type=int, default=None, help="Clinic id (required for a sharded clinic)")
+@click.option("--admin-username", required=True)
+@click.option("--admin-email", required=True)
+@click.option("--admin-password", required=True)
+def create_clinic_command(slug, name, clinic_id, admin_username, admin_email, admin_password):
+    if tenancy.find_clinic(slug):
+        raise click.ClickException(f"Clinic {slug} already exists")
+    clinic = tenancy.create_clinic(slug, name, clinic_id)
+    with tenancy.using(clinic["id"]):
+        db.session.add(User(
+            username=admin_username,
             name="Admin",
-            email="admin@example.com",
-            password_hash=pw_hash,
+            email=admin_email,
+            password_hash=hash_password(admin_password),
             role=ROLE_ADMIN,
-        )
-        db.session.add(admin)
+        ))
         db.session.commit()
-        print("Default admin created: admin / admin")
-    else:
-        print("Admin already exists, skipping seed.")
+    print(f"Clinic {clinic['slug']} created (id {clinic['id']}), admin: {admin_username}")
+
+
+# FUNCTION: Base query for appointment listings
+# Doctor and patient are joined in the same SELECT, so serializing N rows
+# never issues extra per-row lookups.
+def appointment_listing():
+    return Appointment.query.options(
+        joinedload(Appointment.doctor), joinedload(Appointment.patient)
+    ).order_by(Appointment.date, Appointment.time, Appointment.id)
+
+
+# FUNCTION: Filtered keyset page of appointments, keyed on (date, time, id)
+# (newest first with descending=True; the query must be ordered the same way)
+# `model` is Appointment or the hot + archived alias the query selects from.
+def appointment_page(query, descending=False, model=Appointment):
+    return keyset_page(
+        filter_appointments(query, model=model),
+        (model.date, model.time, model.id),
+        lambda a: (a.date.strftime(DATE_FORMAT), a.time.strftime("%H:%M:%S"), a.id),
+        lambda key: (parse_date(key[0]), parse_time(key[1]), key[2]),
+        descending=descending,
+    )
+
+
+# FUNCTION: Filtered keyset page of users with one role, keyed on id
+# ?department_id= &specialization=
+def user_page(role):
+    query = filter_users(User.query.filter_by(role=role).order_by(User.id))
+    return keyset_page(query, (User.id,), lambda u: (u.id,))
+
+
+# FUNCTION: Shared doctor row serializer
+def serialize_doctor(d):
+    return {
+        "id": d.id,
+        "username": d.username,
+        "name": d.name,
+        "email": d.email,
+        "specialization": d.specialization,
+    }
+
+
+# FUNCTION: Doctor directory page (served through directory.cached_response)
+def doctor_directory_page():
+    doctors, next_cursor = user_page(ROLE_DOCTOR)
+    return [serialize_doctor(d) for d in doctors], next_cursor
+
+
+# FUNCTION: Department directory (small, unpaged)
+def department_directory():
+    departments = Department.query.order_by(Department.name).all()
+    return [
+        {"id": d.id, "name": d.name, "description": d.description} for d in departments
+    ], None
+
+
+# FUNCTION: Shared appointment row serializer
+def serialize_appointment(a):
+    doctor = a.doctor
+    patient = a.patient
+    return {
+        "id": a.id,
+        "date": a.date.strftime(DATE_FORMAT),
+        "time": a.time.strftime(TIME_FORMAT),
+        "status": a.status,
+        "doctor_id": a.doctor_id,
+        "doctor_name": doctor.name if doctor else "",
+        "doctor_username": doctor.username if doctor else "",
+        "patient_id": a.patient_id,
+        "patient_name": patient.name if patient else "",
+        "patient_username": patient.username if patient else "",
+        "diagnosis": a.diagnosis,
+        "prescription": a.prescription,
+    }
+
+
+# FUNCTION: Treatment history entry → JSON
+def serialize_treatment(t):
+    return {
+        "id": t.id,
+        "diagnosis": t.diagnosis,
+        "prescription": t.prescription,
+        "notes": t.notes,
+        "recorded_by": t.doctor_id,
+        "recorded_at": t.created_at.isoformat() + "Z" if t.created_at else None,
+    }
+
+
+# ERROR: Bad pagination / filter args → 400
+@api.app_errorhandler(PaginationError)
+def _pagination_error(e):
+    return jsonify({"error": str(e)}), 400
+
+
+# ERROR: Password hashing pool saturated → 429
+@api.app_errorhandler(HashingBusy)
+def _hashing_busy(e):
+    resp = jsonify({"error": "Server busy, please retry"})
+    resp.headers["Retry-After"] = "1"
+    return resp, 429
+
+
+# ROUTE: Prometheus metrics (per process; METRICS_TOKEN, or an admin login without one)
+@api.get("/metrics")
+def prometheus_metrics():
+    if not metrics.scrape_allowed():
+        return jsonify({"error": "Invalid metrics token"}), 401
+    return metrics.render()
 
 
 # ROUTE: Register patient
-@app.post("/api/register")
+@api.post("/api/register")
 def register():
     # INPUT
     data = request.json
@@ -78,11 +294,22 @@ def register():
     password = data["password"]
     name = data["name"]
 
-    # PROCESS: Check existing user
-    if User.query.filter((User.username == username) | (User.email == email)).first():
+    # PROCESS: Register with the named clinic (default clinic if none is given)
+    if data.get("clinic"):
+        clinic = tenancy.find_clinic(data["clinic"])
+        if not clinic:
+            return jsonify({"error": "Unknown clinic"}), 400
+        g.clinic_id = clinic.id
+    else:
+        g.clinic_id = DEFAULT_CLINIC_ID
+
+    # PROCESS: Check existing user (usernames and emails are unique across clinics)
+    if User.query.filter(
+        (User.username == username) | (User.email == email)
+    ).execution_options(all_clinics=True).first():
         return jsonify({"error": "User already exists"}), 400
 
-    pw_hash = bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+    pw_hash = hash_password(password)
 
     # PROCESS: Create user
     user = User(
@@ -99,42 +326,52 @@ def register():
 
 
 # ROUTE: Login
-@app.post("/api/login")
+@api.post("/api/login")
 def login():
     # INPUT
     data = request.json
     username = data["username"]
     password = data["password"]
 
-    # PROCESS
+    # PROCESS: Clinics with their own database are only found when named
+    if data.get("clinic"):
+        clinic = tenancy.find_clinic(data["clinic"])
+        if not clinic:
+            return jsonify({"error": "Invalid credentials"}), 400
+        g.clinic_id = clinic.id
+
     user = User.query.filter_by(username=username).first()
     if not user:
         return jsonify({"error": "Invalid credentials"}), 400
 
-    if not bcrypt.checkpw(password.encode(), user.password_hash.encode()):
+    if not check_password(password, user.password_hash):
         return jsonify({"error": "Invalid credentials"}), 400
 
+    # PROCESS: Upgrade the hash when the configured work factor changed
+    if needs_rehash(user.password_hash):
+        try:
+            user.password_hash = hash_password(password)
+            db.session.commit()
+        except HashingBusy:
+            pass
+
     # OUTPUT
     token = create_token(user)
     return jsonify({"token": token, "role": user.role})
 
 
 # ROUTE: Get profile
-@app.get("/api/me")
+@api.get("/api/me")
 @require_auth
 def get_me():
-    user = request.current_user
-    return jsonify({
-        "id": user.id,
-        "username": user.username,
-        "name": user.name,
-        "email": user.email,
-        "role": user.role
-    })
+    profile = load_profile(request.current_user.id)
+    if not profile:
+        return jsonify({"error": "User not found"}), 404
+    return jsonify(profile)
 
 
 # ROUTE: Admin → Add doctor
-@app.post("/api/admin/doctors")
+@api.post("/api/admin/doctors")
 @require_auth
 @admin_required
 def add_doctor():
@@ -151,10 +388,7 @@ def add_doctor():
         return jsonify({"error": "Username and password are required"}), 400
 
     # PROCESS: hash password & create doctor
-    from dba import User, ROLE_DOCTOR
-    import bcrypt
-
-    pw_hash = bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+    pw_hash = hash_password(password)
 
     doc = User(
         username=username,
@@ -185,40 +419,194 @@ def add_doctor():
 
 
 # ROUTE: Admin → List doctors
-@app.get("/api/admin/doctors")
+@api.get("/api/admin/doctors")
 @require_auth
 @admin_required
+@read_replica
 def list_doctors():
-    doctors = User.query.filter_by(role=ROLE_DOCTOR).all()
-    return jsonify([
-        {
-            "id": d.id, "name": d.name, "username": d.username,
-            "email": d.email, "specialization": d.specialization
-        } for d in doctors
-    ])
+    return directory.cached_response(directory.DOCTORS, doctor_directory_page)
 
 # ROUTE: List doctors for any logged-in user
-@app.get("/api/doctors")
+@api.get("/api/doctors")
 @require_auth
+@read_replica
 def list_doctors_for_all():
-    from dba import User, ROLE_DOCTOR
+    return directory.cached_response(directory.DOCTORS, doctor_directory_page)
 
-    docs = User.query.filter_by(role=ROLE_DOCTOR).all()
-    data = []
-    for d in docs:
-        data.append(
+# ROUTE: List departments for any logged-in user
+@api.get("/api/departments")
+@require_auth
+@read_replica
+def list_departments():
+    return directory.cached_response(directory.DEPARTMENTS, department_directory)
+
+# FUNCTION: Admins manage any schedule, doctors only their own
+def can_manage_schedule(user, did):
+    return user.role == ROLE_ADMIN or (user.role == ROLE_DOCTOR and user.id == did)
+
+
+# FUNCTION: Doctor of the caller's clinic (None if unknown or in another clinic)
+# Schedules, leave and slot holds are keyed by doctor_id only, so every route
+# touching them resolves the doctor through the clinic-scoped User query first.
+def clinic_doctor(did):
+    doctor = User.query.get(did)
+    return doctor if doctor and doctor.role == ROLE_DOCTOR else None
+
+
+# FUNCTION: Serialize a doctor's weekly template
+def serialize_schedule(doctor_id):
+    template = slots.template_for(doctor_id)
+    return {
+        "doctor_id": doctor_id,
+        "default": template is slots.DEFAULT_TEMPLATE,
+        "days": [
             {
-                "id": d.id,
-                "username": d.username,
-                "name": d.name,
-                "email": d.email,
-                "specialization": d.specialization,
+                "weekday": weekday,
+                "start": start.strftime(TIME_FORMAT),
+                "end": end.strftime(TIME_FORMAT),
+                "slot_minutes": slot_minutes,
+                "break_start": break_start.strftime(TIME_FORMAT) if break_start else None,
+                "break_end": break_end.strftime(TIME_FORMAT) if break_end else None,
             }
+            for weekday, (start, end, slot_minutes, break_start, break_end)
+            in sorted(template.items())
+        ],
+    }
+
+
+# ROUTE: Free slots for a doctor (?from=YYYY-MM-DD&to=YYYY-MM-DD)
+@api.get("/api/doctors/<int:did>/slots")
+@require_auth
+def doctor_free_slots(did):
+    if clinic_doctor(did) is None:
+        return jsonify({"error": "Doctor not found"}), 404
+
+    start = date_arg("from") or date_type.today()
+    end = date_arg("to") or start + timedelta(days=6)
+    if end < start or (end - start).days >= slots.MAX_RANGE_DAYS:
+        return jsonify({"error": f"Range must be 1-{slots.MAX_RANGE_DAYS} days"}), 400
+
+    days = slots.free_slots(did, start, end)
+    return jsonify(
+        {
+            "doctor_id": did,
+            "days": [
+                {
+                    "date": day.strftime(DATE_FORMAT),
+                    "slots": [t.strftime(TIME_FORMAT) for t in free],
+                }
+                for day, free in days
+            ],
+        }
+    )
+
+# ROUTE: Doctor weekly schedule template
+@api.get("/api/doctors/<int:did>/schedule")
+@require_auth
+def get_doctor_schedule(did):
+    if clinic_doctor(did) is None:
+        return jsonify({"error": "Doctor not found"}), 404
+    return jsonify(serialize_schedule(did))
+
+# ROUTE: Replace a doctor's weekly schedule template (admin or the doctor)
+@api.put("/api/doctors/<int:did>/schedule")
+@require_auth
+def set_doctor_schedule(did):
+    if not can_manage_schedule(request.current_user, did):
+        return jsonify({"error": "Not allowed to modify this schedule"}), 403
+    if clinic_doctor(did) is None:
+        return jsonify({"error": "Doctor not found"}), 404
+
+    data = request.get_json() or {}
+    rows = []
+    for day in data.get("days") or []:
+        start = parse_time(day.get("start"))
+        end = parse_time(day.get("end"))
+        break_start = parse_time(day.get("break_start")) if day.get("break_start") else None
+        break_end = parse_time(day.get("break_end")) if day.get("break_end") else None
+        try:
+            weekday = int(day.get("weekday"))
+            slot_minutes = int(day.get("slot_minutes") or 30)
+        except (TypeError, ValueError):
+            return jsonify({"error": "Invalid schedule day"}), 400
+
+        if (
+            not 0 <= weekday <= 6 or start is None or end is None or start >= end
+            or not 5 <= slot_minutes <= 240
+            or (break_start is None) != (break_end is None)
+        ):
+            return jsonify({"error": "Invalid schedule day"}), 400
+
+        rows.append(
+            DoctorSchedule(
+                doctor_id=did, weekday=weekday, start_time=start, end_time=end,
+                slot_minutes=slot_minutes, break_start=break_start, break_end=break_end,
+            )
         )
-    return jsonify(data)
+
+    DoctorSchedule.query.filter_by(doctor_id=did).delete()
+    db.session.add_all(rows)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({"error": "Duplicate weekday in schedule"}), 400
+
+    slots.invalidate(did)
+    return jsonify(serialize_schedule(did))
+
+# ROUTE: Add leave for a doctor (admin or the doctor)
+@api.post("/api/doctors/<int:did>/leave")
+@require_auth
+def add_doctor_leave(did):
+    if not can_manage_schedule(request.current_user, did):
+        return jsonify({"error": "Not allowed to modify this schedule"}), 403
+    if clinic_doctor(did) is None:
+        return jsonify({"error": "Doctor not found"}), 404
+
+    data = request.get_json() or {}
+    start = parse_date(data.get("start_date"))
+    end = parse_date(data.get("end_date") or data.get("start_date"))
+    if start is None or end is None or end < start:
+        return jsonify({"error": "Invalid leave dates"}), 400
+
+    leave = DoctorLeave(
+        doctor_id=did, start_date=start, end_date=end,
+        reason=(data.get("reason") or "").strip(),
+    )
+    db.session.add(leave)
+    db.session.commit()
+    slots.invalidate(did)
+
+    return jsonify(
+        {
+            "id": leave.id,
+            "doctor_id": did,
+            "start_date": start.strftime(DATE_FORMAT),
+            "end_date": end.strftime(DATE_FORMAT),
+            "reason": leave.reason,
+        }
+    ), 201
+
+# ROUTE: Remove leave (admin or the doctor)
+@api.delete("/api/doctors/<int:did>/leave/<int:lid>")
+@require_auth
+def remove_doctor_leave(did, lid):
+    if not can_manage_schedule(request.current_user, did):
+        return jsonify({"error": "Not allowed to modify this schedule"}), 403
+    if clinic_doctor(did) is None:
+        return jsonify({"error": "Doctor not found"}), 404
+
+    removed = DoctorLeave.query.filter_by(id=lid, doctor_id=did).delete()
+    db.session.commit()
+    if not removed:
+        return jsonify({"error": "Leave not found"}), 404
+
+    slots.invalidate(did)
+    return jsonify({"ok": True, "id": lid})
 
 # ROUTE: Patient → Book appointment
-@app.post("/api/patient/appointments")
+@api.post("/api/patient/appointments")
 @require_auth
 @patient_required
 def book_app():
@@ -226,12 +614,17 @@ def book_app():
     data = request.get_json() or {}
 
     raw_doctor_id = data.get("doctor_id")
-    date = (data.get("date") or "").strip()
-    time = (data.get("time") or "").strip()
+    raw_date = (data.get("date") or "").strip()
+    raw_time = (data.get("time") or "").strip()
 
-    if not raw_doctor_id or not date or not time:
+    if not raw_doctor_id or not raw_date or not raw_time:
         return jsonify({"error": "Doctor, date and time are required"}), 400
 
+    date = parse_date(raw_date)
+    time = parse_time(raw_time)
+    if date is None or time is None:
+        return jsonify({"error": "Invalid date or time"}), 400
+
     # doctor_id comes from JSON, so make sure it's an int
     try:
         doctor_id = int(raw_doctor_id)
@@ -239,32 +632,18 @@ def book_app():
         return jsonify({"error": "Invalid doctor"}), 400
 
     # make sure doctor actually exists and is a doctor
-    doctor = User.query.get(doctor_id)
-    if not doctor or doctor.role != ROLE_DOCTOR:
+    if clinic_doctor(doctor_id) is None:
         return jsonify({"error": "Invalid doctor"}), 400
 
-    # check if the slot is already taken for this doctor
-    existing = Appointment.query.filter_by(
-        doctor_id=doctor_id, date=date, time=time
-    ).first()
-    if existing:
-        return jsonify({"error": "This time slot is already booked"}), 400
-
-    # create new appointment
-    appt = Appointment(
-        doctor_id=doctor_id,
-        patient_id=user.id,
-        date=date,
-        time=time,
-        status="Booked",
-    )
-
-    db.session.add(appt)
+    # create new appointment; the slot constraint rejects a double-booking atomically
     try:
-        db.session.commit()
+        appt = booking.book(doctor_id, user.id, date, time)
+    except booking.SlotUnavailable:
+        return jsonify({"error": "This time slot is already booked"}), 400
     except Exception as e:
         db.session.rollback()
-        print("Error booking appointment:", e)
+        current_app.logger.exception("Error booking appointment")
+        metrics.count_exception(e)
         return jsonify(
             {"error": "Server error while booking appointment"}
         ), 500
@@ -272,86 +651,89 @@ def book_app():
     return jsonify(
         {
             "id": appt.id,
-            "date": appt.date,
-            "time": appt.time,
+            "date": appt.date.strftime(DATE_FORMAT),
+            "time": appt.time.strftime(TIME_FORMAT),
             "status": appt.status,
             "doctor_id": appt.doctor_id,
             "patient_id": appt.patient_id,
         }
     ), 201
 
+# ROUTE: Patient → Hold a slot while completing a booking
+@api.post("/api/patient/slot-holds")
+@require_auth
+@patient_required
+def hold_slot():
+    user = request.current_user
+    data = request.get_json() or {}
+
+    date = parse_date((data.get("date") or "").strip())
+    time = parse_time((data.get("time") or "").strip())
+    try:
+        doctor_id = int(data.get("doctor_id"))
+    except (TypeError, ValueError):
+        return jsonify({"error": "Invalid doctor"}), 400
+    if date is None or time is None:
+        return jsonify({"error": "Invalid date or time"}), 400
+
+    if clinic_doctor(doctor_id) is None:
+        return jsonify({"error": "Invalid doctor"}), 400
+
+    try:
+        hold = booking.hold_slot(doctor_id, user.id, date, time)
+    except booking.SlotUnavailable:
+        return jsonify({"error": "This time slot is already booked"}), 400
+
+    return jsonify(
+        {
+            "id": hold.id,
+            "doctor_id": hold.doctor_id,
+            "date": hold.date.strftime(DATE_FORMAT),
+            "time": hold.time.strftime(TIME_FORMAT),
+            "expires_at": hold.expires_at.isoformat() + "Z",
+        }
+    ), 201
+
+# ROUTE: Patient → Release a slot hold
+@api.delete("/api/patient/slot-holds/<int:hid>")
+@require_auth
+@patient_required
+def release_slot_hold(hid):
+    user = request.current_user
+    if not booking.release_hold(hid, user.id):
+        return jsonify({"error": "Hold not found"}), 404
+    return jsonify({"ok": True, "id": hid})
+
 # ROUTE: Patient → List own appointments
-@app.get("/api/patient/appointments")
+@api.get("/api/patient/appointments")
 @require_auth
 @patient_required
 def list_patient_appointments():
     user = request.current_user
-    from dba import Appointment, User
 
-    appts = (
-        Appointment.query.filter_by(patient_id=user.id)
-        .order_by(Appointment.date, Appointment.time)
-        .all()
+    appts, next_cursor = appointment_page(
+        appointment_listing().filter(Appointment.patient_id == user.id)
     )
-
-    result = []
-    for a in appts:
-        doctor = User.query.get(a.doctor_id)
-        result.append(
-            {
-                "id": a.id,
-                "date": a.date,
-                "time": a.time,
-                "status": a.status,
-                
-                "doctor_name": doctor.name if doctor else "",
-                "doctor_username": doctor.username if doctor else "",
-                "diagnosis": a.diagnosis,
-                "prescription": a.prescription,
-            }
-        )
-
-    return jsonify(result)
+    return page_response([serialize_appointment(a) for a in appts], next_cursor)
 
 # ROUTE: Doctor → List own appointments
-@app.get("/api/doctor/appointments")
+@api.get("/api/doctor/appointments")
 @require_auth
 @doctor_required
 def list_doctor_appointments():
     user = request.current_user
-    from dba import Appointment, User
 
-    appts = (
-        Appointment.query.filter_by(doctor_id=user.id)
-        .order_by(Appointment.date, Appointment.time)
-        .all()
+    appts, next_cursor = appointment_page(
+        appointment_listing().filter(Appointment.doctor_id == user.id)
     )
-
-    result = []
-    for a in appts:
-        patient = User.query.get(a.patient_id)
-        result.append(
-            {
-                "id": a.id,
-                "date": a.date,
-                "time": a.time,
-                "status": a.status,
-                "patient_name": patient.name if patient else "",
-                "patient_username": patient.username if patient else "",
-                "diagnosis": a.diagnosis,
-                "prescription": a.prescription,
-            }
-        )
-
-    return jsonify(result)
+    return page_response([serialize_appointment(a) for a in appts], next_cursor)
 
 # ROUTE: Doctor → Update appointment
-@app.put("/api/doctor/appointments/<int:aid>")
+@api.put("/api/doctor/appointments/<int:aid>")
 @require_auth
 @doctor_required
 def update_appt(aid):
     user = request.current_user
-    from dba import Appointment
 
     data = request.get_json() or {}
 
@@ -363,27 +745,189 @@ def update_appt(aid):
 
     diagnosis = data.get("diagnosis", "").strip()
     prescription = data.get("prescription", "").strip()
+    notes = (data.get("notes") or "").strip()
     status = data.get("status", "").strip() or "Completed"
+    if max(len(diagnosis), len(prescription), len(notes)) > TREATMENT_TEXT_LIMIT:
+        return jsonify({"error": f"Treatment fields are limited to {TREATMENT_TEXT_LIMIT} characters"}), 400
 
     appt.diagnosis = diagnosis
     appt.prescription = prescription
     appt.status = status
 
+    # PROCESS: Append to the treatment history (never edit earlier entries);
+    # resubmitting the latest entry unchanged adds nothing
+    entry = (diagnosis, prescription, notes)
+    latest = appt.treatments[-1] if appt.treatments else None
+    if any(entry) and (
+        latest is None or (latest.diagnosis, latest.prescription, latest.notes or "") != entry
+    ):
+        appt.treatments.append(Treatment(
+            diagnosis=diagnosis, prescription=prescription, notes=notes, doctor_id=user.id,
+        ))
+
     db.session.commit()
 
     return jsonify(
         {
             "id": appt.id,
-            "date": appt.date,
-            "time": appt.time,
+            "date": appt.date.strftime(DATE_FORMAT),
+            "time": appt.time.strftime(TIME_FORMAT),
             "status": appt.status,
             "diagnosis": appt.diagnosis,
             "prescription": appt.prescription,
+            "treatments": [serialize_treatment(t) for t in appt.treatments],
         }
     )
 
+# FUNCTION: May this user read the patient's chart?
+# Admins always; patients their own; doctors once the patient has booked with
+# them (archived appointments count).
+def can_view_history(user, pid):
+    if user.role == ROLE_ADMIN:
+        return True
+    if user.role == ROLE_PATIENT:
+        return user.id == pid
+    return any(
+        db.session.query(model.id).filter_by(doctor_id=user.id, patient_id=pid).first() is not None
+        for model in (Appointment, ArchivedAppointment)
+    )
+
+
+# ROUTE: Patient medical history (newest visit first, each with its treatment entries)
+# ?limit= &cursor= plus the appointment filters (status, date_from, date_to, doctor_id)
+# Each page is one range scan of the (patient_id, date, time) index of both the
+# hot and the archived table plus one indexed lookup of that page's treatments;
+# the patient header comes with it.
+@api.get("/api/patients/<int:pid>/history")
+@require_auth
+def patient_history(pid):
+    if not can_view_history(request.current_user, pid):
+        return jsonify({"error": "Not allowed to view this patient's history"}), 403
+    patient = db.session.get(User, pid)
+    if not patient or patient.role != ROLE_PATIENT:
+        return jsonify({"error": "Patient not found"}), 404
+
+    visit = archive.all_appointments()
+    query = (
+        db.session.query(visit)
+        .options(joinedload(visit.doctor), selectinload(visit.treatments))
+        .filter(visit.patient_id == pid)
+        .order_by(visit.date.desc(), visit.time.desc(), visit.id.desc())
+    )
+    visits, next_cursor = appointment_page(query, descending=True, model=visit)
+
+    resp = jsonify({
+        "patient": {
+            "id": patient.id,
+            "name": patient.name,
+            "username": patient.username,
+            "email": patient.email,
+        },
+        "visits": [
+            {
+                "id": a.id,
+                "date": a.date.strftime(DATE_FORMAT),
+                "time": a.time.strftime(TIME_FORMAT),
+                "status": a.status,
+                "doctor_id": a.doctor_id,
+                "doctor_name": a.doctor.name if a.doctor else "",
+                "specialization": a.doctor.specialization if a.doctor else None,
+                "diagnosis": a.diagnosis,
+                "prescription": a.prescription,
+                "treatments": [serialize_treatment(t) for t in a.treatments],
+            }
+            for a in visits
+        ],
+    })
+    if next_cursor:
+        resp.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return resp
+
+# FUNCTION: User row as mirrored by /api/sync
+def serialize_sync_user(u):
+    return {
+        "id": u.id,
+        "username": u.username,
+        "name": u.name,
+        "email": u.email,
+        "role": u.role,
+        "specialization": u.specialization,
+        "department_id": u.department_id,
+    }
+
+
+# ROUTE: Incremental sync for dashboards and the offline mirror
+# ?since=<token from the previous response> &limit=
+# Without a token (or with one too old to catch up from) the response has
+# "reset": true and pages through everything visible; afterwards only rows
+# changed since the token come back, plus ids in "removed" to delete locally.
+# Call again with the new token while "more" is true.
+@api.get("/api/sync")
+@require_auth
+def sync_changes():
+    page = sync.changes(
+        request.current_user, request.args.get("since"),
+        page_size() if "limit" in request.args else None,
+        options=(joinedload(Appointment.doctor), joinedload(Appointment.patient)),
+    )
+    return jsonify({
+        **page,
+        "users": [serialize_sync_user(u) for u in page["users"]],
+        "appointments": [serialize_appointment(a) for a in page["appointments"]],
+    })
+
+
+# ROUTE: Live appointment events (server-sent events)
+# The caller's appointments (every appointment for admins): created,
+# rescheduled, reassigned, cancelled, completed, updated and removed, plus
+# ": ping" heartbeats. The stream ends after LIVE_MAX_SECONDS and the client
+# reconnects; on "resync" it should catch up through /api/sync.
+@api.get("/api/events")
+@require_auth
+def live_events():
+    user = request.current_user
+    subscription = live.hub.subscribe(user.role, user.clinic_id, user.id)
+    if subscription is None:
+        resp = jsonify({"error": "Too many live streams, please retry"})
+        resp.headers["Retry-After"] = str(live.RETRY_MS // 1000)
+        return resp, 503
+    # hand the pooled connection back: an idle stream holds no database resources
+    db.session.remove()
+    resp = Response(
+        live.stream(subscription),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+    # frees the slot even when the server never starts the stream
+    resp.call_on_close(lambda: live.hub.unsubscribe(subscription))
+    return resp
+
+
+# CLI: Drop sync tombstones past SYNC_TOMBSTONE_DAYS (clients older than that resync fully)
+@api.cli.command("purge-sync")
+@click.option("--days", type=int, default=None, help="Retention (default SYNC_TOMBSTONE_DAYS)")
+def purge_sync_command(days):
+    removed = 0
+    for partition in tenancy.partitions():
+        with tenancy.using(partition):
+            removed += sync.purge(days)
+    print(f"Removed {removed} sync tombstones.")
+
+
+# CLI: Move completed / cancelled appointments older than --days to the archive (for cron)
+@api.cli.command("archive-appointments")
+@click.option("--days", type=int, default=None, help="Horizon (default ARCHIVE_AFTER_DAYS)")
+def archive_appointments_command(days):
+    cutoff = archive.cutoff_for(days)
+    moved = 0
+    for partition in tenancy.partitions():
+        with tenancy.using(partition):
+            moved += archive.archive(cutoff)
+    print(f"Archived {moved} appointments dated before {cutoff.isoformat()}.")
+
+
 # ROUTE: Admin → Update doctor
-@app.put("/api/admin/doctors/<int:did>")
+@api.put("/api/admin/doctors/<int:did>")
 @require_auth
 @admin_required
 def admin_update_doctor(did):
@@ -404,7 +948,10 @@ def admin_update_doctor(did):
         db.session.commit()
     except Exception as e:
         db.session.rollback()
+        current_app.logger.exception("Error updating doctor %s", did)
+        metrics.count_exception(e)
         return jsonify({"error": "Failed to update doctor"}), 500
+    invalidate_user(did)
 
     return jsonify({
         "id": doc.id,
@@ -417,8 +964,92 @@ def admin_update_doctor(did):
 
 # ROUTE: Admin → Remove doctor
 
+# FUNCTION: Reassignment options from a JSON body or the query string
+# date (one day only), window_days, target_doctor_ids (list or "1,2,3")
+def reassign_options(source):
+    day = date_arg("date", source)
+    window = int_arg("window_days", source)
+    if window is not None and not 0 <= window <= slots.MAX_RANGE_DAYS:
+        raise PaginationError("Invalid window_days")
+
+    raw = source.get("target_doctor_ids") or []
+    if isinstance(raw, str):
+        raw = [part for part in raw.split(",") if part.strip()]
+    try:
+        target_ids = [int(x) for x in raw]
+    except (TypeError, ValueError):
+        raise PaginationError("Invalid target_doctor_ids")
+    return day, target_ids, window
+
+
+# FUNCTION: Reassignment plan → JSON (call before the moves are applied)
+def serialize_plan(moves, unplaced, candidates):
+    names = {c.id: c.name for c in candidates}
+    return {
+        "moves": [
+            {
+                "appointment_id": a.id,
+                "patient_id": a.patient_id,
+                "from": {
+                    "doctor_id": a.doctor_id,
+                    "date": a.date.strftime(DATE_FORMAT),
+                    "time": a.time.strftime(TIME_FORMAT),
+                },
+                "to": {
+                    "doctor_id": doctor_id,
+                    "doctor_name": names.get(doctor_id),
+                    "date": day.strftime(DATE_FORMAT),
+                    "time": time.strftime(TIME_FORMAT),
+                },
+            }
+            for a, doctor_id, day, time in moves
+        ],
+        "unplaced": [
+            {
+                "appointment_id": a.id,
+                "patient_id": a.patient_id,
+                "date": a.date.strftime(DATE_FORMAT),
+                "time": a.time.strftime(TIME_FORMAT),
+            }
+            for a in unplaced
+        ],
+    }
+
+
+# ROUTE: Admin → Move a doctor's upcoming appointments to colleagues
+# Body: {"date": optional single day, "target_doctor_ids": [...], "window_days": n,
+#        "dry_run": true to preview}. All moves commit in one transaction.
+@api.post("/api/admin/doctors/<int:did>/reassign")
+@require_auth
+@admin_required
+def admin_reassign_appointments(did):
+    doc = User.query.get(did)
+    if not doc or doc.role != ROLE_DOCTOR:
+        return jsonify({"error": "Doctor not found"}), 404
+
+    data = request.get_json(silent=True) or {}
+    day, target_ids, window = reassign_options(data)
+    candidates = booking.replacement_doctors(doc, target_ids)
+    moves, unplaced = booking.plan_reassignment(doc, candidates, day, window)
+    result = serialize_plan(moves, unplaced, candidates)
+
+    if data.get("dry_run") or not moves:
+        return jsonify({**result, "applied": False})
+
+    try:
+        touched = booking.apply_moves(moves)
+        db.session.commit()
+    except booking.SlotUnavailable:
+        return jsonify({"error": "Some slots were taken meanwhile, preview again"}), 409
+    booking.invalidate_days(touched)
+    return jsonify({**result, "applied": True})
+
+
 # ROUTE: Admin → Remove doctor (deletes dependent appointments first)
-@app.delete("/api/admin/doctors/<int:did>")
+# ?reassign=1 first moves upcoming appointments to colleagues (same options as
+# /reassign, in the query string); appointments that cannot be placed block the
+# removal unless &force=1. &dry_run=1 returns the plan without changing anything.
+@api.delete("/api/admin/doctors/<int:did>")
 @require_auth
 @admin_required
 def admin_remove_doctor(did):
@@ -426,25 +1057,55 @@ def admin_remove_doctor(did):
     if not doc or doc.role != ROLE_DOCTOR:
         return jsonify({"error": "Doctor not found"}), 404
 
+    plan, touched = None, set()
+    if request.args.get("reassign"):
+        _, target_ids, window = reassign_options(request.args)
+        candidates = booking.replacement_doctors(doc, target_ids)
+        moves, unplaced = booking.plan_reassignment(doc, candidates, None, window)
+        plan = serialize_plan(moves, unplaced, candidates)
+        if request.args.get("dry_run"):
+            return jsonify(plan)
+        if unplaced and not request.args.get("force"):
+            return jsonify({"error": "Some appointments could not be reassigned", **plan}), 409
+        try:
+            touched = booking.apply_moves(moves)
+        except booking.SlotUnavailable:
+            return jsonify({"error": "Some slots were taken meanwhile, preview again"}), 409
+
     try:
         # Remove all appointments that reference this doctor first (prevents FK/constraint errors)
         # Note: .delete() performs bulk delete via SQL; commit afterwards.
-        from dba import Appointment
-        Appointment.query.filter_by(doctor_id=did).delete()
-
-        # Now delete the doctor
+        doctor_appts = Appointment.query.filter_by(doctor_id=did)
+        counters.forget_appointments(doctor_appts)
+        notifications.record_removed(doctor_appts)
+        sync.record_removed(doctor_appts)
+        live.record_removed(doctor_appts)
+        removed_ids = [appt_id for (appt_id,) in doctor_appts.with_entities(Appointment.id)]
+        doctor_appts.delete()
+        search.reindex(db.session.connection(), appointments=removed_ids)
+
+        # Now delete the doctor (with their schedule template and leave)
+        DoctorSchedule.query.filter_by(doctor_id=did).delete()
+        DoctorLeave.query.filter_by(doctor_id=did).delete()
+        SlotHold.query.filter_by(doctor_id=did).delete()
         db.session.delete(doc)
         db.session.commit()
+        slots.invalidate(did)
+        booking.invalidate_days(touched)
+        invalidate_user(did)
 
+        if plan is not None:
+            return jsonify({"ok": True, "id": did, **plan}), 200
         return jsonify({"ok": True, "id": did}), 200
     except Exception as e:
         db.session.rollback()
-        print("Delete doctor error:", e)
+        current_app.logger.exception("Error removing doctor %s", did)
+        metrics.count_exception(e)
         return jsonify({"error": "Failed to remove doctor"}), 500
 
 
 # ROUTE: Patient → Update own appointment (reschedule / cancel)
-@app.put("/api/patient/appointments/<int:aid>")
+@api.put("/api/patient/appointments/<int:aid>")
 @require_auth
 @patient_required
 def update_patient_appointment(aid):
@@ -461,39 +1122,32 @@ def update_patient_appointment(aid):
     new_date = (data.get("date") or "").strip() if data.get("date") is not None else None
     new_time = (data.get("time") or "").strip() if data.get("time") is not None else None
 
-    # If rescheduling (date/time change), check for conflicts
-    if new_date or new_time:
-        date = new_date or appt.date
-        time = new_time or appt.time
-
-        existing = (
-            Appointment.query.filter(
-                Appointment.doctor_id == appt.doctor_id,
-                Appointment.date == date,
-                Appointment.time == time,
-                Appointment.id != appt.id,
-            )
-            .first()
-        )
-        if existing:
-            return jsonify({"error": "This time slot is already booked"}), 400
-
-        appt.date = date
-        appt.time = time
-
     # If status change (e.g. cancel)
     if new_status:
         if new_status not in ["Booked", "Cancelled"]:
             return jsonify({"error": "Invalid status"}), 400
         appt.status = new_status
 
-    db.session.commit()
+    # If rescheduling (date/time change), the slot constraint rejects conflicts
+    if new_date or new_time:
+        date = parse_date(new_date) if new_date else appt.date
+        time = parse_time(new_time) if new_time else appt.time
+        if date is None or time is None:
+            db.session.rollback()
+            return jsonify({"error": "Invalid date or time"}), 400
+
+        try:
+            booking.reschedule(appt, date, time)
+        except booking.SlotUnavailable:
+            return jsonify({"error": "This time slot is already booked"}), 400
+    else:
+        db.session.commit()
 
     return jsonify(
         {
             "id": appt.id,
-            "date": appt.date,
-            "time": appt.time,
+            "date": appt.date.strftime(DATE_FORMAT),
+            "time": appt.time.strftime(TIME_FORMAT),
             "status": appt.status,
             "doctor_id": appt.doctor_id,
             "patient_id": appt.patient_id,
@@ -503,11 +1157,12 @@ def update_patient_appointment(aid):
     )
 
 # ROUTE: Admin → List patients
-@app.get("/api/admin/patients")
+@api.get("/api/admin/patients")
 @require_auth
 @admin_required
+@read_replica
 def admin_list_patients():
-    patients = User.query.filter_by(role=ROLE_PATIENT).all()
+    patients, next_cursor = user_page(ROLE_PATIENT)
     data = []
     for p in patients:
         data.append(
@@ -518,92 +1173,339 @@ def admin_list_patients():
                 "email": p.email,
             }
         )
-    return jsonify(data)
+    return page_response(data, next_cursor)
 
 
 # ROUTE: Admin → Summary counts
-@app.get("/api/admin/summary")
+# ?breakdown=doctor,department,day (&date_from= &date_to= for the day series)
+@api.get("/api/admin/summary")
 @require_auth
 @admin_required
+@read_replica
 def admin_summary():
-    total_doctors = User.query.filter_by(role=ROLE_DOCTOR).count()
-    total_patients = User.query.filter_by(role=ROLE_PATIENT).count()
-    total_appointments = Appointment.query.count()
-
-    booked = Appointment.query.filter_by(status="Booked").count()
-    completed = Appointment.query.filter_by(status="Completed").count()
-    cancelled = Appointment.query.filter_by(status="Cancelled").count()
+    breakdown = [b for b in (request.args.get("breakdown") or "").split(",") if b]
+    if set(breakdown) - {"doctor", "department", "day"}:
+        return jsonify({"error": "Invalid breakdown"}), 400
 
     return jsonify(
-        {
-            "total_doctors": total_doctors,
-            "total_patients": total_patients,
-            "total_appointments": total_appointments,
-            "booked": booked,
-            "completed": completed,
-            "cancelled": cancelled,
-        }
+        counters.summary(breakdown, date_arg("date_from"), date_arg("date_to"))
+    )
+
+# ROUTE: Search people and clinical text (ranked, prefix-matched, paged)
+# ?q=smi&kinds=patient,doctor,appointment,treatment &limit= &cursor=
+# Admins search everything, doctors their own patients and records, patients
+# the doctor directory.
+@api.get("/api/search")
+@require_auth
+@read_replica
+def search_records():
+    user = request.current_user
+    if user.role == ROLE_PATIENT:
+        allowed = (ROLE_DOCTOR,)
+    else:
+        allowed = search.KINDS
+
+    requested = [k for k in (request.args.get("kinds") or "").split(",") if k]
+    if set(requested) - set(search.KINDS):
+        return jsonify({"error": "Invalid kinds"}), 400
+    kinds = [k for k in (requested or allowed) if k in allowed]
+
+    hits = search.ranked(
+        request.args.get("q"), kinds,
+        doctor_id=user.id if user.role == ROLE_DOCTOR else None,
+    )
+    if hits is None or not kinds:
+        return jsonify([])
+
+    columns = (hits.c.score, hits.c.kind, hits.c.ref)
+    page, next_cursor = keyset_page(
+        db.session.query(*columns).order_by(*columns),
+        columns,
+        lambda h: (h.score, h.kind, h.ref),
     )
+    return page_response(search.hydrate(page), next_cursor)
+
+# CLI: Rebuild the full-text search index (flask --app app rebuild-search)
+@api.cli.command("rebuild-search")
+def rebuild_search_command():
+    for partition in tenancy.partitions():
+        with tenancy.using(partition), db.session.get_bind().begin() as conn:
+            search.create_index(conn)
+            search.rebuild(conn)
+    print("Search index rebuilt.")
 
 # ROUTE: Admin → List all appointments
-@app.get("/api/admin/appointments")
+@api.get("/api/admin/appointments")
 @require_auth
 @admin_required
+@read_replica
 def admin_list_appointments():
-    appts = Appointment.query.order_by(Appointment.date, Appointment.time).all()
-    data = []
-    for a in appts:
-        doctor = User.query.get(a.doctor_id)
-        patient = User.query.get(a.patient_id)
-        data.append(
-            {
-                "id": a.id,
-                "date": a.date,
-                "time": a.time,
-                "status": a.status,
-                "doctor_name": doctor.name if doctor else "",
-                "doctor_username": doctor.username if doctor else "",
-                "patient_name": patient.name if patient else "",
-                "patient_username": patient.username if patient else "",
-                "diagnosis": a.diagnosis,
-                "prescription": a.prescription,
-            }
-        )
-    return jsonify(data)
+    appts, next_cursor = appointment_page(appointment_listing())
+    return page_response([serialize_appointment(a) for a in appts], next_cursor)
+
+# CLI: Recompute materialized dashboard counters (flask --app app rebuild-stats)
+@api.cli.command("rebuild-stats")
+def rebuild_stats_command():
+    for partition in tenancy.partitions():
+        with tenancy.using(partition), db.session.get_bind().begin() as conn:
+            counters.rebuild(conn)
+    print("Dashboard counters rebuilt.")
+
+# CLI: Copy the primary SQLite file onto each SQLite replica (local testing)
+@api.cli.command("sync-replicas")
+def sync_replicas_command():
+    primary = db.engines[None]
+    if primary.dialect.name != "sqlite":
+        print("sync-replicas only copies SQLite databases; use your database's replication.")
+        return
+    for key in replica_keys():
+        replica = db.engines[key]
+        if replica.dialect.name != "sqlite":
+            print(f"Skipping {key}: not SQLite")
+            continue
+        replica.dispose()
+        src, dst = primary.raw_connection(), replica.raw_connection()
+        try:
+            src.driver_connection.backup(dst.driver_connection)
+        finally:
+            dst.close()
+            src.close()
+        print(f"Copied primary to {key} ({replica.url.database})")
+
+# ROUTE: Admin → Streaming export (?format=csv|ndjson + the list filters)
+# kind: appointments | patients | treatments
+@api.get("/api/admin/export/<kind>")
+@require_auth
+@admin_required
+@read_replica
+def admin_export(kind):
+    if kind not in exports.EXPORTS:
+        return jsonify({"error": "Unknown export"}), 404
+    fmt = request.args.get("format", "csv")
+    if fmt not in exports.FORMATS:
+        return jsonify({"error": "Format must be csv or ndjson"}), 400
+
+    # build (and validate) the query before the first byte is sent
+    columns, build = exports.EXPORTS[kind]
+    query = build()
+    stream, mimetype = exports.FORMATS[fmt]
+
+    filename = f"hms-{kind}-{date_type.today().strftime('%Y%m%d')}.{fmt}"
+    return Response(
+        stream_with_context(stream(columns, query)),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
+
 
-# INIT: Background Task Simulation
+# ERROR: Job pool saturated → 429
+@api.app_errorhandler(jobs.QueueFull)
+def _job_queue_full(e):
+    resp = jsonify({"error": "Too many background jobs in progress, please retry"})
+    resp.headers["Retry-After"] = "5"
+    return resp, 429
 
-def simulate_report_generation():
-    import time
-    time.sleep(3)
-    print("Simulating heavy background processing...")
-    with open("simulated_report.txt", "w") as f:
-        f.write("Simulation complete.")
 
-#ROUTE: Background Task Simulation
-@app.get("/api/admin/run-simulation-task")
+# FUNCTION: Queue a job on behalf of the current admin
+def submit_job(kind, params):
+    job = jobs.runner.submit(kind, params, user_id=request.current_user.id)
+    return jsonify(jobs.serialize_job(job)), 202
+
+
+# ROUTE: Admin → Start a background job ({"kind": ..., "params": {...}})
+@api.post("/api/admin/tasks")
 @require_auth
 @admin_required
-def run_simulation_task():
-    thread = threading.Thread(target=simulate_report_generation)
-    thread.start()
+def create_task():
+    data = request.get_json() or {}
+    kind = data.get("kind")
+    if kind not in jobs.HANDLERS:
+        return jsonify({"error": "Unknown task kind", "kinds": sorted(jobs.HANDLERS)}), 400
+    return submit_job(kind, data.get("params") or {})
+
+
+# ROUTE: Admin → Export appointments to CSV in the background
+@api.post("/api/admin/tasks/export-appointments")
+@require_auth
+@admin_required
+def export_appointments_task():
+    data = request.get_json(silent=True) or {}
+    params = {k: data[k] for k in ("status", "date_from", "date_to", "doctor_id") if data.get(k)}
+    return submit_job("export_appointments", params)
+
+
+# ROUTE: Admin → Queue due appointment reminders and send pending notifications now
+# {"hours": 24} overrides REMINDER_HOURS for this run
+@api.post("/api/admin/tasks/reminders")
+@require_auth
+@admin_required
+def reminders_task():
+    data = request.get_json(silent=True) or {}
+    hours = int_arg("hours", data)
+    if hours is not None and hours <= 0:
+        return jsonify({"error": "Invalid hours"}), 400
+    return submit_job("reminders", {"hours": hours} if hours else {})
+
+
+# ROUTE: Admin → Move old completed / cancelled appointments to the archive
+# {"days": 365} overrides ARCHIVE_AFTER_DAYS for this run
+@api.post("/api/admin/tasks/archive")
+@require_auth
+@admin_required
+def archive_task():
+    data = request.get_json(silent=True) or {}
+    days = int_arg("days", data)
+    if days is not None and days < 0:
+        return jsonify({"error": "Invalid days"}), 400
+    return submit_job("archive_appointments", {"days": days} if days is not None else {})
+
+
+# CLI: Queue due reminders and drain the notification outbox once (for cron)
+@api.cli.command("send-notifications")
+@click.option("--hours", type=int, default=None, help="Reminder window (default REMINDER_HOURS)")
+def send_notifications_command(hours):
+    for partition in tenancy.partitions():
+        with tenancy.using(partition):
+            queued = notifications.schedule_reminders(hours)
+            outcome = notifications.dispatcher.drain(delay=0)
+        print(f"Queued {queued} reminders; {outcome or 'nothing to send'}.")
+
+
+# ROUTE: Admin → Recent jobs (newest first)
+@api.get("/api/admin/tasks")
+@require_auth
+@admin_required
+def list_tasks():
+    query = Job.query.order_by(Job.id.desc())
+    status = request.args.get("status")
+    if status:
+        query = query.filter(Job.status == status)
+    return jsonify([jobs.serialize_job(j) for j in query.limit(50)])
+
+
+# ROUTE: Admin → Job status / progress
+@api.get("/api/admin/tasks/<int:jid>")
+@require_auth
+@admin_required
+def task_status(jid):
+    job = Job.query.get_or_404(jid)
+    return jsonify(jobs.serialize_job(job))
+
+
+# ROUTE: Admin → Job result (file download when the job wrote one)
+@api.get("/api/admin/tasks/<int:jid>/result")
+@require_auth
+@admin_required
+def task_result(jid):
+    job = Job.query.get_or_404(jid)
+    if job.status != "done":
+        return jsonify({"error": f"Task is {job.status}"}), 409
+    if job.result_path:
+        return send_file(job.result_path, as_attachment=True)
+    return jsonify(jobs.serialize_job(job)["result"])
+
+
+# ROUTE: Admin → Cancel a job
+@api.post("/api/admin/tasks/<int:jid>/cancel")
+@require_auth
+@admin_required
+def cancel_task(jid):
+    Job.query.get_or_404(jid)
+    if not jobs.runner.cancel(jid):
+        return jsonify({"error": "Task already finished"}), 409
+    return jsonify(jobs.serialize_job(db.session.get(Job, jid)))
+
 
+# ERROR: Unusable import upload → 400
+@api.app_errorhandler(imports.ImportFormatError)
+def _import_format_error(e):
+    return jsonify({"error": str(e)}), 400
+
+
+# ROUTE: Admin → Bulk import (kind: doctors | patients | appointments)
+# Body is a CSV/NDJSON file (multipart "file" or the raw body, ?format=csv|ndjson).
+# The upload is saved and imported by a background job; its result holds the
+# per-row errors.
+@api.post("/api/admin/import/<kind>")
+@require_auth
+@admin_required
+def admin_import(kind):
+    upload = request.files.get("file")
+    fmt = imports.detect_format(
+        request.args.get("format"), upload.filename if upload else None
+    )
+    path = imports.upload_path(os.path.join(jobs.runner.output_dir, "uploads"), fmt)
+    if upload:
+        upload.save(path)
+    else:
+        with open(path, "wb") as f:
+            shutil.copyfileobj(request.stream, f)
+
+    try:
+        imports.check_header(kind, fmt, path)
+    except imports.ImportFormatError:
+        os.remove(path)
+        raise
+
+    job = jobs.runner.submit(
+        "import", {"kind": kind, "format": fmt, "path": path},
+        user_id=request.current_user.id, max_attempts=1,
+    )
+    return jsonify(jobs.serialize_job(job)), 202
+
+
+# CLI: Bulk import from a file (flask --app app import-data patients patients.csv)
+@api.cli.command("import-data")
+@click.argument("kind", type=click.Choice(sorted(imports.REQUIRED)))
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--format", "fmt", type=click.Choice(imports.FORMATS), default=None)
+@click.option("--clinic", default=None, help="Clinic id or slug (default clinic if omitted)")
+def import_data_command(kind, path, fmt, clinic):
+    found = tenancy.find_clinic(clinic or DEFAULT_CLINIC_ID)
+    if not found:
+        raise click.ClickException(f"Unknown clinic {clinic}")
+    g.clinic_id = found.id
+    fmt = imports.detect_format(fmt, path)
+    imports.check_header(kind, fmt, path)
+    report = imports.import_file(
+        kind, path, fmt, progress=lambda rows: print(f"  {rows} rows read", flush=True)
+    )
+    result = report.as_dict()
+    for e in result["errors"]:
+        print(f"  row {e['row']}: {e['error']}")
+    print(f"Imported {result['imported']} of {result['rows']} {kind}; {result['failed']} failed.")
+
+
+#ROUTE: Background report (kept for the dashboard's simulation runner)
+# Queues this month's per-doctor activity report as a real job.
+@api.get("/api/admin/run-simulation-task")
+@require_auth
+@admin_required
+def run_simulation_task():
+    job = jobs.runner.submit("doctor_activity", {}, user_id=request.current_user.id)
     return jsonify({
-        "message": "Simulation started",
-        "details": "A background simulation task is now running."
+        "message": "Report started",
+        "details": "Monthly doctor activity report queued.",
+        "task_id": job.id,
     })
 
 
-@app.get("/api/admin/simulation-task-status")
+@api.get("/api/admin/simulation-task-status")
 @require_auth
 @admin_required
 def simulation_task_status():
+    job = Job.query.filter_by(kind="doctor_activity").order_by(Job.id.desc()).first()
+    if not job:
+        return jsonify({"status": "No report run yet", "task": None})
     return jsonify({
-        "status": "Simulation active",
-        "note": "This background operation is a simulated task for demonstration."
+        "status": f"Report {job.status} ({job.progress}%)",
+        "task": jobs.serialize_job(job),
     })
 
 
 # MAIN
 if __name__ == "__main__":
+    app = create_app()
+    with app.app_context():
+        init_database()
     app.run(debug=True)
@@ -0,0 +1,92 @@
+# SETUP: Imports
+import os
+from datetime import date, datetime, timedelta
+from sqlalchemy import literal, select, union_all
+from sqlalchemy.orm import aliased
+from dba import db, Appointment, ArchivedAppointment
+from jobs import handler
+import sync
+
+# SETUP: Hot / cold appointment storage
+# Completed and cancelled appointments older than ARCHIVE_AFTER_DAYS move from
+# `appointment`, which every listing and booking check reads, to
+# `archived_appointment` (same ids and columns). Treatments stay in place.
+# Listings and booking read the hot table only; the patient history, exports,
+# search results and counter rebuilds read both through all_appointments().
+# Dashboard counters keep counting archived rows: archiving moves history, it
+# does not delete it.
+ARCHIVE_AFTER_DAYS = int(os.environ.get("ARCHIVE_AFTER_DAYS", "365"))
+ARCHIVE_BATCH = int(os.environ.get("ARCHIVE_BATCH", "1000"))
+ARCHIVE_STATUSES = ("Completed", "Cancelled")
+
+# Columns both tables share
+COLUMNS = [c.name for c in Appointment.__table__.columns]
+
+
+# FUNCTION: Appointment entity over hot + archived rows (read-only)
+# Use its attributes like Appointment's: A = all_appointments(); A.date, A.doctor, ...
+def all_appointments():
+    hot, cold = Appointment.__table__, ArchivedAppointment.__table__
+    both = union_all(
+        select(*[hot.c[name] for name in COLUMNS]),
+        select(*[cold.c[name] for name in COLUMNS]),
+    ).subquery("appointment_all")
+    return aliased(Appointment, both, adapt_on_names=True)
+
+
+# FUNCTION: First day that stays hot for a horizon of `days`
+def cutoff_for(days=None):
+    return date.today() - timedelta(days=ARCHIVE_AFTER_DAYS if days is None else days)
+
+
+# FUNCTION: Hot appointments due for archiving
+# (appointment ids are never reused, so archived ids stay unique; see migration 9)
+def candidates(cutoff):
+    return Appointment.query.filter(
+        Appointment.status.in_(ARCHIVE_STATUSES),
+        Appointment.date < cutoff,
+    )
+
+
+# PROCESS: Move one batch to the archive in one transaction; returns rows moved
+# Mirrors get tombstones for the moved rows (they left the hot listings).
+def archive_batch(cutoff):
+    ids = [
+        i for (i,) in candidates(cutoff).with_entities(Appointment.id)
+        .order_by(Appointment.id).limit(ARCHIVE_BATCH)
+    ]
+    if not ids:
+        return 0
+    hot = Appointment.__table__
+    db.session.execute(ArchivedAppointment.__table__.insert().from_select(
+        COLUMNS + ["archived_at"],
+        select(*[hot.c[name] for name in COLUMNS], literal(datetime.utcnow()))
+        .where(hot.c.id.in_(ids)),
+    ))
+    batch = Appointment.query.filter(Appointment.id.in_(ids))
+    sync.record_removed(batch)
+    batch.delete(synchronize_session=False)
+    db.session.commit()
+    return len(ids)
+
+
+# PROCESS: Archive everything before `cutoff` in batches; returns rows moved
+# `progress(moved, total)` is called after each batch.
+def archive(cutoff, progress=None):
+    total = candidates(cutoff).order_by(None).count()
+    moved = 0
+    while True:
+        n = archive_batch(cutoff)
+        if not n:
+            return moved
+        moved += n
+        if progress:
+            progress(moved, total)
+
+
+# JOB: Archive old appointments (params: days, default ARCHIVE_AFTER_DAYS)
+@handler("archive_appointments")
+def archive_appointments(ctx, params):
+    cutoff = cutoff_for(params.get("days"))
+    moved = archive(cutoff, lambda moved, total: ctx.progress(moved * 100 // max(total, 1)))
+    return {"archived": moved, "before": cutoff.isoformat()}
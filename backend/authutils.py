@@ -1,13 +1,96 @@
 # SETUP: Imports
 import jwt
-from flask import request, jsonify
+from flask import g, request, jsonify
 from functools import wraps
 from datetime import datetime, timedelta
-from dba import User, ROLE_ADMIN, ROLE_DOCTOR, ROLE_PATIENT
-from dba import db
+from collections import OrderedDict
+from dba import User, ROLE_ADMIN, ROLE_DOCTOR, ROLE_PATIENT, DEFAULT_CLINIC_ID
+from dba import db, current_clinic_id
 import os
+import threading
+import time
 
 SECRET_KEY = os.environ.get("SECRET_KEY", "my-fallback-secret-key")
+TOKEN_HOURS = 6
+
+# SETUP: Auth cache settings (AUTH_CACHE_SIZE=0 disables caching)
+AUTH_CACHE_SIZE = int(os.environ.get("AUTH_CACHE_SIZE", "1024"))
+AUTH_CACHE_TTL = int(os.environ.get("AUTH_CACHE_TTL", "60"))
+
+
+# CACHE: Small thread-safe LRU with a per-entry TTL
+class TTLCache:
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return entry[1]
+
+    def put(self, key, value, ttl=None):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + (ttl or self.ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def pop_where(self, predicate):
+        with self._lock:
+            for key in [k for k, (_, v) in self._data.items() if predicate(v)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+# decoded token → claims, (clinic id, user id) → profile dict
+# (user ids are only unique per database, and clinics may have their own)
+token_cache = TTLCache(AUTH_CACHE_SIZE, AUTH_CACHE_TTL)
+profile_cache = TTLCache(AUTH_CACHE_SIZE, AUTH_CACHE_TTL)
+
+
+
+# CLASS: Request principal built from verified token claims
+# Role checks need no database access; handlers that need the full row use
+# `.user`, which is loaded once on first access.
+class Principal:
+    __slots__ = ("id", "username", "role", "clinic_id", "_user")
+
+    def __init__(self, claims):
+        self.id = claims["id"]
+        self.username = claims["username"]
+        self.role = claims["role"]
+        self.clinic_id = token_clinic(claims)
+        self._user = None
+
+    @property
+    def user(self):
+        if self._user is None:
+            self._user = db.session.get(User, self.id)
+        return self._user
+
+# FUNCTION: Clinic named by token claims (tokens from before multi-clinic
+# support belong to the default clinic)
+def token_clinic(claims):
+    return claims.get("clinic_id", DEFAULT_CLINIC_ID)
+
 
 # FUNCTION: Create JWT
 def create_token(user):
@@ -15,7 +98,8 @@ def create_token(user):
         "id": user.id,
         "username": user.username,
         "role": user.role,
-        "exp": datetime.utcnow() + timedelta(hours=6)
+        "clinic_id": user.clinic_id,
+        "exp": datetime.utcnow() + timedelta(hours=TOKEN_HOURS)
     }
     return jwt.encode(payload, SECRET_KEY, algorithm="HS256")
 
@@ -39,16 +123,63 @@ def require_auth(f):
             return jsonify({"error": "Missing or invalid token"}), 401
 
         token = auth_header.split(" ")[1]
-        data = decode_token(token)
-
-        if not data:
+        data = token_cache.get(token)
+        if data is None or data["exp"] <= time.time():
+            data = decode_token(token)
+            if not data:
+                return jsonify({"error": "Token expired or invalid"}), 401
+            token_cache.put(token, data)
+
+        g.clinic_id = token_clinic(data)
+        if not account_active(data):
             return jsonify({"error": "Token expired or invalid"}), 401
 
-        request.current_user = User.query.get(data["id"])
+        request.current_user = Principal(data)
         return f(*args, **kwargs)
     return wrapper
 
 
+# FUNCTION: Does the token's account still exist with the same name and role?
+# Read through profile_cache, so every worker notices a deleted account (or a
+# reused id) within AUTH_CACHE_TTL; the worker that deletes it at once.
+# Needs g.clinic_id set to the token's clinic.
+def account_active(claims):
+    profile = load_profile(claims["id"])
+    return bool(
+        profile and profile["username"] == claims["username"] and profile["role"] == claims["role"]
+    )
+
+
+# FUNCTION: Cached profile dict for a user id (None if the user is gone)
+def load_profile(user_id):
+    key = (current_clinic_id(), user_id)
+    profile = profile_cache.get(key)
+    if profile is None:
+        user = db.session.get(User, user_id)
+        if not user:
+            return None
+        profile = {
+            "id": user.id,
+            "username": user.username,
+            "name": user.name,
+            "email": user.email,
+            "role": user.role,
+            "clinic_id": user.clinic_id,
+        }
+        profile_cache.put(key, profile)
+    return profile
+
+
+# FUNCTION: Drop cached state for a user of the current clinic after an admin update / delete
+# Other workers pick the change up when their profile_cache entry expires.
+def invalidate_user(user_id):
+    clinic_id = current_clinic_id()
+    profile_cache.pop((clinic_id, user_id))
+    token_cache.pop_where(
+        lambda claims: claims["id"] == user_id and token_clinic(claims) == clinic_id
+    )
+
+
 # ROLE: Admin-only access
 def admin_required(f):
     @wraps(f)
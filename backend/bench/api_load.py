@@ -0,0 +1,401 @@
+# BENCH: API load test with saved, comparable results
+#
+#   cd backend && python -m bench.api_load --target client --out before.json
+#   cd backend && python -m bench.api_load --target wsgi --compare before.json
+#   cd backend && python -m bench.api_load --target http://127.0.0.1:5000 --patients 20000
+#
+# Scenarios (each runs --concurrency threads for --seconds):
+#   login        login storm over random seeded patients (bcrypt-bound)
+#   booking      patients racing for a few hot slots (201 booked / 400 taken)
+#   dashboard    patient / doctor / admin dashboard refreshes
+#   admin_list   admin paging through every appointment (keyset cursors)
+#
+# --target client drives the Flask test client in-process; --target wsgi serves
+# the app from a threaded WSGI server on a free port and talks HTTP to it. Both
+# seed a fresh temp database first (see bench.seed). Any other --target is taken
+# as the base URL of an already-running server whose database was seeded with
+# bench.seed using the same --doctors/--patients and the bench password.
+#
+# Results (p50/p95/p99 latency, throughput, status codes per scenario) are
+# printed and, with --out, saved as JSON. --compare prints the change against
+# a saved run and exits 1 when p95 or throughput regress by more than --tolerance %.
+
+# SETUP: Imports
+import argparse
+import http.client
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import date, timedelta
+from urllib.parse import urlsplit
+
+from bench import seed
+
+SCENARIOS = ("login", "booking", "dashboard", "admin_list")
+HOT_DOCTORS = 2
+BOOKING_PATIENTS = 16
+PAGE_LIMIT = 100
+
+
+# CLASS: In-process transport (Flask test client, one per thread)
+class ClientTransport:
+    def __init__(self, app):
+        self.app = app
+        self.local = threading.local()
+
+    def request(self, method, path, body=None, token=None):
+        client = getattr(self.local, "client", None)
+        if client is None:
+            client = self.local.client = self.app.test_client()
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        resp = client.open(path, method=method, json=body, headers=headers)
+        return resp.status_code, resp.headers, resp.get_data()
+
+
+# CLASS: HTTP transport (one keep-alive connection per thread)
+class HttpTransport:
+    def __init__(self, base_url):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.local = threading.local()
+
+    def request(self, method, path, body=None, token=None):
+        headers = {"Content-Type": "application/json"}
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        payload = json.dumps(body) if body is not None else None
+        for attempt in (1, 2):
+            conn = getattr(self.local, "conn", None)
+            if conn is None:
+                conn = self.local.conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            try:
+                conn.request(method, path, payload, headers)
+                resp = conn.getresponse()
+                return resp.status, resp.headers, resp.read()
+            except (http.client.HTTPException, ConnectionError):
+                # the server closed an idle keep-alive connection: reconnect once
+                conn.close()
+                self.local.conn = None
+                if attempt == 2:
+                    raise
+
+
+# FUNCTION: p-th percentile of a sorted list (ms)
+# (bench.login_throughput has the same helper, but importing it would load
+# hashing before BCRYPT_ROUNDS is set for the seeded database)
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[k] * 1000
+
+
+# FUNCTION: JSON body of a response, or raise with the status
+def _json(result):
+    status, _, body = result
+    if status >= 400:
+        raise RuntimeError(f"HTTP {status}: {body[:200]!r}")
+    return json.loads(body)
+
+
+# FUNCTION: Log in and return a token
+def login(transport, username, password):
+    return _json(transport.request(
+        "POST", "/api/login", {"username": username, "password": password}
+    ))["token"]
+
+
+# CLASS: Shared state the scenarios draw from
+class Context:
+    def __init__(self, transport, args):
+        self.transport = transport
+        self.args = args
+        self.admin = login(transport, "admin", args.admin_password)
+        self.doctor_ids = [d["id"] for d in _json(
+            transport.request("GET", "/api/doctors?limit=500", token=self.admin)
+        )]
+        self.doctor_tokens = [
+            login(transport, seed.doctor_username(i), seed.PASSWORD)
+            for i in range(min(4, args.doctors))
+        ]
+        self.patient_tokens = [
+            login(transport, seed.patient_username(i), seed.PASSWORD)
+            for i in range(min(BOOKING_PATIENTS, args.patients))
+        ]
+        # far-future weekdays no seeded row uses; shifted per run so reruns
+        # against one database still contend for free slots
+        first = date(2040, 1, 2) + timedelta(weeks=int(time.time()) // 60 % 2000)
+        self.hot_slots = [
+            (
+                self.doctor_ids[i % HOT_DOCTORS],
+                first + timedelta(days=i // (HOT_DOCTORS * 4)),
+                f"{9 + i // HOT_DOCTORS % 4:02d}:00",
+            )
+            for i in range(args.hot_slots)
+        ]
+
+
+# FUNCTION: Scenario steps; each returns the status codes of the requests it made
+def login_step(ctx, rng):
+    username = seed.patient_username(rng.randrange(ctx.args.patients))
+    status, _, _ = ctx.transport.request(
+        "POST", "/api/login", {"username": username, "password": seed.PASSWORD}
+    )
+    return [status]
+
+
+def booking_step(ctx, rng):
+    doctor_id, day, slot = rng.choice(ctx.hot_slots)
+    status, _, _ = ctx.transport.request(
+        "POST", "/api/patient/appointments",
+        {"doctor_id": doctor_id, "date": day.isoformat(), "time": slot},
+        token=rng.choice(ctx.patient_tokens),
+    )
+    return [status]
+
+
+DASHBOARDS = {
+    "patient": ("/api/me", "/api/patient/appointments", "/api/doctors", "/api/departments"),
+    "doctor": ("/api/me", "/api/doctor/appointments"),
+    "admin": ("/api/admin/summary", "/api/admin/doctors", "/api/admin/appointments?limit=20"),
+}
+
+
+def dashboard_step(ctx, rng):
+    role = rng.choices(("patient", "doctor", "admin"), weights=(6, 3, 1))[0]
+    token = {
+        "patient": rng.choice(ctx.patient_tokens),
+        "doctor": rng.choice(ctx.doctor_tokens),
+        "admin": ctx.admin,
+    }[role]
+    return [ctx.transport.request("GET", path, token=token)[0] for path in DASHBOARDS[role]]
+
+
+def admin_list_step(ctx, rng):
+    local = ctx.cursors
+    path = f"/api/admin/appointments?limit={PAGE_LIMIT}"
+    if getattr(local, "cursor", None):
+        path += "&cursor=" + local.cursor
+    status, headers, _ = ctx.transport.request("GET", path, token=ctx.admin)
+    local.cursor = headers.get("X-Next-Cursor")
+    return [status]
+
+
+STEPS = {
+    "login": login_step,
+    "booking": booking_step,
+    "dashboard": dashboard_step,
+    "admin_list": admin_list_step,
+}
+
+
+# PROCESS: Run one scenario from many threads for a fixed duration
+def run_scenario(ctx, name, concurrency, seconds, warmup):
+    step = STEPS[name]
+    ctx.cursors = threading.local()
+    latencies, statuses, errors = [], Counter(), Counter()
+    lock = threading.Lock()
+    start = threading.Barrier(concurrency)
+    window = {}
+
+    def worker(n):
+        rng = random.Random(n)
+        local, codes, failures = [], Counter(), Counter()
+        start.wait()
+        while True:
+            begin = time.perf_counter()
+            if begin >= window["end"]:
+                break
+            try:
+                result = step(ctx, rng)
+            except Exception as e:
+                failures[type(e).__name__] += 1
+                continue
+            if begin >= window["measure"]:
+                local.append(time.perf_counter() - begin)
+                codes.update(result)
+        with lock:
+            latencies.extend(local)
+            statuses.update(codes)
+            errors.update(failures)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(concurrency)]
+    now = time.perf_counter()
+    window["measure"] = now + warmup
+    window["end"] = now + warmup + seconds
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    latencies.sort()
+    return {
+        "operations": len(latencies),
+        "seconds": seconds,
+        "concurrency": concurrency,
+        "throughput": len(latencies) / seconds,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "max_ms": latencies[-1] * 1000 if latencies else 0.0,
+        "statuses": {str(k): v for k, v in sorted(statuses.items())},
+        "errors": dict(errors),
+    }
+
+
+# SETUP: Fresh temp database, seeded, and the app bound to it
+def local_app(args):
+    url = "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="hms-load-"), "hms.db")
+    os.environ["BCRYPT_ROUNDS"] = str(args.bcrypt_rounds)
+    from app import create_app, init_database
+    from dba import db
+    from hashing import hash_password
+
+    app = create_app({"SQLALCHEMY_DATABASE_URI": url})
+    started = time.perf_counter()
+    with app.app_context():
+        init_database()
+    with app.app_context(), db.engine.begin() as conn:
+        counts = seed.seed(
+            conn, args.doctors, args.patients, args.appointments,
+            hash_password(seed.PASSWORD), random.Random(args.seed),
+        )
+    print(f"Seeded {counts} into {url} in {time.perf_counter() - started:.1f}s")
+    return app
+
+
+# SETUP: Threaded WSGI server on a free port
+def serve(app):
+    from werkzeug.serving import make_server
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.port}"
+
+
+# FUNCTION: Where this run came from (for comparing saved results)
+def environment(args):
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "target": args.target,
+        "doctors": args.doctors,
+        "patients": args.patients,
+        "appointments": args.appointments,
+        "bcrypt_rounds": args.bcrypt_rounds,
+        "concurrency": args.concurrency,
+        "seconds": args.seconds,
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+# OUTPUT: Change against a saved run; returns True when something regressed
+def compare(results, environment_now, baseline, tolerance):
+    regressed = False
+    mismatched = [
+        key for key in ("target", "cpus", "doctors", "patients", "appointments",
+                        "bcrypt_rounds", "concurrency")
+        if baseline.get("environment", {}).get(key) != environment_now.get(key)
+    ]
+    if mismatched:
+        print(f"\nwarning: baseline differs in {', '.join(mismatched)}; numbers may not be comparable")
+    print(f"\n{'scenario':<12} {'metric':<11} {'baseline':>10} {'now':>10} {'change':>8}")
+    for name, now in results.items():
+        before = baseline.get("scenarios", {}).get(name)
+        if not before:
+            continue
+        for metric, worse_if_higher in (("p50_ms", True), ("p95_ms", True), ("p99_ms", True),
+                                        ("throughput", False)):
+            old, new = before[metric], now[metric]
+            change = (new - old) / old * 100 if old else 0.0
+            flag = ""
+            if metric in ("p95_ms", "throughput"):
+                if (change if worse_if_higher else -change) > tolerance:
+                    flag = "  REGRESSED"
+                    regressed = True
+            print(f"{name:<12} {metric:<11} {old:>10.1f} {new:>10.1f} {change:>+7.1f}%{flag}")
+    return regressed
+
+
+# MAIN
+def main():
+    parser = argparse.ArgumentParser(description="HMS API load test")
+    parser.add_argument("--target", default="client", help="client, wsgi or a base URL")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--warmup", type=float, default=1)
+    parser.add_argument("--doctors", type=int, default=50)
+    parser.add_argument("--patients", type=int, default=20000)
+    parser.add_argument("--appointments", type=int, default=100000)
+    parser.add_argument("--hot-slots", type=int, default=20)
+    parser.add_argument("--bcrypt-rounds", type=int, default=12)
+    parser.add_argument("--admin-password", default="admin")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="save results as JSON")
+    parser.add_argument("--compare", help="saved JSON results to compare against")
+    parser.add_argument("--tolerance", type=float, default=10, help="allowed regression, percent")
+    args = parser.parse_args()
+
+    names = [s for s in args.scenarios.split(",") if s]
+    unknown = set(names) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    server = None
+    if args.target == "client":
+        transport = ClientTransport(local_app(args))
+    elif args.target == "wsgi":
+        server, base_url = serve(local_app(args))
+        transport = HttpTransport(base_url)
+    else:
+        transport = HttpTransport(args.target)
+
+    ctx = Context(transport, args)
+    results = {}
+    for name in names:
+        result = results[name] = run_scenario(ctx, name, args.concurrency, args.seconds, args.warmup)
+        print(f"{name:<12} {result['operations']:>7} ops  {result['throughput']:>8.1f}/s  "
+              f"p50 {result['p50_ms']:>7.1f} ms  p95 {result['p95_ms']:>7.1f} ms  "
+              f"p99 {result['p99_ms']:>7.1f} ms  statuses {result['statuses']}"
+              + (f"  errors {result['errors']}" if result["errors"] else ""))
+    if "booking" in results:
+        booked = results["booking"]["statuses"].get("201", 0)
+        print(f"booking: {booked} booked for {len(set(ctx.hot_slots))} hot slots")
+
+    if server is not None:
+        server.shutdown()
+
+    report = {"environment": environment(args), "scenarios": results}
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved results to {args.out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(results, report["environment"], baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+# BENCH: Hot-path latency as appointment history grows, with and without archiving
+#
+#   cd backend && python -m bench.archive_hotpath --history 0,50000,200000
+#
+# For each --history size, seeds a fresh temp database with the same hot set
+# (bench.seed: --appointments around today) plus that many completed /
+# cancelled appointments older than ARCHIVE_AFTER_DAYS, then times the hot
+# endpoints through the Flask test client:
+#   admin_first    admin list, first page (no filters)
+#   admin_booked   admin list ?status=Booked
+#   doctor_list    doctor's own list, first page
+#   patient_list   patient's own list, first page
+#   slots          free slots of one doctor on one day
+#   book           booking a free slot
+#   history        patient history (reads hot + archived rows)
+# It then archives the old rows (archive.archive) and times the same endpoints
+# again. Medians in ms; "hot rows" is what the appointment table holds.
+
+# SETUP: Imports
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import date, timedelta
+
+from bench import seed
+
+ENDPOINTS = (
+    "admin_first", "admin_booked", "doctor_list", "patient_list", "slots", "book", "history",
+)
+
+
+# PROCESS: Completed / cancelled rows before `cutoff`, one per free (doctor, day, slot)
+def add_history(conn, count, cutoff, rng):
+    from dba import User, Appointment, ROLE_DOCTOR, ROLE_PATIENT
+    from slots import DEFAULT_TEMPLATE, day_grid
+
+    users = User.__table__
+    doctor_ids = [r[0] for r in conn.execute(
+        users.select().with_only_columns(users.c.id).where(users.c.role == ROLE_DOCTOR)
+    )]
+    patient_ids = [r[0] for r in conn.execute(
+        users.select().with_only_columns(users.c.id).where(users.c.role == ROLE_PATIENT)
+    )]
+    grid = day_grid(*DEFAULT_TEMPLATE[0])
+    rows, day = [], cutoff - timedelta(days=1)
+    while len(rows) < count:
+        if day.weekday() < 5:
+            for slot in grid:
+                for doctor_id in doctor_ids:
+                    status = "Completed" if rng.random() < 0.8 else "Cancelled"
+                    rows.append({
+                        "doctor_id": doctor_id, "patient_id": rng.choice(patient_ids),
+                        "date": day, "time": slot, "status": status,
+                        "diagnosis": rng.choice(seed.DIAGNOSES) if status == "Completed" else "",
+                        "prescription": "",
+                    })
+        day -= timedelta(days=1)
+    seed._insert(conn, Appointment.__table__, rows[:count])
+
+
+# FUNCTION: Median latency (ms) per endpoint
+def measure(client, tokens, ids, repeat, book_day):
+    admin, doctor, patient = tokens
+    doctor_id, patient_id = ids
+    today = date.today().isoformat()
+
+    def auth(token):
+        return {"Authorization": f"Bearer {token}"}
+
+    free = iter(
+        (book_day + timedelta(days=d)).isoformat() for d in range(repeat * 2)
+    )
+    requests = {
+        "admin_first": lambda: client.get("/api/admin/appointments?limit=50", headers=auth(admin)),
+        "admin_booked": lambda: client.get(
+            "/api/admin/appointments?status=Booked&limit=50", headers=auth(admin)
+        ),
+        "doctor_list": lambda: client.get("/api/doctor/appointments?limit=50", headers=auth(doctor)),
+        "patient_list": lambda: client.get("/api/patient/appointments?limit=50", headers=auth(patient)),
+        "slots": lambda: client.get(f"/api/doctors/{doctor_id}/slots?date={today}", headers=auth(patient)),
+        "book": lambda: client.post("/api/patient/appointments", json={
+            "doctor_id": doctor_id, "date": next(free), "time": "10:00",
+        }, headers=auth(patient)),
+        "history": lambda: client.get(
+            f"/api/patients/{patient_id}/history?limit=50", headers=auth(admin)
+        ),
+    }
+    report = {}
+    for name in ENDPOINTS:
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            resp = requests[name]()
+            timings.append(time.perf_counter() - started)
+            if resp.status_code >= 400:
+                raise RuntimeError(f"{name}: {resp.status_code} {resp.get_data(as_text=True)}")
+        report[name] = statistics.median(timings) * 1000
+    return report
+
+
+# PROCESS: One history size: seed, measure, archive, measure
+def run(history, args, workdir):
+    from app import create_app, init_database
+    from dba import db, Appointment
+    from hashing import hash_password
+    import archive
+
+    path = os.path.join(workdir, f"history-{history}.db")
+    app = create_app({"SQLALCHEMY_DATABASE_URI": "sqlite:///" + path})
+    cutoff = archive.cutoff_for()
+    with app.app_context():
+        init_database(seed.PASSWORD)
+    with app.app_context(), db.engine.begin() as conn:
+        seed.seed(conn, args.doctors, args.patients, args.appointments,
+                  hash_password(seed.PASSWORD), random.Random(0))
+        add_history(conn, history, cutoff, random.Random(1))
+
+    client = app.test_client()
+
+    def login(username):
+        resp = client.post("/api/login", json={"username": username, "password": seed.PASSWORD})
+        return resp.get_json()["token"]
+
+    tokens = (login("admin"), login(seed.doctor_username(0)), login(seed.patient_username(0)))
+    with app.app_context():
+        from dba import User
+        ids = tuple(
+            User.query.filter_by(username=name).first().id
+            for name in (seed.doctor_username(0), seed.patient_username(0))
+        )
+        hot_before = Appointment.query.count()
+
+    # bookings land far ahead, on days nobody else uses (a new window per phase)
+    book_day = date.today() + timedelta(days=3650)
+    client.get("/api/admin/appointments?limit=1", headers={"Authorization": f"Bearer {tokens[0]}"})
+    before = measure(client, tokens, ids, args.repeat, book_day)
+
+    started = time.perf_counter()
+    with app.app_context():
+        moved = archive.archive(cutoff)
+        hot_after = Appointment.query.count()
+    archive_seconds = time.perf_counter() - started
+    after = measure(client, tokens, ids, args.repeat, book_day + timedelta(days=args.repeat * 2))
+    return (history, hot_before, before), (history, hot_after, after), moved, archive_seconds
+
+
+# FUNCTION: Print one table row
+def show(label, history, hot, report):
+    cells = "".join(f"{report[name]:>14.2f}" for name in ENDPOINTS)
+    print(f"{label:<10}{history:>10}{hot:>10}{cells}")
+
+
+# MAIN
+def main():
+    parser = argparse.ArgumentParser(description="Hot-path latency vs. archived history")
+    parser.add_argument("--history", default="0,50000,200000",
+                        help="Comma-separated counts of old appointments")
+    parser.add_argument("--doctors", type=int, default=50)
+    parser.add_argument("--patients", type=int, default=5000)
+    parser.add_argument("--appointments", type=int, default=20000,
+                        help="Hot appointments (around today)")
+    parser.add_argument("--repeat", type=int, default=30)
+    args = parser.parse_args()
+
+    os.environ.setdefault("BCRYPT_ROUNDS", "4")
+    os.environ.setdefault("NOTIFY_WORKER", "0")
+    workdir = tempfile.mkdtemp(prefix="hms-bench-")
+
+    results = []
+    for history in (int(h) for h in args.history.split(",")):
+        unarchived, archived, moved, seconds = run(history, args, workdir)
+        print(f"history {history}: archived {moved} rows in {seconds:.1f}s")
+        results.append((unarchived, archived))
+
+    print(f"\n{'':<10}{'history':>10}{'hot rows':>10}" + "".join(f"{n:>14}" for n in ENDPOINTS))
+    for unarchived, archived in results:
+        show("in place", *unarchived)
+        show("archived", *archived)
+
+
+if __name__ == "__main__":
+    main()
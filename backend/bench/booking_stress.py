@@ -0,0 +1,117 @@
+# BENCH: Concurrent booking stress test on hot slots
+#
+#   cd backend && python -m bench.booking_stress --threads 16 --attempts 4000 --slots 20
+#
+# Many threads book a handful of hot doctor slots at once through
+# booking.book(). Every slot must end up with exactly one appointment; the
+# run fails (exit 1) if any duplicate gets through.
+
+# SETUP: Imports
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, time as dtime
+from flask import Flask
+from sqlalchemy import func
+
+import booking
+from dba import db, User, Appointment, ROLE_DOCTOR, ROLE_PATIENT
+from migrations import upgrade
+
+
+# FUNCTION: Temp app + database with doctors and patients
+def make_app(doctors, patients):
+    path = os.path.join(tempfile.mkdtemp(prefix="hms-stress-"), "hms.db")
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + path
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {"connect_args": {"timeout": 30}}
+    db.init_app(app)
+
+    with app.app_context():
+        upgrade()
+        users = [
+            User(username=f"doc{i}", name=f"Doctor {i}", email=f"doc{i}@example.com",
+                 password_hash="x", role=ROLE_DOCTOR)
+            for i in range(doctors)
+        ] + [
+            User(username=f"pat{i}", name=f"Patient {i}", email=f"pat{i}@example.com",
+                 password_hash="x", role=ROLE_PATIENT)
+            for i in range(patients)
+        ]
+        db.session.add_all(users)
+        db.session.commit()
+        doctor_ids = [u.id for u in users if u.role == ROLE_DOCTOR]
+        patient_ids = [u.id for u in users if u.role == ROLE_PATIENT]
+    return app, doctor_ids, patient_ids
+
+
+# MAIN
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent booking stress test")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--attempts", type=int, default=4000)
+    parser.add_argument("--slots", type=int, default=20, help="number of hot slots")
+    parser.add_argument("--patients", type=int, default=500)
+    args = parser.parse_args()
+
+    app, doctor_ids, patient_ids = make_app(doctors=4, patients=args.patients)
+    slots = [
+        (random.choice(doctor_ids), date(2030, 1, 1 + i % 28), dtime(9 + i % 8, 0))
+        for i in range(args.slots)
+    ]
+
+    outcome = {"booked": 0, "rejected": 0, "errors": 0}
+    lock = threading.Lock()
+    start = threading.Barrier(args.threads)
+
+    def worker(n):
+        rng = random.Random(n)
+        start.wait()
+        for _ in range(args.attempts // args.threads):
+            doctor_id, day, slot = rng.choice(slots)
+            with app.app_context():
+                try:
+                    booking.book(doctor_id, rng.choice(patient_ids), day, slot)
+                    key = "booked"
+                except booking.SlotUnavailable:
+                    key = "rejected"
+                except Exception as e:
+                    db.session.rollback()
+                    print("error:", e, file=sys.stderr)
+                    key = "errors"
+            with lock:
+                outcome[key] += 1
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(args.threads)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        duplicates = (
+            db.session.query(Appointment.doctor_id, Appointment.date, Appointment.time)
+            .group_by(Appointment.doctor_id, Appointment.date, Appointment.time)
+            .having(func.count() > 1)
+            .count()
+        )
+        total = Appointment.query.count()
+
+    attempts = sum(outcome.values())
+    print(f"{attempts} attempts on {len(set(slots))} hot slots with {args.threads} threads "
+          f"in {elapsed:.2f}s ({attempts / elapsed:.0f} req/s)")
+    print(f"booked={outcome['booked']} rejected={outcome['rejected']} "
+          f"errors={outcome['errors']} rows={total} duplicates={duplicates}")
+
+    if duplicates or outcome["booked"] != total:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
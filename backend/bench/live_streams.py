@@ -0,0 +1,69 @@
+# BENCH: Cost of idle live-event streams and of fanning events out to them
+#
+#   cd backend && python -m bench.live_streams --streams 5000 --doctors 50
+#
+# Opens --streams subscriptions on the in-process hub (spread over doctors,
+# patients and a few admins, as a clinic would) without any HTTP server, then
+# reports the memory each idle stream holds and the time to dispatch one
+# appointment event, which only touches that event's doctor, patient and the
+# admins. The HTTP side adds one blocked thread (or greenlet under gevent) per
+# stream; no database connection is held while a stream is idle.
+
+# SETUP: Imports
+import argparse
+import os
+import random
+import time
+import tracemalloc
+from datetime import date, time as time_of_day
+
+
+# MAIN
+def main():
+    parser = argparse.ArgumentParser(description="Live event fan-out benchmark")
+    parser.add_argument("--streams", type=int, default=5000)
+    parser.add_argument("--doctors", type=int, default=50)
+    parser.add_argument("--admins", type=int, default=5)
+    parser.add_argument("--events", type=int, default=20000)
+    args = parser.parse_args()
+
+    os.environ.setdefault("NOTIFY_WORKER", "0")
+    import live
+    from dba import ROLE_ADMIN, ROLE_DOCTOR, ROLE_PATIENT, DEFAULT_CLINIC_ID
+
+    live.LIVE_QUEUE_SIZE = args.events     # nothing drains the queues here
+    clinic = DEFAULT_CLINIC_ID
+    hub = live.Hub()
+    rng = random.Random(0)
+    patients = max(args.streams - args.doctors - args.admins, 1)
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    subscriptions = [hub.subscribe(ROLE_ADMIN, clinic, 1) for _ in range(args.admins)]
+    subscriptions += [hub.subscribe(ROLE_DOCTOR, clinic, d) for d in range(args.doctors)]
+    subscriptions += [hub.subscribe(ROLE_PATIENT, clinic, 1000 + p) for p in range(patients)]
+    per_stream = sum(
+        s.size_diff for s in tracemalloc.take_snapshot().compare_to(before, "filename")
+    ) / len(subscriptions)
+    tracemalloc.stop()
+
+    events = [
+        live._event(
+            "created", clinic, i, rng.randrange(args.doctors), 1000 + rng.randrange(patients),
+            date(2031, 1, 1), time_of_day(10, 0), "Booked",
+        )
+        for i in range(args.events)
+    ]
+    started = time.perf_counter()
+    for e in events:
+        hub.dispatch([e])
+    elapsed = time.perf_counter() - started
+
+    delivered = sum(len(s.events) for s in subscriptions)
+    print(f"{len(subscriptions)} idle streams: {per_stream:.0f} bytes each")
+    print(f"{args.events} events: {elapsed / args.events * 1e6:.1f} us per event, "
+          f"{delivered / args.events:.1f} deliveries per event")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# BENCH: Login (password check) throughput under concurrent load
+#
+#   cd backend && python -m bench.login_throughput --clients 64 --seconds 5 --rounds 10
+#
+# Each client thread verifies a password in a loop, either inline (the old
+# request-thread bcrypt call) or through hashing.check_password (bounded
+# pool with 429 backpressure). Prints throughput, rejections and latency
+# percentiles for both modes.
+
+# SETUP: Imports
+import argparse
+import statistics
+import threading
+import time
+import bcrypt
+
+import hashing
+
+
+# FUNCTION: p-th percentile of a sorted list (ms)
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[k] * 1000
+
+
+# FUNCTION: Drive `check` from many threads for a fixed duration
+def run(check, clients, seconds):
+    latencies, rejected = [], [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def client():
+        local, busy = [], 0
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                check()
+                local.append(time.perf_counter() - started)
+            except hashing.HashingBusy:
+                busy += 1
+                time.sleep(0.01)
+        with lock:
+            latencies.extend(local)
+            rejected[0] += busy
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    latencies.sort()
+    return {
+        "ok": len(latencies),
+        "rejected": rejected[0],
+        "per_sec": len(latencies) / seconds,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "mean_ms": statistics.mean(latencies) * 1000 if latencies else 0.0,
+    }
+
+
+# MAIN
+def main():
+    parser = argparse.ArgumentParser(description="Login throughput benchmark")
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--rounds", type=int, default=hashing.BCRYPT_ROUNDS)
+    args = parser.parse_args()
+
+    password = "correct horse battery staple"
+    pw_hash = bcrypt.hashpw(password.encode(), bcrypt.gensalt(args.rounds)).decode()
+
+    modes = {
+        "inline": lambda: bcrypt.checkpw(password.encode(), pw_hash.encode()),
+        "pool": lambda: hashing.check_password(password, pw_hash),
+    }
+    print(f"{args.clients} clients, {args.seconds}s, cost {args.rounds}, "
+          f"pool {hashing.HASH_WORKERS} workers + {hashing.HASH_QUEUE} queued")
+    for name, check in modes.items():
+        r = run(check, args.clients, args.seconds)
+        print(f"  {name:6s} {r['per_sec']:8.1f} logins/s  ok={r['ok']} 429={r['rejected']}  "
+              f"p50={r['p50_ms']:.1f}ms p95={r['p95_ms']:.1f}ms p99={r['p99_ms']:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+# BENCH: Appointment query plans before / after the Date/Time + index migration
+#
+#   cd backend && python -m bench.query_plans --appointments 200000
+#
+# Seeds a temp SQLite file with the legacy (string, unindexed) schema, prints
+# EXPLAIN QUERY PLAN and timings for the booking conflict check and the
+# listing queries, runs migrations.upgrade() on the same file and repeats.
+
+# SETUP: Imports
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import date, timedelta
+from flask import Flask
+
+from dba import db
+from migrations import upgrade
+
+# SETUP: Schema as shipped before migration 1
+LEGACY_SCHEMA = """
+CREATE TABLE department (id INTEGER NOT NULL, name VARCHAR(200) NOT NULL,
+    description VARCHAR(500), PRIMARY KEY (id), UNIQUE (name));
+CREATE TABLE user (id INTEGER NOT NULL, username VARCHAR(80) NOT NULL,
+    password_hash VARCHAR(200) NOT NULL, name VARCHAR(120) NOT NULL,
+    email VARCHAR(200) NOT NULL, role VARCHAR(20) NOT NULL, specialization VARCHAR(200),
+    department_id INTEGER, PRIMARY KEY (id), UNIQUE (username), UNIQUE (email),
+    FOREIGN KEY(department_id) REFERENCES department (id));
+CREATE TABLE appointment (id INTEGER NOT NULL, doctor_id INTEGER NOT NULL,
+    patient_id INTEGER NOT NULL, date VARCHAR NOT NULL, time VARCHAR NOT NULL,
+    status VARCHAR, diagnosis VARCHAR, prescription VARCHAR, PRIMARY KEY (id),
+    FOREIGN KEY(doctor_id) REFERENCES user (id), FOREIGN KEY(patient_id) REFERENCES user (id));
+CREATE TABLE treatment (id INTEGER NOT NULL, appointment_id INTEGER,
+    diagnosis VARCHAR(500), prescription VARCHAR(500), notes VARCHAR(500), PRIMARY KEY (id),
+    FOREIGN KEY(appointment_id) REFERENCES appointment (id));
+"""
+
+# SETUP: Hot-path queries (time literal is filled per phase)
+QUERIES = {
+    "booking_conflict": (
+        "SELECT id FROM appointment WHERE doctor_id = :doctor AND date = :date AND time = :time LIMIT 1"
+    ),
+    "doctor_listing": (
+        "SELECT * FROM appointment WHERE doctor_id = :doctor ORDER BY date, time, id LIMIT 50"
+    ),
+    "patient_listing": (
+        "SELECT * FROM appointment WHERE patient_id = :patient ORDER BY date, time, id LIMIT 50"
+    ),
+    "status_filter": "SELECT count(*) FROM appointment WHERE status = 'Booked'",
+}
+
+
+# FUNCTION: Seed the legacy schema with synthetic rows
+def seed_legacy(path, doctors, patients, appointments):
+    conn = sqlite3.connect(path)
+    conn.executescript(LEGACY_SCHEMA)
+    users = [(1, "admin", "x", "Admin", "admin@example.com", "admin")]
+    users += [(1 + i, f"doc{i}", "x", f"Doctor {i}", f"doc{i}@example.com", "doctor")
+              for i in range(1, doctors + 1)]
+    users += [(1 + doctors + i, f"pat{i}", "x", f"Patient {i}", f"pat{i}@example.com", "patient")
+              for i in range(1, patients + 1)]
+    conn.executemany(
+        "INSERT INTO user (id, username, password_hash, name, email, role) VALUES (?,?,?,?,?,?)",
+        users,
+    )
+
+    # one appointment per (doctor, day, slot) so the unique constraint holds
+    rng = random.Random(42)
+    start = date(2024, 1, 1)
+    rows, seen = [], set()
+    while len(rows) < appointments:
+        doctor = rng.randint(2, doctors + 1)
+        day = start + timedelta(days=rng.randint(0, 730))
+        slot = f"{rng.randint(8, 17):02d}:{rng.choice((0, 15, 30, 45)):02d}"
+        if (doctor, day, slot) in seen:
+            continue
+        seen.add((doctor, day, slot))
+        rows.append((doctor, rng.randint(doctors + 2, doctors + patients + 1), day.isoformat(),
+                     slot, rng.choice(("Booked", "Completed", "Cancelled"))))
+    conn.executemany(
+        "INSERT INTO appointment (doctor_id, patient_id, date, time, status, diagnosis, prescription) "
+        "VALUES (?,?,?,?,?,'','')",
+        rows,
+    )
+    conn.commit()
+    conn.close()
+    return rows
+
+
+# FUNCTION: Plan + mean latency for every hot-path query
+def measure(path, params, repeat):
+    conn = sqlite3.connect(path)
+    report = {}
+    for name, sql in QUERIES.items():
+        plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+        started = time.perf_counter()
+        for _ in range(repeat):
+            conn.execute(sql, params).fetchall()
+        elapsed = (time.perf_counter() - started) / repeat
+        report[name] = {"plan": plan, "ms": elapsed * 1000}
+    conn.close()
+    return report
+
+
+# FUNCTION: Print a before/after table
+def show(before, after):
+    for name in QUERIES:
+        print(f"\n== {name}")
+        print(f"  before: {before[name]['ms']:8.3f} ms  {' | '.join(before[name]['plan'])}")
+        print(f"  after:  {after[name]['ms']:8.3f} ms  {' | '.join(after[name]['plan'])}")
+
+
+# MAIN
+def main():
+    parser = argparse.ArgumentParser(description="Appointment query plans before / after migration")
+    parser.add_argument("--doctors", type=int, default=50)
+    parser.add_argument("--patients", type=int, default=5000)
+    parser.add_argument("--appointments", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="hms-bench-")
+    path = os.path.join(workdir, "hms.db")
+    rows = seed_legacy(path, args.doctors, args.patients, args.appointments)
+    doctor, patient, day, slot, _ = rows[len(rows) // 2]
+    print(f"Seeded {len(rows)} appointments into {path}")
+
+    before = measure(path, {"doctor": doctor, "patient": patient, "date": day, "time": slot},
+                     args.repeat)
+
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + path
+    db.init_app(app)
+    started = time.perf_counter()
+    with app.app_context():
+        upgrade()
+    print(f"Migration took {time.perf_counter() - started:.2f}s")
+
+    # Time columns are stored by SQLAlchemy as HH:MM:SS.ffffff after migration
+    after = measure(path, {"doctor": doctor, "patient": patient, "date": day,
+                           "time": slot + ":00.000000"}, args.repeat)
+    show(before, after)
+
+
+if __name__ == "__main__":
+    main()
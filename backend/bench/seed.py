@@ -0,0 +1,168 @@
+# BENCH: Synthetic data generator for benchmarks
+#
+#   cd backend && python -m bench.seed --database-url sqlite:////tmp/hms-bench.db \
+#       --doctors 50 --patients 20000 --appointments 100000
+#
+# Seeds departments, doctors (bench-doc<i>), patients (bench-pat<i>) and
+# appointments into an upgraded database, all with the same password, then
+# rebuilds the dashboard counters and the search index. Appointments fill the
+# default weekday grid doctor by doctor, half in the past and half ahead, so
+# slots are unique and listings have realistic dates and statuses.
+
+# SETUP: Imports
+import argparse
+import os
+import random
+import time
+from datetime import date, timedelta
+
+PASSWORD = "bench"
+BATCH = 5000
+SPECIALIZATIONS = (
+    "Cardiology", "Dermatology", "Neurology", "Orthopedics", "Pediatrics",
+    "Psychiatry", "Radiology", "Oncology", "General Medicine", "ENT",
+)
+FIRST_NAMES = ("Asha", "Ben", "Chen", "Divya", "Elena", "Farid", "Grace", "Hiro", "Ines", "Jonas")
+LAST_NAMES = ("Smith", "Kumar", "Garcia", "Okafor", "Novak", "Tanaka", "Silva", "Moreau", "Ali", "Berg")
+DIAGNOSES = ("hypertension", "migraine", "eczema", "sprain", "bronchitis", "anxiety", "fracture", "otitis")
+
+
+# FUNCTION: Usernames the scenarios log in with
+def doctor_username(i):
+    return f"bench-doc{i}"
+
+
+def patient_username(i):
+    return f"bench-pat{i}"
+
+
+# FUNCTION: Weekdays around today, enough for `count` slots per doctor
+def _working_days(per_doctor, slots_per_day):
+    needed = per_doctor // slots_per_day + 1
+    day = date.today() - timedelta(days=needed * 7 // 10)
+    days = []
+    while len(days) < needed:
+        if day.weekday() < 5:
+            days.append(day)
+        day += timedelta(days=1)
+    return days
+
+
+# PROCESS: Insert rows in batches
+def _insert(conn, table, rows):
+    for i in range(0, len(rows), BATCH):
+        conn.execute(table.insert(), rows[i:i + BATCH])
+
+
+# PROCESS: Seed one database (inside an app context); returns row counts
+def seed(conn, doctors, patients, appointments, password_hash, rng=None):
+    from dba import User, Department, Appointment, ROLE_DOCTOR, ROLE_PATIENT
+    from slots import DEFAULT_TEMPLATE, day_grid
+    import counters
+    import directory
+    import search
+
+    rng = rng or random.Random(0)
+    users = User.__table__
+    departments = Department.__table__
+
+    _insert(conn, departments, [
+        {"name": f"Bench {s}", "description": f"{s} department"} for s in SPECIALIZATIONS
+    ])
+    department_ids = dict(conn.execute(
+        departments.select().with_only_columns(departments.c.name, departments.c.id)
+        .where(departments.c.name.like("Bench %"))
+    ).all())
+
+    def person(i):
+        return f"{FIRST_NAMES[i % 10]} {LAST_NAMES[i // 10 % 10]} {i}"
+
+    doctor_rows = []
+    for i in range(doctors):
+        specialization = SPECIALIZATIONS[i % len(SPECIALIZATIONS)]
+        doctor_rows.append({
+            "username": doctor_username(i), "name": "Dr. " + person(i),
+            "email": f"{doctor_username(i)}@bench.example", "password_hash": password_hash,
+            "role": ROLE_DOCTOR, "specialization": specialization,
+            "department_id": department_ids[f"Bench {specialization}"],
+        })
+    _insert(conn, users, doctor_rows)
+    _insert(conn, users, [
+        {
+            "username": patient_username(i), "name": person(i),
+            "email": f"{patient_username(i)}@bench.example", "password_hash": password_hash,
+            "role": ROLE_PATIENT,
+        }
+        for i in range(patients)
+    ])
+
+    def ids(role, prefix):
+        return [r[0] for r in conn.execute(
+            users.select().with_only_columns(users.c.id)
+            .where(users.c.role == role, users.c.username.like(prefix + "%"))
+            .order_by(users.c.id)
+        )]
+
+    doctor_ids = ids(ROLE_DOCTOR, "bench-doc")
+    patient_ids = ids(ROLE_PATIENT, "bench-pat")
+
+    rows = []
+    if appointments and doctor_ids and patient_ids:
+        grid = day_grid(*DEFAULT_TEMPLATE[0])
+        days = _working_days(-(-appointments // len(doctor_ids)), len(grid))
+        today = date.today()
+        for k in range(appointments):
+            n = k // len(doctor_ids)
+            day = days[n // len(grid)]
+            if day < today:
+                status = "Completed" if rng.random() < 0.8 else "Cancelled"
+            else:
+                status = "Booked" if rng.random() < 0.9 else "Cancelled"
+            rows.append({
+                "doctor_id": doctor_ids[k % len(doctor_ids)],
+                "patient_id": rng.choice(patient_ids),
+                "date": day,
+                "time": grid[n % len(grid)],
+                "status": status,
+                "diagnosis": rng.choice(DIAGNOSES) if status == "Completed" else "",
+                "prescription": "",
+            })
+        _insert(conn, Appointment.__table__, rows)
+
+    counters.rebuild(conn)
+    search.rebuild(conn)
+    directory.bump(conn, directory.DOCTORS, directory.DEPARTMENTS)
+    return {"doctors": len(doctor_ids), "patients": len(patient_ids), "appointments": len(rows)}
+
+
+# MAIN
+def main():
+    parser = argparse.ArgumentParser(description="Seed a database with synthetic HMS data")
+    parser.add_argument("--database-url", required=True)
+    parser.add_argument("--doctors", type=int, default=50)
+    parser.add_argument("--patients", type=int, default=20000)
+    parser.add_argument("--appointments", type=int, default=100000)
+    parser.add_argument("--bcrypt-rounds", type=int, default=12)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    os.environ["BCRYPT_ROUNDS"] = str(args.bcrypt_rounds)
+    from app import create_app, init_database
+    from dba import db
+    from hashing import hash_password
+
+    app = create_app({"SQLALCHEMY_DATABASE_URI": args.database_url})
+    started = time.perf_counter()
+    with app.app_context():
+        init_database()
+    with app.app_context(), db.engine.begin() as conn:
+        counts = seed(
+            conn, args.doctors, args.patients, args.appointments,
+            hash_password(PASSWORD), random.Random(args.seed),
+        )
+    print(f"Seeded {counts} in {time.perf_counter() - started:.1f}s "
+          f"(password for every bench user: {PASSWORD!r})")
+
+
+if __name__ == "__main__":
+    main()
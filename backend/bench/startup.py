@@ -0,0 +1,95 @@
+# BENCH: Cold start per worker process
+#
+#   cd backend && python -m bench.startup --runs 10
+#
+# Starts fresh interpreters against one temp database (initialised once with
+# init-db) and times, inside each child:
+#   import        import app (no app yet)
+#   worker        create_app() and serve the first request (lazy background start)
+#   init-db       worker + init_database(): the schema check, admin lookup and job
+#                 recovery every worker used to run at import time
+#   first-boot    init-db on an empty database (create_all + bcrypt admin seed),
+#                 which every worker of a fresh deployment used to race through
+# Medians are reported; worker vs init-db / first-boot is what the factory
+# saves each worker.
+
+# SETUP: Imports
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+MODES = ("import", "worker", "init-db", "first-boot")
+
+
+# PROCESS: One timed start-up (runs in the child interpreter)
+def child(mode, url):
+    started = time.perf_counter()
+    import app as app_module
+    timings = {"import": time.perf_counter() - started}
+    if mode != "import":
+        app = app_module.create_app({"SQLALCHEMY_DATABASE_URI": url})
+        if mode in ("init-db", "first-boot"):
+            with app.app_context():
+                app_module.init_database()
+        app.test_client().get("/api/departments")
+        timings["total"] = time.perf_counter() - started
+    print(json.dumps(timings))
+
+
+# FUNCTION: Run one child and return (its timings, wall time including interpreter start)
+def spawn(mode, url):
+    started = time.perf_counter()
+    out = subprocess.run(
+        [sys.executable, "-m", "bench.startup", "--child", mode, "--database-url", url],
+        capture_output=True, text=True, check=True,
+        env={**os.environ, "NOTIFY_WORKER": "0"},
+    ).stdout
+    wall = time.perf_counter() - started
+    return json.loads(out.strip().splitlines()[-1]), wall
+
+
+# MAIN
+def main():
+    parser = argparse.ArgumentParser(description="Worker cold-start benchmark")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--database-url")
+    parser.add_argument("--child", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.database_url)
+        return
+
+    url = args.database_url or "sqlite:///" + os.path.join(
+        tempfile.mkdtemp(prefix="hms-startup-"), "hms.db"
+    )
+    # one-time initialisation, as a deployment would run it
+    subprocess.run(
+        [sys.executable, "-m", "flask", "--app", "app", "init-db"],
+        check=True, capture_output=True, env={**os.environ, "DATABASE_URL": url},
+    )
+
+    # modes are interleaved so background noise hits them evenly
+    inner, wall = {m: [] for m in MODES}, {m: [] for m in MODES}
+    for _ in range(args.runs):
+        for mode in MODES:
+            if mode == "first-boot":
+                fresh = os.path.join(tempfile.mkdtemp(prefix="hms-startup-"), "hms.db")
+                timings, elapsed = spawn(mode, "sqlite:///" + fresh)
+            else:
+                timings, elapsed = spawn(mode, url)
+            inner[mode].append(timings.get("total", timings["import"]))
+            wall[mode].append(elapsed)
+
+    print(f"{'mode':<10} {'in-process ms':>14} {'wall ms':>9}   ({args.runs} runs, medians)")
+    for mode in MODES:
+        print(f"{mode:<10} {statistics.median(inner[mode]) * 1000:>14.1f} "
+              f"{statistics.median(wall[mode]) * 1000:>9.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+# SETUP: Imports
+import os
+from collections import Counter
+from datetime import date as date_type, datetime, timedelta
+from sqlalchemy.exc import IntegrityError
+from dba import db, User, Appointment, SlotHold, ROLE_DOCTOR
+import slots
+
+# SETUP: How long a slot hold lasts before anyone else may take the slot
+HOLD_SECONDS = int(os.environ.get("SLOT_HOLD_SECONDS", "120"))
+
+# SETUP: How many days after the original date a reassigned appointment may land
+REASSIGN_WINDOW_DAYS = int(os.environ.get("REASSIGN_WINDOW_DAYS", "7"))
+
+
+# ERROR: Slot already booked or held by someone else
+class SlotUnavailable(Exception):
+    pass
+
+
+# FUNCTION: Filter for one doctor slot on a model with doctor_id/date/time
+def _slot(model, doctor_id, date, time):
+    return (model.doctor_id == doctor_id, model.date == date, model.time == time)
+
+
+# FUNCTION: Is the slot held (unexpired) by another patient?
+def _held_by_other(doctor_id, date, time, patient_id):
+    return (
+        db.session.query(SlotHold.id)
+        .filter(
+            *_slot(SlotHold, doctor_id, date, time),
+            SlotHold.patient_id != patient_id,
+            SlotHold.expires_at > datetime.utcnow(),
+        )
+        .first()
+        is not None
+    )
+
+
+# FUNCTION: Commit, mapping a unique-constraint hit to SlotUnavailable
+# The slot constraints are the only unique keys touched by booking writes, so
+# the database is the single arbiter when two requests race for one slot.
+def _commit_slot():
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        raise SlotUnavailable()
+
+
+# PROCESS: Hold a slot for HOLD_SECONDS (re-holding your own slot extends it)
+def hold_slot(doctor_id, patient_id, date, time):
+    if db.session.query(Appointment.id).filter(*_slot(Appointment, doctor_id, date, time)).first():
+        raise SlotUnavailable()
+
+    now = datetime.utcnow()
+    expires_at = now + timedelta(seconds=HOLD_SECONDS)
+
+    # an expired hold no longer blocks anyone: clear it so the insert can win
+    SlotHold.query.filter(
+        *_slot(SlotHold, doctor_id, date, time), SlotHold.expires_at <= now
+    ).delete(synchronize_session=False)
+
+    hold = SlotHold.query.filter(
+        *_slot(SlotHold, doctor_id, date, time), SlotHold.patient_id == patient_id
+    ).first()
+    if hold:
+        hold.expires_at = expires_at
+    else:
+        hold = SlotHold(
+            doctor_id=doctor_id, patient_id=patient_id,
+            date=date, time=time, expires_at=expires_at,
+        )
+        db.session.add(hold)
+
+    _commit_slot()
+    return hold
+
+
+# PROCESS: Release a hold owned by the patient (True if one was removed)
+def release_hold(hold_id, patient_id):
+    removed = SlotHold.query.filter_by(id=hold_id, patient_id=patient_id).delete()
+    db.session.commit()
+    return removed > 0
+
+
+# PROCESS: Book a slot atomically (consumes the patient's own hold)
+def book(doctor_id, patient_id, date, time):
+    if _held_by_other(doctor_id, date, time, patient_id):
+        raise SlotUnavailable()
+
+    SlotHold.query.filter(
+        *_slot(SlotHold, doctor_id, date, time), SlotHold.patient_id == patient_id
+    ).delete(synchronize_session=False)
+
+    appt = Appointment(
+        doctor_id=doctor_id,
+        patient_id=patient_id,
+        date=date,
+        time=time,
+        status="Booked",
+    )
+    db.session.add(appt)
+    _commit_slot()
+    slots.invalidate(doctor_id, date)
+    return appt
+
+
+# PROCESS: Move an appointment to another slot of the same doctor
+# Pending attribute changes on `appt` (e.g. status) are committed with it.
+def reschedule(appt, date, time):
+    if _held_by_other(appt.doctor_id, date, time, appt.patient_id):
+        db.session.rollback()
+        raise SlotUnavailable()
+
+    old_date = appt.date
+    appt.date = date
+    appt.time = time
+    _commit_slot()
+    slots.invalidate(appt.doctor_id, old_date)
+    slots.invalidate(appt.doctor_id, date)
+    return appt
+
+
+# FUNCTION: Doctors who can take over another doctor's patients
+# Explicit ids win; otherwise the same department, then the same specialization.
+def replacement_doctors(doctor, target_ids=None):
+    query = User.query.filter(User.role == ROLE_DOCTOR, User.id != doctor.id)
+    if target_ids:
+        query = query.filter(User.id.in_(target_ids))
+    elif doctor.department_id:
+        query = query.filter(User.department_id == doctor.department_id)
+    elif doctor.specialization:
+        query = query.filter(User.specialization == doctor.specialization)
+    else:
+        return []
+    return query.order_by(User.id).all()
+
+
+# PROCESS: Plan moving a doctor's upcoming booked appointments to other doctors
+# (only `day` when given). Returns (moves, unplaced): moves are
+# (appointment, doctor_id, date, time). Nothing is written.
+#
+# Free slots of every candidate and the affected patients' other bookings are
+# loaded once for the whole window; each appointment then takes the free slot
+# closest in time on its own day, or the earliest later day within
+# REASSIGN_WINDOW_DAYS, never double-booking a patient.
+def plan_reassignment(doctor, candidates, day=None, window_days=None):
+    window_days = REASSIGN_WINDOW_DAYS if window_days is None else window_days
+    query = Appointment.query.filter(
+        Appointment.doctor_id == doctor.id, Appointment.status == "Booked"
+    )
+    if day:
+        query = query.filter(Appointment.date == day)
+    else:
+        query = query.filter(Appointment.date >= date_type.today())
+    now = datetime.now()
+    appts = [
+        a for a in query.order_by(Appointment.date, Appointment.time, Appointment.id)
+        if datetime.combine(a.date, a.time) > now
+    ]
+    if not appts:
+        return [], []
+    if not candidates:
+        return [], appts
+
+    start = appts[0].date
+    end = appts[-1].date + timedelta(days=window_days)
+    free = slots.free_slot_map([c.id for c in candidates], start, end)
+
+    busy = set(
+        db.session.query(Appointment.patient_id, Appointment.date, Appointment.time).filter(
+            Appointment.patient_id.in_({a.patient_id for a in appts}),
+            Appointment.status == "Booked",
+            Appointment.date >= start,
+            Appointment.date <= end,
+        )
+    )
+
+    # ties between equally close slots go to the doctor given the fewest so far
+    load = Counter()
+    moves, unplaced = [], []
+    for appt in appts:
+        # the appointment being moved does not block its own patient
+        busy.discard((appt.patient_id, appt.date, appt.time))
+        wanted = appt.time.hour * 60 + appt.time.minute
+        choice = None
+        for offset in range(window_days + 1):
+            target_day = appt.date + timedelta(days=offset)
+            options = [
+                (abs(t.hour * 60 + t.minute - wanted), load[doctor_id], doctor_id, t)
+                for doctor_id, days in free.items()
+                for t in days.get(target_day, ())
+                if (appt.patient_id, target_day, t) not in busy
+            ]
+            if options:
+                _, _, doctor_id, t = min(options)
+                choice = (doctor_id, target_day, t)
+                break
+        if choice is None:
+            busy.add((appt.patient_id, appt.date, appt.time))
+            unplaced.append(appt)
+            continue
+
+        doctor_id, target_day, t = choice
+        free[doctor_id][target_day].remove(t)
+        busy.add((appt.patient_id, target_day, t))
+        load[doctor_id] += 1
+        moves.append((appt, doctor_id, target_day, t))
+    return moves, unplaced
+
+
+# PROCESS: Apply planned moves in the current transaction (flush, no commit)
+# Returns the (doctor_id, date) pairs whose availability changed; the caller
+# commits and then passes them to invalidate_days(). A slot taken since the
+# plan was made rolls everything back with SlotUnavailable.
+def apply_moves(moves):
+    touched = set()
+    for appt, doctor_id, day, time in moves:
+        touched.add((appt.doctor_id, appt.date))
+        touched.add((doctor_id, day))
+        appt.doctor_id = doctor_id
+        appt.date = day
+        appt.time = time
+    try:
+        db.session.flush()
+    except IntegrityError:
+        db.session.rollback()
+        raise SlotUnavailable()
+    return touched
+
+
+# FUNCTION: Drop cached availability for changed doctor-days
+def invalidate_days(touched):
+    for doctor_id, day in touched:
+        slots.invalidate(doctor_id, day)
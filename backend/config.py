@@ -0,0 +1,96 @@
+# SETUP: Imports
+import os
+import sqlite3
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from routing import REPLICA_PREFIX, SHARD_PREFIX
+
+# SETUP: Database location (relative SQLite paths resolve against backend/instance)
+DEFAULT_DATABASE_URL = "sqlite:///../instance/hms.db"
+
+# SETUP: Pragmas applied to every new SQLite connection
+# WAL lets readers run alongside the single writer; busy_timeout makes a
+# writer wait for the lock instead of failing with "database is locked".
+SQLITE_PRAGMAS = {
+    "journal_mode": os.environ.get("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "busy_timeout": int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+    "mmap_size": int(os.environ.get("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+}
+
+
+# FUNCTION: Boolean env flag
+def env_flag(name, default):
+    return os.environ.get(name, "1" if default else "0").lower() in ("1", "true", "yes", "on")
+
+
+# FUNCTION: Database URL from DATABASE_URL (postgres:// is accepted as an alias)
+def database_url():
+    return normalize_url(os.environ.get("DATABASE_URL", DEFAULT_DATABASE_URL))
+
+
+def normalize_url(url):
+    if url.startswith("postgres://"):
+        url = "postgresql://" + url[len("postgres://"):]
+    return url
+
+
+# FUNCTION: Read-replica URLs from DATABASE_REPLICA_URLS (comma-separated)
+def replica_urls():
+    raw = os.environ.get("DATABASE_REPLICA_URLS", "")
+    return [normalize_url(u.strip()) for u in raw.split(",") if u.strip()]
+
+
+# FUNCTION: Per-clinic database URLs from CLINIC_DATABASE_URLS
+# "2=postgresql://.../clinic2,3=sqlite:///../instance/clinic3.db" → {2: url, 3: url}
+def clinic_database_urls():
+    raw = os.environ.get("CLINIC_DATABASE_URLS", "")
+    urls = {}
+    for entry in raw.split(","):
+        clinic_id, _, url = entry.partition("=")
+        if url.strip():
+            urls[int(clinic_id)] = normalize_url(url.strip())
+    return urls
+
+
+# FUNCTION: Engine options for a database URL
+def engine_options(url):
+    options = {"pool_pre_ping": env_flag("DB_POOL_PRE_PING", True)}
+    if url.startswith("sqlite"):
+        # the driver-level timeout backs up busy_timeout on first connect
+        options["connect_args"] = {"timeout": SQLITE_PRAGMAS["busy_timeout"] / 1000}
+    else:
+        options.update(
+            pool_size=int(os.environ.get("DB_POOL_SIZE", "5")),
+            max_overflow=int(os.environ.get("DB_MAX_OVERFLOW", "10")),
+            pool_timeout=int(os.environ.get("DB_POOL_TIMEOUT", "30")),
+            pool_recycle=int(os.environ.get("DB_POOL_RECYCLE", "1800")),
+        )
+    return options
+
+
+# FUNCTION: Apply database settings to a Flask app (DATABASE_URL unless `url` is given)
+def configure_database(app, url=None):
+    url = normalize_url(url) if url else database_url()
+    app.config["SQLALCHEMY_DATABASE_URI"] = url
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(url)
+    app.config["SQLALCHEMY_BINDS"] = {
+        f"{REPLICA_PREFIX}{i}": {"url": replica, **engine_options(replica)}
+        for i, replica in enumerate(replica_urls(), start=1)
+    }
+    app.config["SQLALCHEMY_BINDS"].update({
+        f"{SHARD_PREFIX}{clinic_id}": {"url": shard, **engine_options(shard)}
+        for clinic_id, shard in clinic_database_urls().items()
+    })
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+
+
+# EVENT: SQLite pragmas on connect (other drivers are left alone)
+@event.listens_for(Engine, "connect")
+def _sqlite_pragmas(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
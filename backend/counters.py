@@ -0,0 +1,307 @@
+# SETUP: Imports
+import os
+import random
+from collections import Counter
+from sqlalchemy import event, func, inspect, literal, select, union_all, cast, String
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from dba import db, User, Appointment, ArchivedAppointment, StatCounter, DATE_FORMAT
+from dba import clinic_of, current_clinic_id, _clinic_default
+
+# SETUP: STAT_COUNTERS=0 serves the dashboard from a live grouped query instead
+# (run `flask rebuild-stats` after turning it back on).
+ENABLED = os.environ.get("STAT_COUNTERS", "1") != "0"
+
+SCOPES = ("role", "status", "doctor", "day")
+
+# SETUP: Every booking touches the same few keys (status, doctor, day), so each
+# dashboard key is spread over STAT_COUNTER_SHARDS rows: a flush adds its deltas
+# to one random shard and reads sum the shards, so concurrent writers rarely
+# wait on the same row lock. SQLite runs one writer at a time and keeps shard 0.
+# Other stat_counter users (sync, directory versions) stay on shard 0.
+STAT_COUNTER_SHARDS = int(os.environ.get("STAT_COUNTER_SHARDS", "16"))
+
+
+# FUNCTION: Counter keys (clinic, scope, ref, status) touched by one appointment
+def _appointment_keys(clinic_id, doctor_id, day, status):
+    status = status or ""
+    return [
+        (clinic_id, "status", "", status),
+        (clinic_id, "doctor", str(doctor_id), status),
+        (clinic_id, "day", day.strftime(DATE_FORMAT), status),
+    ]
+
+
+# FUNCTION: Value of an attribute before the pending change
+def _old(obj, attr):
+    history = inspect(obj).attrs[attr].history
+    if history.deleted:
+        return history.deleted[0]
+    return getattr(obj, attr)
+
+
+# FUNCTION: Shard for one flush's dashboard deltas
+def _shard(conn):
+    if conn.dialect.name == "sqlite" or STAT_COUNTER_SHARDS <= 1:
+        return 0
+    return random.randrange(STAT_COUNTER_SHARDS)
+
+
+# FUNCTION: Add deltas {(clinic_id, scope, ref, status): delta} to one shard, one upsert per key
+def apply(conn, deltas, shard=0):
+    dialect = conn.dialect.name
+    for (clinic_id, scope, ref, status), delta in deltas.items():
+        if not delta:
+            continue
+        values = {
+            "clinic_id": clinic_id, "scope": scope, "ref": ref, "status": status,
+            "shard": shard, "value": delta,
+        }
+        if dialect in ("sqlite", "postgresql"):
+            insert = sqlite_insert if dialect == "sqlite" else pg_insert
+            stmt = insert(StatCounter).values(**values).on_conflict_do_update(
+                index_elements=["clinic_id", "scope", "ref", "status", "shard"],
+                set_={"value": StatCounter.value + delta},
+            )
+            conn.execute(stmt)
+        else:
+            table = StatCounter.__table__
+            updated = conn.execute(
+                table.update()
+                .where(
+                    table.c.clinic_id == clinic_id, table.c.scope == scope,
+                    table.c.ref == ref, table.c.status == status, table.c.shard == shard,
+                )
+                .values(value=table.c.value + delta)
+            )
+            if not updated.rowcount:
+                conn.execute(table.insert().values(**values))
+
+
+# EVENT: Turn pending ORM inserts / updates / deletes into counter deltas
+# Runs inside the same transaction as the change, so a rollback undoes both.
+@event.listens_for(db.session, "before_flush")
+def _track_changes(session, flush_context, instances):
+    if not ENABLED:
+        return
+
+    deltas = Counter()
+    for obj in session.new:
+        if isinstance(obj, Appointment):
+            for key in _appointment_keys(
+                clinic_of(obj), obj.doctor_id, obj.date, obj.status or "Booked"
+            ):
+                deltas[key] += 1
+        elif isinstance(obj, User):
+            deltas[(clinic_of(obj), "role", "", obj.role)] += 1
+
+    for obj in session.deleted:
+        if isinstance(obj, Appointment):
+            for key in _appointment_keys(
+                obj.clinic_id, _old(obj, "doctor_id"), _old(obj, "date"), _old(obj, "status")
+            ):
+                deltas[key] -= 1
+        elif isinstance(obj, User):
+            deltas[(obj.clinic_id, "role", "", _old(obj, "role"))] -= 1
+
+    for obj in session.dirty:
+        if isinstance(obj, Appointment) and session.is_modified(obj):
+            before = _appointment_keys(
+                obj.clinic_id, _old(obj, "doctor_id"), _old(obj, "date"), _old(obj, "status")
+            )
+            after = _appointment_keys(obj.clinic_id, obj.doctor_id, obj.date, obj.status)
+            if before != after:
+                for key in before:
+                    deltas[key] -= 1
+                for key in after:
+                    deltas[key] += 1
+        elif isinstance(obj, User) and session.is_modified(obj):
+            old_role = _old(obj, "role")
+            if old_role != obj.role:
+                deltas[(obj.clinic_id, "role", "", old_role)] -= 1
+                deltas[(obj.clinic_id, "role", "", obj.role)] += 1
+
+    if deltas:
+        conn = session.connection()
+        apply(conn, deltas, _shard(conn))
+
+
+# PROCESS: Add rows inserted with Core / executemany (no flush events fire)
+# users: role per new user; appointments: (doctor_id, date, status) per new row;
+# all in the current clinic
+def count_inserted(conn, users=(), appointments=()):
+    if not ENABLED:
+        return
+    clinic_id = _clinic_default()
+    deltas = Counter()
+    for role in users:
+        deltas[(clinic_id, "role", "", role)] += 1
+    for doctor_id, day, status in appointments:
+        for key in _appointment_keys(clinic_id, doctor_id, day, status):
+            deltas[key] += 1
+    apply(conn, deltas, _shard(conn))
+
+
+# PROCESS: Subtract appointments about to be bulk-deleted
+# Query.delete() skips flush events, so callers pass the same filter here first.
+def forget_appointments(query):
+    if not ENABLED:
+        return
+    rows = (
+        query.with_entities(
+            Appointment.clinic_id, Appointment.doctor_id, Appointment.date,
+            Appointment.status, func.count(),
+        )
+        .group_by(
+            Appointment.clinic_id, Appointment.doctor_id, Appointment.date, Appointment.status
+        )
+        .order_by(None)
+    )
+    deltas = Counter()
+    for clinic_id, doctor_id, day, status, n in rows:
+        for key in _appointment_keys(clinic_id, doctor_id, day, status):
+            deltas[key] -= n
+    conn = db.session.connection()
+    apply(conn, deltas, _shard(conn))
+
+
+# FUNCTION: Live aggregation for the requested scopes as one UNION ALL query
+# Rows are (clinic_id, scope, ref, status, value); clinic_id limits them to one clinic.
+# Archived appointments count too, so a key can appear once per table.
+def _live_select(scopes, day_from=None, day_to=None, clinic_id=None):
+    def grouped(model, scope, ref, status, keys, where=()):
+        stmt = select(
+            model.clinic_id.label("clinic_id"), literal(scope).label("scope"),
+            ref.label("ref"), status.label("status"), func.count().label("value"),
+        ).where(*where)
+        if clinic_id is not None:
+            stmt = stmt.where(model.clinic_id == clinic_id)
+        return stmt.group_by(model.clinic_id, *keys)
+
+    parts = []
+    if "role" in scopes:
+        parts.append(grouped(User, "role", literal(""), User.role, [User.role]))
+    for model in (Appointment, ArchivedAppointment):
+        status = func.coalesce(model.status, "")
+        if "status" in scopes:
+            parts.append(grouped(model, "status", literal(""), status, [status]))
+        if "doctor" in scopes:
+            parts.append(grouped(
+                model, "doctor", cast(model.doctor_id, String), status,
+                [model.doctor_id, status],
+            ))
+        if "day" in scopes:
+            window = []
+            if day_from:
+                window.append(model.date >= day_from)
+            if day_to:
+                window.append(model.date <= day_to)
+            parts.append(grouped(
+                model, "day", cast(model.date, String), status,
+                [model.date, status], window,
+            ))
+    return union_all(*parts)
+
+
+# FUNCTION: (scope, ref, status, value) rows of the current clinic, from counters or the live query
+def rows(scopes, day_from=None, day_to=None):
+    clinic_id = current_clinic_id()
+    if not ENABLED:
+        live = _live_select(scopes, day_from, day_to, clinic_id).subquery()
+        return [tuple(row[1:]) for row in db.session.execute(select(live))]
+
+    value = func.sum(StatCounter.value)
+    query = db.session.query(
+        StatCounter.scope, StatCounter.ref, StatCounter.status, value
+    ).filter(StatCounter.scope.in_(scopes))
+    if clinic_id is not None:
+        query = query.filter(StatCounter.clinic_id == clinic_id)
+    if "day" in scopes and (day_from or day_to):
+        lo = day_from.strftime(DATE_FORMAT) if day_from else ""
+        hi = day_to.strftime(DATE_FORMAT) if day_to else "9999"
+        query = query.filter(
+            (StatCounter.scope != "day") | StatCounter.ref.between(lo, hi)
+        )
+    return query.group_by(
+        StatCounter.scope, StatCounter.ref, StatCounter.status
+    ).having(value != 0).all()
+
+
+# PROCESS: Recompute every clinic's counters from the base tables (into shard 0)
+def rebuild(conn):
+    table = StatCounter.__table__
+    conn.execute(table.delete().where(table.c.scope.in_(SCOPES)))
+    live = _live_select(SCOPES).subquery()
+    keys = [live.c.clinic_id, live.c.scope, live.c.ref, live.c.status]
+    conn.execute(
+        table.insert().from_select(
+            ["clinic_id", "scope", "ref", "status", "shard", "value"],
+            select(*keys, literal(0), func.sum(live.c.value)).group_by(*keys),
+        )
+    )
+
+
+# FUNCTION: {status: n} dict plus total for a group of rows
+def _bucket(buckets, key, status, value):
+    entry = buckets.setdefault(key, {"counts": {}, "total": 0})
+    entry["counts"][status] = entry["counts"].get(status, 0) + value
+    entry["total"] += value
+
+
+# PROCESS: Dashboard summary with optional breakdowns
+# breakdown ⊆ {"doctor", "department", "day"}; day buckets honour day_from/day_to.
+def summary(breakdown=(), day_from=None, day_to=None):
+    scopes = ["role", "status"]
+    if {"doctor", "department"} & set(breakdown):
+        scopes.append("doctor")
+    if "day" in breakdown:
+        scopes.append("day")
+
+    roles, statuses, doctors, days = Counter(), Counter(), {}, {}
+    for scope, ref, status, value in rows(scopes, day_from, day_to):
+        if scope == "role":
+            roles[status] += value
+        elif scope == "status":
+            statuses[status] += value
+        elif scope == "doctor":
+            _bucket(doctors, int(ref), status, value)
+        elif scope == "day":
+            _bucket(days, ref, status, value)
+
+    result = {
+        "total_doctors": roles["doctor"],
+        "total_patients": roles["patient"],
+        "total_appointments": sum(statuses.values()),
+        "booked": statuses["Booked"],
+        "completed": statuses["Completed"],
+        "cancelled": statuses["Cancelled"],
+    }
+
+    if "doctor" in scopes:
+        info = {
+            u.id: u
+            for u in db.session.query(User.id, User.name, User.department_id)
+            .filter(User.id.in_(list(doctors)))
+        }
+    if "doctor" in breakdown:
+        result["by_doctor"] = [
+            {
+                "doctor_id": doctor_id,
+                "name": info[doctor_id].name if doctor_id in info else "",
+                **entry,
+            }
+            for doctor_id, entry in sorted(doctors.items())
+        ]
+    if "department" in breakdown:
+        departments = {}
+        for doctor_id, entry in doctors.items():
+            dept = info[doctor_id].department_id if doctor_id in info else None
+            for status, value in entry["counts"].items():
+                _bucket(departments, dept, status, value)
+        result["by_department"] = [
+            {"department_id": dept, **entry}
+            for dept, entry in sorted(departments.items(), key=lambda kv: (kv[0] is None, kv[0] or 0))
+        ]
+    if "day" in breakdown:
+        result["by_day"] = [{"date": day, **entry} for day, entry in sorted(days.items())]
+    return result
@@ -1,17 +1,76 @@
 # SETUP: Imports
 from flask_sqlalchemy import SQLAlchemy
+from flask import g, has_app_context
 from datetime import datetime
+from sqlalchemy.orm import declared_attr
+from routing import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 
 # SETUP: Role constants
 ROLE_ADMIN = "admin"
 ROLE_DOCTOR = "doctor"
 ROLE_PATIENT = "patient"
 
+# SETUP: Appointment date/time wire formats
+DATE_FORMAT = "%Y-%m-%d"
+TIME_FORMAT = "%H:%M"
+
+# SETUP: Tenancy
+# Every clinic's rows share the tables below, keyed by clinic_id; tenancy.py
+# filters ORM queries to the request's clinic. Clinic 1 is created by the
+# migrations and owns all rows from before multi-clinic support.
+DEFAULT_CLINIC_ID = 1
+# clinic_id of database-wide stat_counter rows (sync sequence)
+GLOBAL_CLINIC_ID = 0
+
+# SETUP: Longest diagnosis / prescription / notes a treatment entry stores
+TREATMENT_TEXT_LIMIT = 500
+
+
+# FUNCTION: Clinic of the current request / job (None outside one)
+def current_clinic_id():
+    return g.get("clinic_id") if has_app_context() else None
+
+
+def _clinic_default():
+    clinic_id = current_clinic_id()
+    return DEFAULT_CLINIC_ID if clinic_id is None else clinic_id
+
+
+# FUNCTION: Clinic a pending or loaded row belongs to
+# The column default only fires on INSERT, so flush listeners ask here.
+def clinic_of(obj):
+    return obj.clinic_id if obj.clinic_id is not None else _clinic_default()
+
+
+# MODEL: Clinic (tenant)
+class Clinic(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    slug = db.Column(db.String(50), unique=True, nullable=False)
+    name = db.Column(db.String(200), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+# MODEL: TenantScoped (mixin for per-clinic tables)
+# New rows default to the request's clinic.
+class TenantScoped:
+    @declared_attr
+    def clinic_id(cls):
+        return db.Column(
+            db.Integer, db.ForeignKey("clinic.id"), nullable=False, default=_clinic_default
+        )
+
 
 # MODEL: User
-class User(db.Model):
+# username / email stay unique across clinics (login looks a user up by name).
+class User(TenantScoped, db.Model):
+    __table_args__ = (
+        # per-clinic role listings (admin pages, directory, dashboard counts)
+        db.Index("ix_user_clinic_role", "clinic_id", "role", "id"),
+        db.Index("ix_user_clinic_sync_version", "clinic_id", "sync_version"),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
     password_hash = db.Column(db.String(200), nullable=False)
@@ -22,6 +81,10 @@ class User(db.Model):
     specialization = db.Column(db.String(200))      # doctor use
     department_id = db.Column(db.Integer, db.ForeignKey("department.id"))
 
+    # change tracking for /api/sync (set by sync.py on every mirrored change)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sync_version = db.Column(db.Integer, nullable=False, default=0)
+
     appointments_as_patient = db.relationship(
         "Appointment", backref="patient", foreign_keys="Appointment.patient_id"
     )
@@ -32,30 +95,228 @@ class User(db.Model):
 
 
 # MODEL: Department
-class Department(db.Model):
+class Department(TenantScoped, db.Model):
+    __table_args__ = (
+        db.UniqueConstraint("clinic_id", "name", name="uq_department_clinic_name"),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(200), unique=True, nullable=False)
+    name = db.Column(db.String(200), nullable=False)
     description = db.Column(db.String(500))
 
     doctors = db.relationship("User", backref="department")
 
 
 # MODEL: Appointment
-class Appointment(db.Model):
+class Appointment(TenantScoped, db.Model):
+    __table_args__ = (
+        # no double-booking: one appointment per doctor slot (also the booking lookup index)
+        # (doctors belong to one clinic, so doctor-leading indexes are tenant-narrow already)
+        db.UniqueConstraint("doctor_id", "date", "time", name="uq_appointment_doctor_slot"),
+        db.Index("ix_appointment_patient_slot", "patient_id", "date", "time"),
+        db.Index("ix_appointment_clinic_status", "clinic_id", "status"),
+        # date-ordered listings per clinic
+        db.Index("ix_appointment_clinic_date_time", "clinic_id", "date", "time"),
+        # the reminder time-window scan runs across clinics
+        db.Index("ix_appointment_date_time", "date", "time"),
+        db.Index("ix_appointment_clinic_sync_version", "clinic_id", "sync_version"),
+        # ids are never handed out twice (SQLite would otherwise reuse max(id) + 1
+        # after the newest rows are deleted or archived); PostgreSQL's SERIAL
+        # sequence already behaves this way
+        {"sqlite_autoincrement": True},
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     doctor_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
     patient_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
-    date = db.Column(db.String, nullable=False)  
-    time = db.Column(db.String, nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    time = db.Column(db.Time, nullable=False)
     status = db.Column(db.String, default="Booked")  
     diagnosis = db.Column(db.String, default="")
     prescription = db.Column(db.String, default="")
-    treatment = db.relationship("Treatment", backref="appointment", uselist=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sync_version = db.Column(db.Integer, nullable=False, default=0)
+    treatments = db.relationship(
+        "Treatment", backref="appointment", order_by="Treatment.id",
+        primaryjoin="Appointment.id == foreign(Treatment.appointment_id)",
+    )
+
+
+# MODEL: ArchivedAppointment (cold storage for old completed / cancelled appointments)
+# Same ids and columns as Appointment, plus archived_at; archive.py moves rows
+# here so the hot table only holds recent and upcoming appointments.
+# No foreign keys to users: archived rows outlive removed doctors and patients.
+class ArchivedAppointment(TenantScoped, db.Model):
+    __table_args__ = (
+        db.Index("ix_archived_appointment_patient_slot", "patient_id", "date", "time"),
+        db.Index("ix_archived_appointment_doctor_slot", "doctor_id", "date", "time"),
+        db.Index("ix_archived_appointment_clinic_date_time", "clinic_id", "date", "time"),
+    )
 
-# MODEL: Treatment
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    doctor_id = db.Column(db.Integer, nullable=False)
+    patient_id = db.Column(db.Integer, nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    time = db.Column(db.Time, nullable=False)
+    status = db.Column(db.String)
+    diagnosis = db.Column(db.String)
+    prescription = db.Column(db.String)
+    updated_at = db.Column(db.DateTime)
+    sync_version = db.Column(db.Integer, nullable=False, default=0)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+# MODEL: Treatment (append-only clinical history; one row per doctor update)
+# Appointment.diagnosis / prescription hold the latest values for quick display.
+# appointment_id has no foreign key: the appointment may have been archived.
 class Treatment(db.Model):
+    __table_args__ = (
+        db.Index("ix_treatment_appointment", "appointment_id", "id"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    appointment_id = db.Column(db.Integer)
+    diagnosis = db.Column(db.String(TREATMENT_TEXT_LIMIT))
+    prescription = db.Column(db.String(TREATMENT_TEXT_LIMIT))
+    notes = db.Column(db.String(TREATMENT_TEXT_LIMIT))
+    doctor_id = db.Column(db.Integer)                   # who recorded it
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+# MODEL: SlotHold (short-lived reservation while a patient completes a booking)
+class SlotHold(db.Model):
+    __table_args__ = (
+        db.UniqueConstraint("doctor_id", "date", "time", name="uq_slot_hold"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    doctor_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    patient_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    time = db.Column(db.Time, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+
+# MODEL: DoctorSchedule (weekly working-hours template, one row per weekday)
+class DoctorSchedule(db.Model):
+    __table_args__ = (
+        db.UniqueConstraint("doctor_id", "weekday", name="uq_schedule_weekday"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    doctor_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    weekday = db.Column(db.Integer, nullable=False)     # 0 = Monday
+    start_time = db.Column(db.Time, nullable=False)
+    end_time = db.Column(db.Time, nullable=False)
+    slot_minutes = db.Column(db.Integer, nullable=False, default=30)
+    break_start = db.Column(db.Time)
+    break_end = db.Column(db.Time)
+
+
+# MODEL: DoctorLeave (whole days off, inclusive range)
+class DoctorLeave(db.Model):
+    __table_args__ = (
+        db.Index("ix_leave_doctor_range", "doctor_id", "start_date", "end_date"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    doctor_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    start_date = db.Column(db.Date, nullable=False)
+    end_date = db.Column(db.Date, nullable=False)
+    reason = db.Column(db.String(200), default="")
+
+
+# MODEL: StatCounter (materialized dashboard counts, kept current on every write)
+# scope "role":   ref = "",              status = role name
+# scope "status": ref = "",              status = appointment status
+# scope "doctor": ref = doctor id,       status = appointment status
+# scope "day":    ref = YYYY-MM-DD,      status = appointment status
+# Counters are per clinic; database-wide ones use GLOBAL_CLINIC_ID.
+# A key's value is the sum over its shards (see counters.STAT_COUNTER_SHARDS).
+class StatCounter(db.Model):
+    clinic_id = db.Column(db.Integer, primary_key=True, default=DEFAULT_CLINIC_ID)
+    scope = db.Column(db.String(16), primary_key=True)
+    ref = db.Column(db.String(32), primary_key=True)
+    status = db.Column(db.String(32), primary_key=True)
+    shard = db.Column(db.Integer, primary_key=True, default=0)
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+
+# MODEL: Job (persistent background job queue)
+# status: queued → running → done | failed | cancelled (failed runs retry until max_attempts)
+class Job(TenantScoped, db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default="queued", index=True)
+    params = db.Column(db.Text, default="{}")
+    progress = db.Column(db.Integer, default=0)     # percent
+    result = db.Column(db.Text)                     # JSON summary
+    result_path = db.Column(db.String(500))         # file output, if any
+    error = db.Column(db.Text)
+    attempts = db.Column(db.Integer, default=0)
+    max_attempts = db.Column(db.Integer, default=3)
+    cancel_requested = db.Column(db.Boolean, default=False)
+    created_by = db.Column(db.Integer, db.ForeignKey("user.id"))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    lease_until = db.Column(db.DateTime)            # running jobs past this are requeued
+
+
+# MODEL: Notification (transactional outbox for appointment messages)
+# Rows are written in the same transaction as the appointment change and
+# snapshot the slot at that moment; the dispatcher sends them later.
+# status: pending → sending → sent | coalesced | skipped | failed
+# No foreign keys to appointments or users: rows outlive removed appointments and
+# doctors. Rows belong to the appointment's clinic, so a clinic's dispatch
+# (reminders job) only claims its own outbox.
+class Notification(TenantScoped, db.Model):
+    __table_args__ = (
+        db.Index("ix_notification_status", "status", "created_at"),
+        db.Index("ix_notification_clinic_status", "clinic_id", "status", "created_at"),
+        db.Index("ix_notification_appointment", "appointment_id", "event"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    event = db.Column(db.String(20), nullable=False)    # booked, rescheduled, reminder, ...
+    appointment_id = db.Column(db.Integer, nullable=False)
+    recipient_id = db.Column(db.Integer, nullable=False)   # the patient or the doctor
+    patient_id = db.Column(db.Integer)
+    doctor_id = db.Column(db.Integer)
+    date = db.Column(db.Date)
+    time = db.Column(db.Time)
+    status = db.Column(db.String(20), nullable=False, default="pending")
+    attempts = db.Column(db.Integer, default=0)
+    claim = db.Column(db.String(32))                    # dispatcher batch that owns the row
+    lease_until = db.Column(db.DateTime)                # retry / reclaim time
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+
+
+# MODEL: SyncTombstone (rows that left a client's /api/sync view)
+# kind "user" | "appointment"; reason "deleted", or "moved" when an appointment
+# changed doctor (only the previous doctor's mirror drops it). doctor_id /
+# patient_id say whose mirrors see the tombstone. No foreign keys: the row is gone.
+class SyncTombstone(TenantScoped, db.Model):
+    __table_args__ = (
+        db.Index("ix_sync_tombstone_clinic_version", "clinic_id", "version"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)
+    ref_id = db.Column(db.Integer, nullable=False)
+    reason = db.Column(db.String(20), nullable=False, default="deleted")
+    doctor_id = db.Column(db.Integer)
+    patient_id = db.Column(db.Integer)
+    version = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+# MODEL: LiveEvent (short-lived feed for the database live-event broker)
+# version is the writing transaction's sync version; rows are purged after
+# LIVE_RETENTION_SECONDS.
+class LiveEvent(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    appointment_id = db.Column(db.Integer, db.ForeignKey("appointment.id"))
-    diagnosis = db.Column(db.String(500))
-    prescription = db.Column(db.String(500))
-    notes = db.Column(db.String(500))
+    version = db.Column(db.Integer, nullable=False, index=True)
+    payload = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
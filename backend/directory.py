@@ -0,0 +1,96 @@
+# SETUP: Imports
+import os
+from flask import json, request, Response
+from sqlalchemy import event, inspect
+from dba import db, User, Department, StatCounter, ROLE_DOCTOR, clinic_of, _clinic_default
+from authutils import TTLCache
+from pagination import NEXT_CURSOR_HEADER
+import counters
+
+# SETUP: Directory versions live in stat_counter rows (scope "directory", ref = name)
+# per clinic, so every worker sees the same version; responses are cached per process.
+SCOPE = "directory"
+DOCTORS = "doctors"
+DEPARTMENTS = "departments"
+
+DIRECTORY_CACHE_SIZE = int(os.environ.get("DIRECTORY_CACHE_SIZE", "256"))
+DIRECTORY_CACHE_TTL = int(os.environ.get("DIRECTORY_CACHE_TTL", "3600"))
+
+# Doctor columns that appear in, or filter, the directory listings
+DOCTOR_FIELDS = ("username", "name", "email", "specialization", "department_id", "role")
+
+# (ETag = name, clinic and version; query string) → (JSON body, next cursor)
+response_cache = TTLCache(DIRECTORY_CACHE_SIZE, DIRECTORY_CACHE_TTL)
+
+
+# FUNCTION: Current version of a directory in the current clinic
+def version(name):
+    value = db.session.query(StatCounter.value).filter_by(
+        clinic_id=_clinic_default(), scope=SCOPE, ref=name, status=""
+    ).scalar()
+    return value or 0
+
+
+# FUNCTION: Did a pending change touch one of the given columns?
+def _changed(obj, fields):
+    attrs = inspect(obj).attrs
+    return any(attrs[f].history.has_changes() for f in fields)
+
+
+# FUNCTION: Role before the pending change
+def _old_role(user):
+    history = inspect(user).attrs["role"].history
+    return history.deleted[0] if history.deleted else user.role
+
+
+# EVENT: Bump directory versions in the same transaction as the change
+@event.listens_for(db.session, "before_flush")
+def _track_directory(session, flush_context, instances):
+    bumped = set()
+    for obj in list(session.new) + list(session.deleted):
+        if isinstance(obj, User) and ROLE_DOCTOR in (obj.role, _old_role(obj)):
+            bumped.add((clinic_of(obj), DOCTORS))
+        elif isinstance(obj, Department):
+            bumped.add((clinic_of(obj), DEPARTMENTS))
+
+    for obj in session.dirty:
+        if isinstance(obj, User) and ROLE_DOCTOR in (obj.role, _old_role(obj)):
+            if _changed(obj, DOCTOR_FIELDS):
+                bumped.add((obj.clinic_id, DOCTORS))
+        elif isinstance(obj, Department) and session.is_modified(obj):
+            bumped.add((obj.clinic_id, DEPARTMENTS))
+
+    if bumped:
+        counters.apply(
+            session.connection(), {(clinic_id, SCOPE, name, ""): 1 for clinic_id, name in bumped}
+        )
+
+
+# PROCESS: Bump the current clinic's versions directly (for writes that bypass the ORM flush)
+def bump(conn, *names):
+    clinic_id = _clinic_default()
+    counters.apply(conn, {(clinic_id, SCOPE, name, ""): 1 for name in names})
+
+
+# OUTPUT: Directory response with a strong ETag and 304 support
+# build() returns (items, next_cursor); it only runs when this version and
+# query string are not cached yet.
+def cached_response(name, build):
+    etag = f"{name}-{_clinic_default()}-{version(name)}"
+    if request.if_none_match.contains(etag):
+        resp = Response(status=304)
+    else:
+        key = (etag, request.query_string)
+        entry = response_cache.get(key)
+        if entry is None:
+            items, next_cursor = build()
+            entry = (json.dumps(items), next_cursor)
+            response_cache.put(key, entry)
+        body, next_cursor = entry
+        resp = Response(body, mimetype="application/json")
+        if next_cursor:
+            resp.headers[NEXT_CURSOR_HEADER] = next_cursor
+
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = "private, no-cache"
+    return resp
@@ -0,0 +1,129 @@
+# SETUP: Imports
+import csv
+import io
+import json
+from datetime import date, datetime, time
+from sqlalchemy.orm import aliased
+from dba import db, User, Treatment, ROLE_PATIENT, DATE_FORMAT, TIME_FORMAT
+from filters import filter_appointments, filter_users
+from archive import all_appointments
+
+# SETUP: Rows fetched per round-trip and written per streamed chunk
+EXPORT_BATCH = 1000
+
+
+# FUNCTION: Column value → JSON/CSV-friendly value
+def plain(value):
+    if isinstance(value, datetime):
+        return value.isoformat(timespec="seconds") + "Z"
+    if isinstance(value, date):
+        return value.strftime(DATE_FORMAT)
+    if isinstance(value, time):
+        return value.strftime(TIME_FORMAT)
+    return value
+
+
+# EXPORT: Appointments (honours the list filters)
+# Exports read archived appointments too: `source` defaults to
+# all_appointments(); pass the alias in to order or page on its columns.
+APPOINTMENT_COLUMNS = [
+    "id", "date", "time", "status",
+    "doctor_id", "doctor_name", "patient_id", "patient_name",
+    "diagnosis", "prescription",
+]
+
+
+def appointment_query(args=None, source=None):
+    a = source if source is not None else all_appointments()
+    doctor = aliased(User)
+    patient = aliased(User)
+    query = (
+        db.session.query(
+            a.id, a.date, a.time, a.status,
+            a.doctor_id, doctor.name, a.patient_id, patient.name,
+            a.diagnosis, a.prescription,
+        )
+        .outerjoin(doctor, doctor.id == a.doctor_id)
+        .outerjoin(patient, patient.id == a.patient_id)
+    )
+    return filter_appointments(query, args, model=a).order_by(a.date, a.time, a.id)
+
+
+# EXPORT: Patients (honours the user list filters)
+PATIENT_COLUMNS = ["id", "username", "name", "email"]
+
+
+def patient_query(args=None):
+    query = db.session.query(User.id, User.username, User.name, User.email).filter(
+        User.role == ROLE_PATIENT
+    )
+    return filter_users(query, args).order_by(User.id)
+
+
+# EXPORT: Treatment records (appointment filters apply to the parent appointment)
+TREATMENT_COLUMNS = [
+    "id", "appointment_id", "date", "time",
+    "doctor_id", "doctor_name", "patient_id", "patient_name",
+    "diagnosis", "prescription", "notes", "recorded_by", "recorded_at",
+]
+
+
+def treatment_query(args=None, source=None):
+    a = source if source is not None else all_appointments()
+    doctor = aliased(User)
+    patient = aliased(User)
+    query = (
+        db.session.query(
+            Treatment.id, Treatment.appointment_id, a.date, a.time,
+            a.doctor_id, doctor.name, a.patient_id, patient.name,
+            Treatment.diagnosis, Treatment.prescription, Treatment.notes,
+            Treatment.doctor_id, Treatment.created_at,
+        )
+        .join(a, a.id == Treatment.appointment_id)
+        .outerjoin(doctor, doctor.id == a.doctor_id)
+        .outerjoin(patient, patient.id == a.patient_id)
+    )
+    return filter_appointments(query, args, model=a).order_by(Treatment.id)
+
+
+# kind → (columns, query builder)
+EXPORTS = {
+    "appointments": (APPOINTMENT_COLUMNS, appointment_query),
+    "patients": (PATIENT_COLUMNS, patient_query),
+    "treatments": (TREATMENT_COLUMNS, treatment_query),
+}
+
+
+# STREAM: CSV chunks, one per EXPORT_BATCH rows
+# yield_per fetches rows in batches (server-side cursor where supported), so
+# memory stays flat no matter how many rows are exported.
+def stream_csv(columns, query):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(columns)
+    for i, row in enumerate(query.yield_per(EXPORT_BATCH), 1):
+        writer.writerow([plain(v) for v in row])
+        if i % EXPORT_BATCH == 0:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate(0)
+    yield buf.getvalue()
+
+
+# STREAM: NDJSON chunks, one object per line
+def stream_ndjson(columns, query):
+    lines = []
+    for row in query.yield_per(EXPORT_BATCH):
+        lines.append(json.dumps(dict(zip(columns, (plain(v) for v in row)))))
+        if len(lines) == EXPORT_BATCH:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+
+# format → (streamer, mimetype)
+FORMATS = {
+    "csv": (stream_csv, "text/csv"),
+    "ndjson": (stream_ndjson, "application/x-ndjson"),
+}
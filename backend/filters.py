@@ -0,0 +1,91 @@
+# SETUP: Imports
+from datetime import datetime
+from flask import request
+from dba import db, User, Appointment, DATE_FORMAT, TIME_FORMAT
+from pagination import PaginationError
+
+
+# FUNCTION: Parse "YYYY-MM-DD" (None when missing or malformed)
+def parse_date(value):
+    try:
+        return datetime.strptime(value, DATE_FORMAT).date()
+    except (TypeError, ValueError):
+        return None
+
+
+# FUNCTION: Parse "HH:MM" or "HH:MM:SS" (None when missing or malformed)
+def parse_time(value):
+    for fmt in (TIME_FORMAT, "%H:%M:%S"):
+        try:
+            return datetime.strptime(value, fmt).time()
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+# FUNCTION: Read an optional date arg (from the query string unless `args` is given)
+def date_arg(name, args=None):
+    raw = (request.args if args is None else args).get(name)
+    if not raw:
+        return None
+    value = parse_date(raw)
+    if value is None:
+        raise PaginationError(f"Invalid {name}")
+    return value
+
+
+# FUNCTION: Read an optional integer arg (from the query string unless `args` is given)
+def int_arg(name, args=None):
+    raw = (request.args if args is None else args).get(name)
+    if raw in (None, ""):
+        return None
+    try:
+        return int(raw)
+    except (TypeError, ValueError):
+        raise PaginationError(f"Invalid {name}")
+
+
+# FUNCTION: Apply appointment filters (all in SQL)
+# status=Booked,Completed &date_from= &date_to= &doctor_id= &patient_id= &department_id=
+# `args` defaults to the query string; jobs pass their stored params instead.
+# `model` is Appointment or an alias of it (archive.all_appointments()).
+def filter_appointments(query, args=None, model=Appointment):
+    args = request.args if args is None else args
+
+    status = args.get("status")
+    if status:
+        query = query.filter(model.status.in_(status.split(",")))
+
+    date_from = date_arg("date_from", args)
+    if date_from:
+        query = query.filter(model.date >= date_from)
+    date_to = date_arg("date_to", args)
+    if date_to:
+        query = query.filter(model.date <= date_to)
+
+    doctor_id = int_arg("doctor_id", args)
+    if doctor_id is not None:
+        query = query.filter(model.doctor_id == doctor_id)
+    patient_id = int_arg("patient_id", args)
+    if patient_id is not None:
+        query = query.filter(model.patient_id == patient_id)
+
+    department_id = int_arg("department_id", args)
+    if department_id is not None:
+        dept_doctors = db.session.query(User.id).filter(User.department_id == department_id)
+        query = query.filter(model.doctor_id.in_(dept_doctors))
+    return query
+
+
+# FUNCTION: Apply user list filters (?department_id= &specialization=)
+# Shared by the paged lists (user_page) and the patient export.
+def filter_users(query, args=None):
+    args = request.args if args is None else args
+
+    department_id = int_arg("department_id", args)
+    if department_id is not None:
+        query = query.filter(User.department_id == department_id)
+    specialization = args.get("specialization")
+    if specialization:
+        query = query.filter(User.specialization == specialization)
+    return query
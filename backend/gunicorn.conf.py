@@ -0,0 +1,16 @@
+# SETUP: gunicorn settings for the API process (gunicorn -c gunicorn.conf.py "app:create_app()")
+# Threaded workers: the bcrypt pool (hashing.py) needs real threads, so gevent
+# workers are not used here. Live event streams belong on the event process
+# (gunicorn_events.conf.py); any that reach this one each hold a thread, so they
+# may take at most three quarters of a worker's threads (LIVE_MAX_STREAMS,
+# unless set) and past that /api/events answers 503.
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("WEB_CONCURRENCY", "4"))
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", "64"))
+# streams stay open up to LIVE_MAX_SECONDS; heartbeats keep them from timing out
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "30"))
+
+os.environ.setdefault("LIVE_MAX_STREAMS", str(threads * 3 // 4))
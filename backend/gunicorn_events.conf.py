@@ -0,0 +1,21 @@
+# SETUP: gunicorn settings for the live event process
+#   gunicorn -c gunicorn_events.conf.py "app:create_app()"
+# Serves GET /api/events only (LIVE_ONLY); the reverse proxy routes that path
+# here and everything else to the API process (gunicorn.conf.py, see README).
+# gevent workers park each idle stream on a greenlet (a few KB) instead of a
+# thread, so one worker holds thousands of open streams. The API process stays
+# on threaded workers, which the bcrypt pool needs; this process never hashes.
+import os
+
+bind = os.environ.get("EVENTS_BIND", "0.0.0.0:5001")
+workers = int(os.environ.get("EVENTS_WORKERS", "1"))
+worker_class = "gevent"
+worker_connections = int(os.environ.get("EVENTS_WORKER_CONNECTIONS", "10000"))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "30"))
+
+os.environ["LIVE_ONLY"] = "1"
+# events are written by the API process, so they must travel through the database
+os.environ.setdefault("LIVE_BROKER", "database")
+os.environ.setdefault("NOTIFY_WORKER", "0")
+# leave some connections for handshakes and 503 answers
+os.environ.setdefault("LIVE_MAX_STREAMS", str(worker_connections * 9 // 10))
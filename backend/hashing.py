@@ -0,0 +1,89 @@
+# SETUP: Imports
+import os
+import threading
+import time
+from itertools import repeat
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+import bcrypt
+import metrics
+
+# SETUP: Work factor and pool sizing
+# bcrypt releases the GIL while hashing, so a thread pool runs hashes in parallel.
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", "12"))
+HASH_WORKERS = int(os.environ.get("HASH_WORKERS", str(os.cpu_count() or 2)))
+HASH_QUEUE = int(os.environ.get("HASH_QUEUE", "32"))
+HASH_TIMEOUT = float(os.environ.get("HASH_TIMEOUT", "10"))
+
+
+# ERROR: Hashing pool is saturated (maps to 429)
+class HashingBusy(Exception):
+    pass
+
+
+_executor = None
+_executor_lock = threading.Lock()
+# running + queued jobs; a full pool rejects instead of piling up request threads
+_slots = threading.BoundedSemaphore(HASH_WORKERS + HASH_QUEUE)
+
+
+# FUNCTION: Pool is created on first use
+def _pool():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(HASH_WORKERS, thread_name_prefix="bcrypt")
+        return _executor
+
+
+# FUNCTION: Run fn on the pool, or raise HashingBusy when it is full
+def _run(fn, *args):
+    if not _slots.acquire(blocking=False):
+        raise HashingBusy()
+    try:
+        future = _pool().submit(fn, *args)
+    except Exception:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda _: _slots.release())
+
+    started = time.perf_counter()
+    try:
+        return future.result(timeout=HASH_TIMEOUT)
+    except TimeoutError:
+        raise HashingBusy()
+    finally:
+        metrics.add_time("bcrypt", time.perf_counter() - started)
+
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds)).decode()
+
+
+def _check(password, pw_hash):
+    return bcrypt.checkpw(password.encode(), pw_hash.encode())
+
+
+# FUNCTION: Hash a password with the configured work factor
+def hash_password(password, rounds=None):
+    return _run(_hash, password, rounds or BCRYPT_ROUNDS)
+
+
+# FUNCTION: Hash many passwords in parallel (bulk import)
+# Uses its own short-lived pool so a long import never queues ahead of logins.
+def hash_many(passwords, rounds=None, workers=None):
+    with ThreadPoolExecutor(workers or HASH_WORKERS, thread_name_prefix="bcrypt-bulk") as pool:
+        return list(pool.map(_hash, passwords, repeat(rounds or BCRYPT_ROUNDS)))
+
+
+# FUNCTION: Verify a password against a stored hash
+def check_password(password, pw_hash):
+    return _run(_check, password, pw_hash)
+
+
+# FUNCTION: Was this hash made with a different work factor?
+# bcrypt hashes look like $2b$12$<salt+hash>; the second field is the cost.
+def needs_rehash(pw_hash):
+    try:
+        return int(pw_hash.split("$")[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
@@ -0,0 +1,421 @@
+# SETUP: Imports
+import csv
+import json
+import os
+import re
+import uuid
+from datetime import date, datetime
+from sqlalchemy import insert, select, tuple_
+from sqlalchemy.exc import IntegrityError
+from dba import db, User, Department, Appointment, Treatment
+from dba import ROLE_DOCTOR, ROLE_PATIENT
+from filters import parse_date, parse_time
+from hashing import hash_many
+from jobs import handler
+import counters
+import directory
+import search
+import slots
+import sync
+
+# SETUP: Batch size and import-time work factor
+# Imported hashes use IMPORT_BCRYPT_ROUNDS; login upgrades them to BCRYPT_ROUNDS
+# (see needs_rehash), so a large onboarding is not bound by the full cost.
+IMPORT_BATCH = int(os.environ.get("IMPORT_BATCH", "1000"))
+IMPORT_BCRYPT_ROUNDS = int(os.environ.get("IMPORT_BCRYPT_ROUNDS", "10"))
+MAX_REPORTED_ERRORS = 1000
+
+FORMATS = ("csv", "ndjson")
+STATUSES = ("Booked", "Completed", "Cancelled")
+BCRYPT_HASH = re.compile(r"^\$2[aby]\$\d{2}\$[./A-Za-z0-9]{53}$")
+
+# kind → required columns (tuples are alternatives: any one of them)
+REQUIRED = {
+    "doctors": ("username", "name", "email", ("password", "password_hash")),
+    "patients": ("username", "name", "email", ("password", "password_hash")),
+    "appointments": (("doctor", "doctor_id"), ("patient", "patient_id"), "date", "time"),
+}
+
+
+# ERROR: Upload cannot be imported at all (bad format / missing columns)
+class ImportFormatError(ValueError):
+    pass
+
+
+# CLASS: Running totals and per-row errors
+class ImportReport:
+    def __init__(self, kind):
+        self.kind = kind
+        self.rows = 0
+        self.imported = 0
+        self.failed = 0
+        self.errors = []
+
+    def error(self, line, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": line, "error": message})
+
+    def as_dict(self):
+        return {
+            "kind": self.kind,
+            "rows": self.rows,
+            "imported": self.imported,
+            "failed": self.failed,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors),
+        }
+
+
+# FUNCTION: Format from ?format= or the file name (csv by default)
+def detect_format(fmt=None, filename=None):
+    if not fmt and filename:
+        ext = filename.rsplit(".", 1)[-1].lower()
+        fmt = {"jsonl": "ndjson", "json": "ndjson"}.get(ext, ext)
+    fmt = fmt or "csv"
+    if fmt not in FORMATS:
+        raise ImportFormatError("Format must be csv or ndjson")
+    return fmt
+
+
+# FUNCTION: Missing required columns for a kind (CSV header or NDJSON keys)
+def missing_columns(kind, columns):
+    missing = []
+    for need in REQUIRED[kind]:
+        options = need if isinstance(need, tuple) else (need,)
+        if not any(c in columns for c in options):
+            missing.append(" or ".join(options))
+    return missing
+
+
+# FUNCTION: Reject an upload whose CSV header lacks required columns
+def check_header(kind, fmt, path):
+    if kind not in REQUIRED:
+        raise ImportFormatError("Unknown import kind")
+    if fmt != "csv":
+        return
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        header = next(csv.reader(f), [])
+    missing = missing_columns(kind, [h.strip() for h in header])
+    if missing:
+        raise ImportFormatError(f"Missing columns: {', '.join(missing)}")
+
+
+# FUNCTION: Yield (line number, row dict or None, error) from a text stream
+def read_rows(f, fmt):
+    if fmt == "csv":
+        reader = csv.DictReader(f)
+        for row in reader:
+            clean = {
+                (k or "").strip(): (v or "").strip()
+                for k, v in row.items() if not isinstance(v, list)
+            }
+            yield reader.line_num, clean, None
+        return
+
+    for line, text in enumerate(f, start=1):
+        if not text.strip():
+            continue
+        try:
+            row = json.loads(text)
+        except ValueError:
+            yield line, None, "Invalid JSON"
+            continue
+        if not isinstance(row, dict):
+            yield line, None, "Expected a JSON object"
+            continue
+        yield line, {
+            k: "" if v is None else str(v).strip() for k, v in row.items()
+        }, None
+
+
+# CLASS: Imports one kind of record in validated, chunked transactions
+# Each batch is checked against itself and the database with a handful of
+# IN queries, hashed on a parallel pool, then written with one executemany
+# and one commit. A constraint race fails over to per-row savepoints, so one
+# bad row never aborts its batch.
+class Importer:
+    def __init__(self, kind):
+        if kind not in REQUIRED:
+            raise ImportFormatError("Unknown import kind")
+        self.kind = kind
+        self.report = ImportReport(kind)
+        self._departments = None
+
+    def run(self, f, fmt, progress=None):
+        batch = []
+        for line, row, error in read_rows(f, fmt):
+            self.report.rows += 1
+            if error:
+                self.report.error(line, error)
+                continue
+            batch.append((line, row))
+            if len(batch) >= IMPORT_BATCH:
+                self._flush(batch, progress)
+                batch = []
+        if batch:
+            self._flush(batch, progress)
+        return self.report
+
+    def _flush(self, batch, progress):
+        if self.kind == "appointments":
+            self._appointments(batch)
+        else:
+            self._users(batch, ROLE_DOCTOR if self.kind == "doctors" else ROLE_PATIENT)
+        if progress:
+            progress(self.report.rows)
+
+    # PROCESS: Write prepared rows; fall back to one savepoint per row on conflict
+    def _write(self, model, prepared, after_insert):
+        if not prepared:
+            return
+        try:
+            ids = db.session.scalars(
+                insert(model).returning(model.id, sort_by_parameter_order=True),
+                [values for _, values in prepared],
+            ).all()
+            after_insert(list(zip(ids, [values for _, values in prepared])))
+            db.session.commit()
+            self.report.imported += len(prepared)
+            return
+        except IntegrityError:
+            db.session.rollback()
+
+        written = []
+        for line, values in prepared:
+            try:
+                with db.session.begin_nested():
+                    new_id = db.session.scalar(insert(model).returning(model.id), values)
+                written.append((new_id, values))
+            except IntegrityError:
+                self.report.error(line, "Conflicts with an existing record")
+        after_insert(written)
+        db.session.commit()
+        self.report.imported += len(written)
+
+    # FUNCTION: Department id by name (created on first use)
+    def _department_id(self, name):
+        if self._departments is None:
+            self._departments = dict(db.session.execute(select(Department.name, Department.id)).all())
+        if name not in self._departments:
+            # committed on its own so a later batch rollback cannot orphan the id
+            dept = Department(name=name)
+            db.session.add(dept)
+            db.session.commit()
+            self._departments[name] = dept.id
+        return self._departments[name]
+
+    # PROCESS: Validate, hash and insert a batch of doctors or patients
+    def _users(self, batch, role):
+        usernames = [r.get("username", "") for _, r in batch]
+        emails = [r.get("email", "") for _, r in batch]
+        # usernames / emails are unique across clinics
+        taken = set(db.session.scalars(
+            select(User.username).where(User.username.in_(usernames)).execution_options(all_clinics=True)
+        ))
+        taken_emails = set(db.session.scalars(
+            select(User.email).where(User.email.in_(emails)).execution_options(all_clinics=True)
+        ))
+
+        prepared, to_hash = [], []
+        for line, row in batch:
+            missing = missing_columns(self.kind, [k for k, v in row.items() if v])
+            if missing:
+                self.report.error(line, f"Missing {', '.join(missing)}")
+                continue
+            username, email = row["username"], row["email"]
+            if len(username) > 80:
+                self.report.error(line, "Username is too long")
+                continue
+            if username in taken:
+                self.report.error(line, f"Username {username!r} already exists")
+                continue
+            if email in taken_emails:
+                self.report.error(line, f"Email {email!r} already exists")
+                continue
+            pw_hash = row.get("password_hash")
+            if pw_hash and not BCRYPT_HASH.match(pw_hash):
+                self.report.error(line, "password_hash is not a bcrypt hash")
+                continue
+
+            taken.add(username)
+            taken_emails.add(email)
+            values = {
+                "username": username,
+                "name": row["name"],
+                "email": email,
+                "role": role,
+                "password_hash": pw_hash,
+            }
+            if role == ROLE_DOCTOR:
+                values["specialization"] = row.get("specialization") or None
+                if row.get("department"):
+                    values["department_id"] = self._department_id(row["department"])
+            if not pw_hash:
+                to_hash.append((values, row["password"]))
+            prepared.append((line, values))
+
+        for values, pw_hash in zip(
+            [v for v, _ in to_hash],
+            hash_many([p for _, p in to_hash], IMPORT_BCRYPT_ROUNDS),
+        ):
+            values["password_hash"] = pw_hash
+
+        def after_insert(written):
+            conn = db.session.connection()
+            counters.count_inserted(conn, users=[role] * len(written))
+            if written and role == ROLE_DOCTOR:
+                directory.bump(conn, directory.DOCTORS)
+            search.reindex(conn, users=[user_id for user_id, _ in written])
+            sync.touch(conn, User, [user_id for user_id, _ in written])
+
+        self._write(User, prepared, after_insert)
+
+    # FUNCTION: Resolver row → user id (by username or id) for one batch
+    def _user_ids(self, role, batch, name_key, id_key):
+        names = {r[name_key] for _, r in batch if r.get(name_key)}
+        ids = {int(r[id_key]) for _, r in batch if r.get(id_key, "").isdigit()}
+        rows = db.session.execute(
+            select(User.id, User.username).where(
+                User.role == role, User.username.in_(names) | User.id.in_(ids)
+            )
+        ).all()
+        by_name = {username: uid for uid, username in rows}
+        known = {uid for uid, _ in rows}
+
+        def resolve(row):
+            if row.get(id_key):
+                return int(row[id_key]) if row[id_key].isdigit() and int(row[id_key]) in known else None
+            return by_name.get(row.get(name_key))
+        return resolve
+
+    # PROCESS: Validate and insert a batch of historical appointments
+    def _appointments(self, batch):
+        doctor_of = self._user_ids(ROLE_DOCTOR, batch, "doctor", "doctor_id")
+        patient_of = self._user_ids(ROLE_PATIENT, batch, "patient", "patient_id")
+
+        parsed = []
+        for line, row in batch:
+            missing = missing_columns(self.kind, [k for k, v in row.items() if v])
+            if missing:
+                self.report.error(line, f"Missing {', '.join(missing)}")
+                continue
+            doctor_id, patient_id = doctor_of(row), patient_of(row)
+            day, at = parse_date(row["date"]), parse_time(row["time"])
+            status = row.get("status") or None
+            if doctor_id is None:
+                self.report.error(line, "Unknown doctor")
+            elif patient_id is None:
+                self.report.error(line, "Unknown patient")
+            elif day is None or at is None:
+                self.report.error(line, "Invalid date or time")
+            elif status and status not in STATUSES:
+                self.report.error(line, f"Status must be one of {', '.join(STATUSES)}")
+            else:
+                parsed.append((line, row, doctor_id, patient_id, day, at, status))
+
+        slots_wanted = [(d, day, at) for _, _, d, _, day, at, _ in parsed]
+        booked = set()
+        if slots_wanted:
+            booked = set(db.session.execute(
+                select(Appointment.doctor_id, Appointment.date, Appointment.time).where(
+                    tuple_(Appointment.doctor_id, Appointment.date, Appointment.time).in_(slots_wanted)
+                )
+            ).all())
+
+        prepared, notes = [], {}
+        today = date.today()
+        for line, row, doctor_id, patient_id, day, at, status in parsed:
+            slot = (doctor_id, day, at)
+            if slot in booked:
+                self.report.error(line, "Doctor already has an appointment in this slot")
+                continue
+            booked.add(slot)
+            values = {
+                "doctor_id": doctor_id,
+                "patient_id": patient_id,
+                "date": day,
+                "time": at,
+                "status": status or ("Completed" if day < today else "Booked"),
+                "diagnosis": row.get("diagnosis", ""),
+                "prescription": row.get("prescription", ""),
+            }
+            if row.get("notes"):
+                notes[slot] = row["notes"]
+            prepared.append((line, values))
+
+        def after_insert(written):
+            treatments = [
+                {
+                    "appointment_id": appt_id,
+                    "diagnosis": values["diagnosis"],
+                    "prescription": values["prescription"],
+                    "notes": notes[slot],
+                    "doctor_id": values["doctor_id"],
+                    "created_at": datetime.combine(values["date"], values["time"]),
+                }
+                for appt_id, values in written
+                for slot in [(values["doctor_id"], values["date"], values["time"])]
+                if slot in notes
+            ]
+            treatment_ids = []
+            if treatments:
+                treatment_ids = db.session.scalars(
+                    insert(Treatment).returning(Treatment.id), treatments
+                ).all()
+            conn = db.session.connection()
+            counters.count_inserted(
+                conn,
+                appointments=[(v["doctor_id"], v["date"], v["status"]) for _, v in written],
+            )
+            search.reindex(
+                conn,
+                appointments=[appt_id for appt_id, _ in written],
+                treatments=treatment_ids,
+            )
+            sync.touch(conn, Appointment, [appt_id for appt_id, _ in written])
+
+        self._write(Appointment, prepared, after_insert)
+        for doctor_id in {v["doctor_id"] for _, v in prepared}:
+            slots.invalidate(doctor_id)
+
+
+# FUNCTION: Import a file on disk; progress(rows_read) is called after each batch
+def import_file(kind, path, fmt, progress=None):
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        return Importer(kind).run(f, fmt, progress)
+
+
+# FUNCTION: Where uploads wait for their import job
+def upload_path(upload_dir, fmt):
+    os.makedirs(upload_dir, exist_ok=True)
+    return os.path.join(upload_dir, f"import-{uuid.uuid4().hex}.{fmt}")
+
+
+# FUNCTION: Data lines in a file (for progress)
+def count_lines(path):
+    with open(path, "rb") as f:
+        return sum(1 for line in f if line.strip())
+
+
+# JOB: Import an uploaded file (params: kind, format, path)
+# The upload is removed afterwards; rejected rows are written to a CSV result.
+@handler("import")
+def import_job(ctx, params):
+    path, fmt = params["path"], params["format"]
+    total = max(count_lines(path) - (1 if fmt == "csv" else 0), 1)
+    try:
+        report = import_file(
+            params["kind"], path, fmt,
+            progress=lambda rows: ctx.progress(min(rows * 100 // total, 99)),
+        )
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+
+    if report.failed:
+        with open(ctx.output_file("csv"), "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["row", "error"])
+            writer.writerows((e["row"], e["error"]) for e in report.errors)
+    return report.as_dict()
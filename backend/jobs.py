@@ -0,0 +1,248 @@
+# SETUP: Imports
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from dba import db, Job
+import tenancy
+
+# SETUP: Pool sizing
+# JOB_WORKERS run at once per process; JOB_QUEUE more may wait. Beyond that,
+# submit() raises QueueFull instead of spawning more threads.
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+JOB_QUEUE = int(os.environ.get("JOB_QUEUE", "20"))
+LEASE_SECONDS = int(os.environ.get("JOB_LEASE_SECONDS", "300"))
+RETRY_BACKOFF = float(os.environ.get("JOB_RETRY_BACKOFF", "2"))
+
+# kind → handler(ctx, params) returning a JSON-safe result
+HANDLERS = {}
+
+
+# ERROR: Too many jobs in flight in this process (maps to 429)
+class QueueFull(Exception):
+    pass
+
+
+# ERROR: Raised inside a handler when an admin cancels the job
+class JobCancelled(Exception):
+    pass
+
+
+# FUNCTION: Register a job handler for `kind`
+def handler(kind):
+    def register(fn):
+        HANDLERS[kind] = fn
+        return fn
+    return register
+
+
+# CLASS: Handle passed to job handlers
+class JobContext:
+    def __init__(self, job, output_dir):
+        self.job_id = job.id
+        self.clinic_id = job.clinic_id
+        self.output_dir = output_dir
+        self.result_path = None
+
+    # Record progress, renew the lease and stop if cancellation was requested.
+    # Commits the session, so call it between batches, not mid-query.
+    def progress(self, percent):
+        job = db.session.get(Job, self.job_id)
+        job.progress = max(0, min(int(percent), 100))
+        job.lease_until = datetime.utcnow() + timedelta(seconds=LEASE_SECONDS)
+        cancelled = job.cancel_requested
+        db.session.commit()
+        if cancelled:
+            raise JobCancelled()
+
+    # File for this job's output (recorded as the job's downloadable result)
+    def output_file(self, extension):
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.result_path = os.path.join(
+            self.output_dir, f"job-{self.clinic_id}-{self.job_id}.{extension}"
+        )
+        return self.result_path
+
+
+# CLASS: Bounded worker pool over the persistent job table
+# Any process may pick up a queued job; the queued → running UPDATE is a
+# compare-and-swap, so a job runs once even if several processes see it.
+# Jobs run as their clinic (g.clinic_id), in that clinic's database.
+class JobRunner:
+    def __init__(self):
+        self.app = None
+        self._executor = None
+        self._inflight = 0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions["jobs"] = self
+
+    @property
+    def output_dir(self):
+        return os.path.join(self.app.instance_path, "jobs")
+
+    def _pool(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(JOB_WORKERS, thread_name_prefix="job")
+        return self._executor
+
+    def _reserve(self):
+        with self._lock:
+            if self._inflight >= JOB_WORKERS + JOB_QUEUE:
+                raise QueueFull()
+            self._inflight += 1
+
+    def _release(self):
+        with self._lock:
+            self._inflight -= 1
+
+    def _dispatch(self, job_id, clinic_id, reserved=False):
+        if not reserved:
+            self._reserve()
+        with self._lock:
+            pool = self._pool()
+        pool.submit(self._run, job_id, clinic_id)
+
+    # PROCESS: Persist a new job and hand it to the pool
+    def submit(self, kind, params=None, user_id=None, max_attempts=3):
+        if kind not in HANDLERS:
+            raise ValueError(f"Unknown job kind: {kind}")
+        self._reserve()
+        try:
+            job = Job(
+                kind=kind,
+                params=json.dumps(params or {}),
+                created_by=user_id,
+                max_attempts=max_attempts,
+            )
+            db.session.add(job)
+            db.session.commit()
+        except Exception:
+            self._release()
+            raise
+        self._dispatch(job.id, job.clinic_id, reserved=True)
+        return job
+
+    # PROCESS: Cancel a queued job now, or flag a running one
+    def cancel(self, job_id):
+        now = datetime.utcnow()
+        done = Job.query.filter(Job.id == job_id, Job.status == "queued").update(
+            {"status": "cancelled", "finished_at": now}
+        )
+        if not done:
+            done = Job.query.filter(Job.id == job_id, Job.status == "running").update(
+                {"cancel_requested": True}
+            )
+        db.session.commit()
+        return bool(done)
+
+    # PROCESS: Requeue jobs whose worker died and dispatch queued jobs (every partition)
+    def recover(self):
+        for partition in tenancy.partitions():
+            with tenancy.using(partition):
+                Job.query.filter(
+                    Job.status == "running", Job.lease_until < datetime.utcnow()
+                ).update({"status": "queued"})
+                db.session.commit()
+                queued = (
+                    db.session.query(Job.id, Job.clinic_id).filter_by(status="queued")
+                    .order_by(Job.id).all()
+                )
+            for job_id, clinic_id in queued:
+                try:
+                    self._dispatch(job_id, clinic_id)
+                except QueueFull:
+                    return
+
+    def _retry_later(self, job_id, clinic_id, delay):
+        def redispatch():
+            try:
+                self._dispatch(job_id, clinic_id)
+            except QueueFull:
+                pass    # stays queued; picked up by the next recover()
+        timer = threading.Timer(delay, redispatch)
+        timer.daemon = True
+        timer.start()
+
+    def _run(self, job_id, clinic_id):
+        try:
+            with self.app.app_context(), tenancy.using(clinic_id):
+                self._execute(job_id)
+        finally:
+            self._release()
+
+    def _execute(self, job_id):
+        now = datetime.utcnow()
+        claimed = Job.query.filter(Job.id == job_id, Job.status == "queued").update(
+            {
+                "status": "running",
+                "started_at": now,
+                "lease_until": now + timedelta(seconds=LEASE_SECONDS),
+                "attempts": Job.attempts + 1,
+            }
+        )
+        db.session.commit()
+        if not claimed:
+            return
+
+        job = db.session.get(Job, job_id)
+        ctx = JobContext(job, self.output_dir)
+        try:
+            result = HANDLERS[job.kind](ctx, json.loads(job.params or "{}"))
+        except JobCancelled:
+            db.session.rollback()
+            job = db.session.get(Job, job_id)
+            job.status = "cancelled"
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            self.app.logger.exception("Job %s (%s) failed", job_id, job.kind)
+            job = db.session.get(Job, job_id)
+            job.error = repr(e)[:2000]
+            if job.attempts < job.max_attempts and not job.cancel_requested:
+                job.status = "queued"
+                db.session.commit()
+                self._retry_later(job_id, job.clinic_id, RETRY_BACKOFF ** job.attempts)
+            else:
+                job.status = "failed"
+                job.finished_at = datetime.utcnow()
+                db.session.commit()
+        else:
+            job = db.session.get(Job, job_id)
+            job.status = "done"
+            job.progress = 100
+            job.result = json.dumps(result)
+            job.result_path = ctx.result_path
+            job.error = None
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+
+
+runner = JobRunner()
+
+
+# FUNCTION: Job row → JSON
+def serialize_job(job):
+    def iso(value):
+        return value.isoformat() + "Z" if value else None
+
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "progress": job.progress,
+        "params": json.loads(job.params or "{}"),
+        "result": json.loads(job.result) if job.result else None,
+        "has_file": bool(job.result_path),
+        "error": job.error,
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts,
+        "cancel_requested": bool(job.cancel_requested),
+        "created_at": iso(job.created_at),
+        "started_at": iso(job.started_at),
+        "finished_at": iso(job.finished_at),
+    }
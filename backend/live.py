@@ -0,0 +1,351 @@
+# SETUP: Imports
+import json
+import os
+import threading
+import time as clock
+from collections import defaultdict, deque
+from datetime import datetime, timedelta
+from sqlalchemy import event, inspect
+from dba import db, Appointment, LiveEvent, ROLE_ADMIN, DATE_FORMAT, TIME_FORMAT, clinic_of
+from config import env_flag
+import metrics
+import sync
+import tenancy
+
+# SETUP: Live appointment events over server-sent events (GET /api/events)
+# Changes are collected on every ORM flush and handed to the broker once the
+# transaction commits. The hub fans them out to the open streams of this
+# process, indexed by recipient, so idle streams cost one small object each
+# and an event only touches the streams it is meant for.
+# LIVE_BROKER:
+#   memory     events reach streams in the same process only (one worker)
+#   database   events go through the live_event table, polled once per
+#              LIVE_POLL_INTERVAL by one thread per process (several workers)
+LIVE_BROKER = os.environ.get("LIVE_BROKER", "memory")
+LIVE_HEARTBEAT = float(os.environ.get("LIVE_HEARTBEAT", "15"))
+LIVE_MAX_SECONDS = float(os.environ.get("LIVE_MAX_SECONDS", "600"))
+LIVE_QUEUE_SIZE = int(os.environ.get("LIVE_QUEUE_SIZE", "100"))
+LIVE_POLL_INTERVAL = float(os.environ.get("LIVE_POLL_INTERVAL", "1"))
+LIVE_RETENTION_SECONDS = int(os.environ.get("LIVE_RETENTION_SECONDS", "600"))
+# Past LIVE_MAX_STREAMS open streams per process new ones get 503 + Retry-After
+# (0: no limit). Under threaded workers each stream holds a thread, so the cap
+# keeps streams from taking them all; the gevent event process
+# (gunicorn_events.conf.py) parks streams on greenlets and sets a far higher cap.
+LIVE_MAX_STREAMS = int(os.environ.get("LIVE_MAX_STREAMS", "100"))
+# LIVE_ONLY=1: this process serves GET /api/events and nothing else (the event
+# process behind the reverse proxy); no logins, so bcrypt never runs on greenlets.
+LIVE_ONLY = env_flag("LIVE_ONLY", False)
+
+# Client reconnect delay sent with every stream (milliseconds)
+RETRY_MS = 3000
+
+# Appointment status → event when a change sets it
+STATUS_EVENTS = {"Cancelled": "cancelled", "Completed": "completed"}
+
+# name → broker class
+BROKERS = {}
+
+
+# FUNCTION: Register a broker under `name`
+def broker(name):
+    def register(cls):
+        BROKERS[name] = cls
+        return cls
+    return register
+
+
+# FUNCTION: Event dict for one appointment (JSON-safe)
+def _event(name, clinic_id, appointment_id, doctor_id, patient_id, day, at, status,
+           previous_doctor_id=None):
+    payload = {
+        "event": name,
+        "clinic_id": clinic_id,
+        "appointment_id": appointment_id,
+        "doctor_id": doctor_id,
+        "patient_id": patient_id,
+        "date": day.strftime(DATE_FORMAT) if day else None,
+        "time": at.strftime(TIME_FORMAT) if at else None,
+        "status": status,
+    }
+    if previous_doctor_id is not None:
+        payload["previous_doctor_id"] = previous_doctor_id
+    return payload
+
+
+def _appointment_event(name, a, previous_doctor_id=None):
+    return _event(name, clinic_of(a), a.id, a.doctor_id, a.patient_id, a.date, a.time, a.status, previous_doctor_id)
+
+
+# FUNCTION: Event for a flushed change to an existing appointment (None if nothing shown changed)
+def _change_event(appt):
+    attrs = inspect(appt).attrs
+    if attrs.status.history.has_changes() and appt.status in STATUS_EVENTS:
+        return _appointment_event(STATUS_EVENTS[appt.status], appt)
+    if attrs.doctor_id.history.has_changes():
+        previous = attrs.doctor_id.history.deleted
+        return _appointment_event("reassigned", appt, previous[0] if previous else None)
+    if attrs.date.history.has_changes() or attrs.time.history.has_changes():
+        return _appointment_event("rescheduled", appt)
+    if any(attrs[f].history.has_changes() for f in ("status", "diagnosis", "prescription")):
+        return _appointment_event("updated", appt)
+    return None
+
+
+# FUNCTION: Events waiting for this session's commit
+def _pending(session):
+    return session.info.setdefault("live_events", [])
+
+
+# EVENT: Collect appointment events from every ORM flush
+# Bulk Core deletes call record_removed() themselves.
+@event.listens_for(db.session, "after_flush")
+def _record_changes(session, flush_context):
+    events = []
+    for obj in session.new:
+        if isinstance(obj, Appointment):
+            events.append(_appointment_event("created", obj))
+    for obj in session.dirty:
+        if isinstance(obj, Appointment):
+            payload = _change_event(obj)
+            if payload:
+                events.append(payload)
+    for obj in session.deleted:
+        if isinstance(obj, Appointment):
+            events.append(_appointment_event("removed", obj))
+    if events:
+        hub.broker.record(session.connection(), events)
+        _pending(session).extend(events)
+
+
+# PROCESS: Events for appointments about to be bulk-deleted
+# Query.delete() skips flush events, so callers pass the same query here first.
+def record_removed(query):
+    rows = query.with_entities(
+        Appointment.clinic_id, Appointment.id, Appointment.doctor_id, Appointment.patient_id,
+        Appointment.date, Appointment.time, Appointment.status,
+    ).order_by(None)
+    events = [_event("removed", *row) for row in rows]
+    if events:
+        hub.broker.record(db.session.connection(), events)
+        _pending(db.session).extend(events)
+
+
+# EVENT: Hand committed events to the broker; drop them on rollback
+@event.listens_for(db.session, "after_commit")
+def _publish(session):
+    events = session.info.pop("live_events", None)
+    if events:
+        hub.broker.published(events)
+
+
+@event.listens_for(db.session, "after_rollback")
+def _discard(session):
+    session.info.pop("live_events", None)
+
+
+# CLASS: One open stream's queue
+# A stream that falls LIVE_QUEUE_SIZE events behind is told to resync
+# (GET /api/sync) instead of buffering without bound.
+class Subscription:
+    __slots__ = ("key", "events", "ready", "overflowed")
+
+    def __init__(self, key):
+        self.key = key
+        self.events = deque()
+        self.ready = threading.Event()
+        self.overflowed = False
+
+    def push(self, payload):
+        if len(self.events) >= LIVE_QUEUE_SIZE:
+            self.overflowed = True
+        else:
+            self.events.append(payload)
+        self.ready.set()
+
+    # Wait up to `timeout` seconds; returns (events, overflowed)
+    def wait(self, timeout):
+        self.ready.wait(timeout)
+        self.ready.clear()
+        events = []
+        while self.events:
+            events.append(self.events.popleft())
+        overflowed, self.overflowed = self.overflowed, False
+        return events, overflowed
+
+
+# FUNCTION: Recipient keys (role, clinic, user id) of an event (a clinic's admins get all of it)
+def _recipients(payload):
+    clinic_id = payload["clinic_id"]
+    keys = {
+        ("admin", clinic_id, None),
+        ("doctor", clinic_id, payload["doctor_id"]),
+        ("patient", clinic_id, payload["patient_id"]),
+    }
+    if payload.get("previous_doctor_id") is not None:
+        keys.add(("doctor", clinic_id, payload["previous_doctor_id"]))
+    return keys
+
+
+# CLASS: Per-process fan-out from the broker to open streams
+class Hub:
+    def __init__(self):
+        self.app = None
+        self._broker = None
+        self._streams = defaultdict(set)     # recipient key → subscriptions
+        self._open = 0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions["live"] = self
+
+    @property
+    def broker(self):
+        if self._broker is None:
+            self._broker = BROKERS[LIVE_BROKER](self)
+        return self._broker
+
+    # None when this process already holds LIVE_MAX_STREAMS streams
+    def subscribe(self, role, clinic_id, user_id):
+        key = ("admin", clinic_id, None) if role == ROLE_ADMIN else (role, clinic_id, user_id)
+        subscription = Subscription(key)
+        with self._lock:
+            if LIVE_MAX_STREAMS and self._open >= LIVE_MAX_STREAMS:
+                subscription = None
+            else:
+                self._streams[key].add(subscription)
+                self._open += 1
+        if subscription is None:
+            metrics.LIVE_REJECTED.inc()
+            return None
+        metrics.LIVE_STREAMS.inc()
+        self.broker.start()
+        return subscription
+
+    # Idempotent: the stream and the response's close hook both call it
+    def unsubscribe(self, subscription):
+        with self._lock:
+            streams = self._streams.get(subscription.key)
+            if streams is None or subscription not in streams:
+                return
+            streams.discard(subscription)
+            self._open -= 1
+            if not streams:
+                del self._streams[subscription.key]
+        metrics.LIVE_STREAMS.inc(amount=-1)
+
+    # Push events to the streams they concern
+    def dispatch(self, events):
+        for payload in events:
+            with self._lock:
+                targets = [s for key in _recipients(payload) for s in self._streams.get(key, ())]
+            for subscription in targets:
+                subscription.push(payload)
+            metrics.LIVE_EVENTS.inc(payload["event"])
+
+
+hub = Hub()
+
+
+# CLASS: In-process broker (single worker, or tests)
+@broker("memory")
+class MemoryBroker:
+    def __init__(self, hub):
+        self.hub = hub
+
+    def start(self):
+        pass
+
+    def record(self, conn, events):
+        pass
+
+    def published(self, events):
+        self.hub.dispatch(events)
+
+
+# CLASS: Database broker: events ride the writing transaction into live_event
+# Rows carry the transaction's sync version and polling stops at the sync
+# low-water mark (see sync.py), so "version > last seen" never skips a late commit.
+@broker("database")
+class DatabaseBroker:
+    def __init__(self, hub):
+        self.hub = hub
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._next_purge = 0.0
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._loop, name="live", daemon=True)
+            self._thread.start()
+
+    def record(self, conn, events):
+        version = sync.transaction_version(conn)
+        now = datetime.utcnow()
+        conn.execute(LiveEvent.__table__.insert(), [
+            {"version": version, "payload": json.dumps(e), "created_at": now} for e in events
+        ])
+
+    def published(self, events):
+        pass
+
+    # Poll every partition (the primary, then each clinic database) with its own position
+    def _loop(self):
+        last = {}
+        with self.hub.app.app_context():
+            for clinic_id in tenancy.partitions():
+                with tenancy.using(clinic_id):
+                    last[clinic_id] = sync.current_version(db.session.connection())
+        while True:
+            clock.sleep(LIVE_POLL_INTERVAL)
+            purge = clock.monotonic() >= self._next_purge
+            if purge:
+                self._next_purge = clock.monotonic() + 60
+            for clinic_id in last:
+                try:
+                    with self.hub.app.app_context(), tenancy.using(clinic_id):
+                        last[clinic_id] = self.poll(last[clinic_id], purge)
+                except Exception:
+                    self.hub.app.logger.exception("Live event poller failed")
+
+    # PROCESS: Dispatch rows committed since `last`; returns the new position
+    def poll(self, last, purge=False):
+        upto = sync.current_version(db.session.connection())
+        rows = (
+            LiveEvent.query.filter(LiveEvent.version > last, LiveEvent.version <= upto)
+            .order_by(LiveEvent.version, LiveEvent.id).all()
+        )
+        if rows:
+            self.hub.dispatch([json.loads(r.payload) for r in rows])
+            last = rows[-1].version
+        if purge:
+            cutoff = datetime.utcnow() - timedelta(seconds=LIVE_RETENTION_SECONDS)
+            LiveEvent.query.filter(LiveEvent.created_at < cutoff).delete(synchronize_session=False)
+            db.session.commit()
+        db.session.remove()
+        return last
+
+
+# OUTPUT: Server-sent event frame
+def _frame(name, data):
+    return f"event: {name}\ndata: {json.dumps(data)}\n\n"
+
+
+# OUTPUT: Event stream for one subscription (ends after LIVE_MAX_SECONDS; clients reconnect)
+# A "resync" event means events were dropped: reload through /api/sync.
+def stream(subscription):
+    try:
+        yield f"retry: {RETRY_MS}\n" + _frame("ready", {"heartbeat": LIVE_HEARTBEAT})
+        deadline = clock.monotonic() + LIVE_MAX_SECONDS
+        while clock.monotonic() < deadline:
+            events, overflowed = subscription.wait(LIVE_HEARTBEAT)
+            if overflowed:
+                yield _frame("resync", {})
+            if events:
+                yield "".join(_frame("appointment", e) for e in events)
+            elif not overflowed:
+                yield ": ping\n\n"
+    finally:
+        hub.unsubscribe(subscription)
@@ -0,0 +1,244 @@
+# SETUP: Imports
+import cProfile
+import io
+import os
+import pstats
+import threading
+import time
+from bisect import bisect_left
+from flask import Response, g, has_request_context, request
+from flask.signals import got_request_exception
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from authutils import account_active, decode_token, token_clinic
+from dba import ROLE_ADMIN
+
+# SETUP: Metrics settings
+# Metrics are per process; scrape every worker (or run one) for a full picture.
+# METRICS_TOKEN, when set, is required as "Authorization: Bearer <token>" on /metrics;
+# without it only an admin's login token is accepted.
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+PROFILE_LINES = int(os.environ.get("PROFILE_LINES", "40"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+# CLASS: Counter / gauge / histogram family keyed by label values
+class Metric:
+    def __init__(self, name, help_text, kind, labels=(), buckets=None):
+        self.name = name
+        self.help = help_text
+        self.kind = kind
+        self.labels = labels
+        self.buckets = buckets
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            entry = self._values.get(label_values)
+            if entry is None:
+                entry = self._values[label_values] = [[0] * len(self.buckets), 0, 0.0]
+            i = bisect_left(self.buckets, value)
+            if i < len(self.buckets):
+                entry[0][i] += 1
+            entry[1] += 1
+            entry[2] += value
+
+    # Prometheus text exposition lines for this family
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for label_values, value in items:
+            labels = _labels(self.labels, label_values)
+            if self.kind in ("counter", "gauge"):
+                lines.append(f"{self.name}{{{labels}}} {value}" if labels else f"{self.name} {value}")
+                continue
+            counts, count, total = value
+            running = 0
+            for bound, n in zip(self.buckets, counts):
+                running += n
+                lines.append(f'{self.name}_bucket{{{_join(labels, f"le={_quote(bound)}")}}} {running}')
+            lines.append(f'{self.name}_bucket{{{_join(labels, "le=" + _quote("+Inf"))}}} {count}')
+            suffix = f"{{{labels}}}" if labels else ""
+            lines.append(f"{self.name}_sum{suffix} {total}")
+            lines.append(f"{self.name}_count{suffix} {count}")
+        return lines
+
+
+def _quote(value):
+    text = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return f'"{text}"'
+
+
+def _labels(names, values):
+    return ",".join(f"{n}={_quote(v)}" for n, v in zip(names, values))
+
+
+def _join(*parts):
+    return ",".join(p for p in parts if p)
+
+
+# SETUP: Metric families
+REQUESTS = Metric(
+    "hms_http_requests_total", "HTTP requests served.", "counter",
+    ("endpoint", "method", "status"),
+)
+LATENCY = Metric(
+    "hms_http_request_duration_seconds", "Request latency.", "histogram",
+    ("endpoint", "method"), LATENCY_BUCKETS,
+)
+RESPONSE_SIZE = Metric(
+    "hms_http_response_size_bytes", "Response body size (streamed bodies excluded).",
+    "histogram", ("endpoint",), SIZE_BUCKETS,
+)
+QUERIES = Metric(
+    "hms_db_queries_per_request", "SQL statements executed per request.", "histogram",
+    ("endpoint",), QUERY_BUCKETS,
+)
+QUERY_TIME = Metric(
+    "hms_db_query_seconds_total", "Time spent in SQL statements.", "counter", ("endpoint",),
+)
+HASH_TIME = Metric(
+    "hms_bcrypt_seconds", "Time a request waited for bcrypt (queue + hash).", "histogram",
+    ("endpoint",), LATENCY_BUCKETS,
+)
+EXCEPTIONS = Metric(
+    "hms_exceptions_total", "Exceptions (unhandled or logged by a route) by endpoint and type.", "counter",
+    ("endpoint", "exception"),
+)
+LIVE_STREAMS = Metric("hms_live_streams", "Open live event streams.", "gauge")
+LIVE_REJECTED = Metric(
+    "hms_live_streams_rejected_total", "Live event streams refused at LIVE_MAX_STREAMS.", "counter",
+)
+LIVE_EVENTS = Metric(
+    "hms_live_events_total", "Live appointment events dispatched to this process's streams.",
+    "counter", ("event",),
+)
+ALL = (
+    REQUESTS, LATENCY, RESPONSE_SIZE, QUERIES, QUERY_TIME, HASH_TIME, EXCEPTIONS,
+    LIVE_STREAMS, LIVE_REJECTED, LIVE_EVENTS,
+)
+
+
+# FUNCTION: Route pattern for the current request ("unmatched" for 404s)
+def endpoint_label():
+    rule = request.url_rule
+    return rule.rule if rule is not None else "unmatched"
+
+
+# FUNCTION: Add time spent in a named activity to the current request
+def add_time(name, seconds):
+    if has_request_context() and "metrics" in g:
+        g.metrics[name] = g.metrics.get(name, 0.0) + seconds
+
+
+# EVENT: Count and time every SQL statement run while serving a request
+# The start time rides on the statement's execution context, which is dropped
+# with it when the statement fails (no after_cursor_execute follows).
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._hms_query_start = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_hms_query_start", None)
+    if started is not None and has_request_context() and "metrics" in g:
+        g.metrics["queries"] = g.metrics.get("queries", 0) + 1
+        add_time("db", time.perf_counter() - started)
+
+
+# FUNCTION: Does the request carry a valid admin login token?
+def _admin_request():
+    header = request.headers.get("Authorization", "")
+    claims = decode_token(header[7:]) if header.startswith("Bearer ") else None
+    if not claims or claims.get("role") != ROLE_ADMIN:
+        return False
+    g.clinic_id = token_clinic(claims)
+    return account_active(claims)
+
+
+# FUNCTION: Is this an admin asking for ?profile=1?
+def _profile_requested():
+    return request.args.get("profile") == "1" and _admin_request()
+
+
+# OUTPUT: cProfile summary (plus the request's own counters) as text/plain
+def _profile_response(profiler, response, stats):
+    out = io.StringIO()
+    out.write(
+        f"{request.method} {request.full_path} -> {response.status_code}\n"
+        f"total {stats['elapsed'] * 1000:.1f} ms, {stats.get('queries', 0)} queries "
+        f"({stats.get('db', 0.0) * 1000:.1f} ms), bcrypt {stats.get('bcrypt', 0.0) * 1000:.1f} ms\n\n"
+    )
+    pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(PROFILE_LINES)
+    return Response(out.getvalue(), mimetype="text/plain")
+
+
+# FUNCTION: Count an exception against the current endpoint
+def count_exception(exception):
+    EXCEPTIONS.inc(endpoint_label() if has_request_context() else "none", type(exception).__name__)
+
+
+def _unhandled_exception(sender, exception, **extra):
+    count_exception(exception)
+
+
+# SETUP: Register the request hooks on an app
+def init_app(app):
+    @app.before_request
+    def _start_request():
+        g.metrics = {"started": time.perf_counter()}
+        if _profile_requested():
+            g.profiler = cProfile.Profile()
+            g.profiler.enable()
+
+    @app.after_request
+    def _finish_request(response):
+        stats = g.pop("metrics", None)
+        if stats is None:
+            return response
+        profiler = g.pop("profiler", None)
+        if profiler is not None:
+            profiler.disable()
+
+        stats["elapsed"] = time.perf_counter() - stats["started"]
+        endpoint = endpoint_label()
+        REQUESTS.inc(endpoint, request.method, str(response.status_code))
+        LATENCY.observe(stats["elapsed"], endpoint, request.method)
+        QUERIES.observe(stats.get("queries", 0), endpoint)
+        QUERY_TIME.inc(endpoint, amount=stats.get("db", 0.0))
+        if "bcrypt" in stats:
+            HASH_TIME.observe(stats["bcrypt"], endpoint)
+        if not response.is_streamed:
+            RESPONSE_SIZE.observe(response.calculate_content_length() or 0, endpoint)
+
+        if profiler is not None:
+            return _profile_response(profiler, response, stats)
+        return response
+
+    got_request_exception.connect(_unhandled_exception, app)
+
+
+# FUNCTION: Does this scrape carry METRICS_TOKEN (or, without one, an admin token)?
+def scrape_allowed():
+    if not METRICS_TOKEN:
+        return _admin_request()
+    return request.headers.get("Authorization") == f"Bearer {METRICS_TOKEN}"
+
+
+# OUTPUT: All metrics in Prometheus text format
+def render():
+    lines = []
+    for metric in ALL:
+        lines.extend(metric.render())
+    return Response("\n".join(lines) + "\n", mimetype="text/plain; version=0.0.4")
@@ -0,0 +1,413 @@
+# SETUP: Imports
+from collections import Counter
+from datetime import datetime
+from sqlalchemy import MetaData, bindparam, exists, func, inspect, or_, select, text
+from sqlalchemy.schema import AddConstraint
+from dba import db, Clinic, User, Department, Appointment, Treatment, Job, StatCounter, SyncTombstone
+from dba import Notification, DEFAULT_CLINIC_ID, GLOBAL_CLINIC_ID
+import counters
+import search
+import sync
+
+# Single-row table holding the schema version of this database file
+schema_version = db.Table(
+    "schema_version",
+    db.Column("version", db.Integer, nullable=False),
+)
+
+# SETUP: Formats accepted when backfilling legacy free-form strings
+LEGACY_DATE_FORMATS = ("%Y-%m-%d", "%d-%m-%Y", "%d/%m/%Y")
+LEGACY_TIME_FORMATS = ("%H:%M", "%H:%M:%S", "%H:%M:%S.%f", "%I:%M %p")
+
+
+# ERROR: Existing data cannot be migrated as-is
+class MigrationError(RuntimeError):
+    pass
+
+
+# FUNCTION: Parse a legacy string with the first matching format
+def _parse_legacy(value, formats):
+    for fmt in formats:
+        try:
+            return datetime.strptime(value.strip(), fmt)
+        except (AttributeError, ValueError):
+            continue
+    return None
+
+
+# MIGRATION 1: Appointment date/time → Date/Time, slot indexes, no-double-booking constraint
+def _appointment_date_time(conn):
+    rows = conn.execute(text(
+        "SELECT id, doctor_id, patient_id, date, time, status, diagnosis, prescription "
+        "FROM appointment"
+    )).mappings().all()
+
+    # PROCESS: convert every row before touching the schema, so bad data aborts cleanly
+    converted, bad = [], []
+    for r in rows:
+        d = _parse_legacy(r["date"], LEGACY_DATE_FORMATS)
+        t = _parse_legacy(r["time"], LEGACY_TIME_FORMATS)
+        if d is None or t is None:
+            bad.append(r["id"])
+            continue
+        converted.append({**r, "date": d.date(), "time": t.time()})
+
+    if bad:
+        raise MigrationError(f"Unparseable date/time on appointments: {bad}")
+
+    slots = Counter((r["doctor_id"], r["date"], r["time"]) for r in converted)
+    doubles = [slot for slot, n in slots.items() if n > 1]
+    if doubles:
+        raise MigrationError(f"Double-booked doctor slots must be resolved first: {doubles}")
+
+    if conn.dialect.name == "sqlite":
+        # SQLite cannot ALTER column types: rebuild the table and swap it in
+        conn.execute(text("PRAGMA foreign_keys=OFF"))
+        tmp = MetaData()
+        Clinic.__table__.to_metadata(tmp)
+        Department.__table__.to_metadata(tmp)
+        User.__table__.to_metadata(tmp)
+        rebuilt = Appointment.__table__.to_metadata(tmp, name="appointment_new")
+        rebuilt.create(conn)
+        if converted:
+            conn.execute(rebuilt.insert(), converted)
+        conn.execute(text("DROP TABLE appointment"))
+        conn.execute(text("ALTER TABLE appointment_new RENAME TO appointment"))
+    else:
+        conn.execute(text(
+            "ALTER TABLE appointment "
+            "ALTER COLUMN date TYPE DATE USING date::date, "
+            "ALTER COLUMN time TYPE TIME USING time::time"
+        ))
+        table = Appointment.__table__
+        for constraint in table.constraints:
+            if constraint.name == "uq_appointment_doctor_slot":
+                conn.execute(AddConstraint(constraint))
+        for index in table.indexes:
+            index.create(conn)
+
+
+# MIGRATION 2: Materialized dashboard counters from existing rows
+def _stat_counters(conn):
+    counters.rebuild(conn)
+
+
+# MIGRATION 3: Full-text search index over people and clinical text
+def _search_index(conn):
+    search.create_index(conn)
+    search.rebuild(conn)
+
+
+# MIGRATION 4: (date, time) index for date-ordered listings and reminder scans
+# (the notification outbox table itself is new, so create_all() makes it)
+def _appointment_date_index(conn):
+    for index in Appointment.__table__.indexes:
+        if index.name == "ix_appointment_date_time":
+            index.create(conn, checkfirst=True)
+
+
+# MIGRATION 5: Treatment history: author + timestamp, seeded from appointment fields
+def _treatment_history(conn):
+    table = Treatment.__table__
+    appointments = Appointment.__table__
+    existing = {c["name"] for c in inspect(conn).get_columns("treatment")}
+    for name in ("doctor_id", "created_at"):
+        if name not in existing:
+            column_type = table.c[name].type.compile(dialect=conn.dialect)
+            conn.execute(text(f"ALTER TABLE treatment ADD COLUMN {name} {column_type}"))
+    for index in table.indexes:
+        index.create(conn, checkfirst=True)
+
+    # existing rows: recorded by the appointment's doctor at the appointment time
+    rows = conn.execute(
+        select(table.c.id, appointments.c.doctor_id, appointments.c.date, appointments.c.time)
+        .join(appointments, appointments.c.id == table.c.appointment_id)
+        .where(table.c.created_at.is_(None))
+    ).all()
+    if rows:
+        conn.execute(
+            table.update().where(table.c.id == bindparam("treatment_id")).values(
+                doctor_id=bindparam("author"), created_at=bindparam("recorded_at")
+            ),
+            [
+                {"treatment_id": r.id, "author": r.doctor_id,
+                 "recorded_at": datetime.combine(r.date, r.time)}
+                for r in rows
+            ],
+        )
+
+    # diagnosis / prescription that only lived on the appointment become its first entry
+    untracked = conn.execute(
+        select(
+            appointments.c.id, appointments.c.doctor_id, appointments.c.date, appointments.c.time,
+            appointments.c.diagnosis, appointments.c.prescription,
+        ).where(
+            or_(
+                func.coalesce(appointments.c.diagnosis, "") != "",
+                func.coalesce(appointments.c.prescription, "") != "",
+            ),
+            ~exists().where(table.c.appointment_id == appointments.c.id),
+        )
+    ).all()
+    if untracked:
+        conn.execute(table.insert(), [
+            {
+                "appointment_id": a.id, "diagnosis": a.diagnosis, "prescription": a.prescription,
+                "notes": "", "doctor_id": a.doctor_id,
+                "created_at": datetime.combine(a.date, a.time),
+            }
+            for a in untracked
+        ])
+        search.rebuild(conn)
+
+
+# MIGRATION 6: Change tracking for /api/sync (tombstone table comes from create_all())
+# Existing rows keep version 0: clients get them from their first full sync.
+def _sync_versions(conn):
+    for model in (User, Appointment):
+        table = model.__table__
+        existing = {c["name"] for c in inspect(conn).get_columns(table.name)}
+        for name, extra in (("updated_at", ""), ("sync_version", " NOT NULL DEFAULT 0")):
+            if name not in existing:
+                column_type = table.c[name].type.compile(dialect=conn.dialect)
+                conn.execute(text(
+                    f'ALTER TABLE "{table.name}" ADD COLUMN {name} {column_type}{extra}'
+                ))
+        for index in table.indexes:
+            if index.name == f"ix_{table.name}_sync_version":
+                index.create(conn, checkfirst=True)
+
+
+# SETUP: Per-clinic tables and the indexes migration 7 replaces
+TENANT_MODELS = (User, Department, Appointment, Job, SyncTombstone)
+SUPERSEDED_INDEXES = (
+    "ix_appointment_status", "ix_user_sync_version", "ix_appointment_sync_version",
+    "ix_sync_tombstone_version",
+)
+
+
+# FUNCTION: Default clinic row (fresh databases and migration 7)
+def _ensure_default_clinic(conn):
+    table = Clinic.__table__
+    if conn.execute(select(table.c.id).where(table.c.id == DEFAULT_CLINIC_ID)).first() is None:
+        conn.execute(table.insert().values(
+            id=DEFAULT_CLINIC_ID, slug="default", name="Default clinic", created_at=datetime.utcnow()
+        ))
+
+
+# FUNCTION: clinic_id on every per-clinic table, existing rows in the default clinic
+# Idempotent; upgrade() also runs it before older steps, whose rebuilds read
+# clinic_id through the current models.
+def _clinic_columns(conn):
+    _ensure_default_clinic(conn)
+    reference = "" if conn.dialect.name == "sqlite" else " REFERENCES clinic (id)"
+    for model in TENANT_MODELS:
+        table = model.__table__
+        existing = {c["name"] for c in inspect(conn).get_columns(table.name)}
+        if "clinic_id" not in existing:
+            conn.execute(text(
+                f'ALTER TABLE "{table.name}" ADD COLUMN clinic_id INTEGER NOT NULL '
+                f"DEFAULT {DEFAULT_CLINIC_ID}{reference}"
+            ))
+
+
+# MIGRATION 7: Clinics (tenants): clinic_id columns, tenant-leading indexes,
+# per-clinic department names, counters and search documents
+def _clinics(conn):
+    _clinic_columns(conn)
+    for name in SUPERSEDED_INDEXES:
+        conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+    for model in TENANT_MODELS:
+        for index in model.__table__.indexes:
+            index.create(conn, checkfirst=True)
+
+    # department names: unique per clinic instead of globally
+    departments = Department.__table__
+    if conn.dialect.name == "sqlite":
+        rows = conn.execute(text("SELECT id, name, description, clinic_id FROM department")).mappings().all()
+        tmp = MetaData()
+        Clinic.__table__.to_metadata(tmp)
+        rebuilt = departments.to_metadata(tmp, name="department_new")
+        rebuilt.create(conn)
+        if rows:
+            conn.execute(rebuilt.insert(), [dict(r) for r in rows])
+        conn.execute(text("DROP TABLE department"))
+        conn.execute(text("ALTER TABLE department_new RENAME TO department"))
+    else:
+        conn.execute(text("ALTER TABLE department DROP CONSTRAINT IF EXISTS department_name_key"))
+        for constraint in departments.constraints:
+            if constraint.name == "uq_department_clinic_name":
+                conn.execute(AddConstraint(constraint))
+
+    # stat_counter: clinic_id joins the key; the sync sequence is database-wide,
+    # directory versions belong to the default clinic, the rest is recounted
+    kept = conn.execute(text(
+        "SELECT scope, ref, status, value FROM stat_counter WHERE scope IN ('sync', 'directory')"
+    )).mappings().all()
+    conn.execute(text("DROP TABLE stat_counter"))
+    StatCounter.__table__.create(conn)
+    if kept:
+        conn.execute(StatCounter.__table__.insert(), [
+            {**r, "clinic_id": GLOBAL_CLINIC_ID if r["scope"] == "sync" else DEFAULT_CLINIC_ID}
+            for r in kept
+        ])
+    counters.rebuild(conn)
+
+    # search documents carry their clinic
+    conn.execute(text("DROP TABLE IF EXISTS search_index"))
+    search.create_index(conn)
+    search.rebuild(conn)
+
+
+# MIGRATION 8: Appointment archive (table comes from create_all()); treatments
+# may now point at an archived appointment, so their foreign key goes.
+# SQLite does not enforce it unless PRAGMA foreign_keys is on, so it stays there.
+def _archive(conn):
+    if conn.dialect.name == "sqlite":
+        return
+    for fk in inspect(conn).get_foreign_keys("treatment"):
+        if fk["referred_table"] == "appointment" and fk.get("name"):
+            conn.execute(text(f'ALTER TABLE treatment DROP CONSTRAINT "{fk["name"]}"'))
+
+
+# MIGRATION 9: Appointment ids are never reused (SQLite AUTOINCREMENT)
+# Without it SQLite hands out max(id) + 1, which can be an archived id once the
+# newest hot rows are gone. The sequence starts past both tables. PostgreSQL's
+# SERIAL sequence never goes back, so only SQLite needs the rebuild.
+def _appointment_autoincrement(conn):
+    if conn.dialect.name != "sqlite":
+        return
+    table = Appointment.__table__
+    columns = ", ".join(c.name for c in table.columns)
+    for index in inspect(conn).get_indexes("appointment"):
+        conn.execute(text(f'DROP INDEX IF EXISTS "{index["name"]}"'))
+    tmp = MetaData()
+    Clinic.__table__.to_metadata(tmp)
+    Department.__table__.to_metadata(tmp)
+    User.__table__.to_metadata(tmp)
+    rebuilt = table.to_metadata(tmp, name="appointment_new")
+    rebuilt.create(conn)
+    conn.execute(text(f"INSERT INTO appointment_new ({columns}) SELECT {columns} FROM appointment"))
+    conn.execute(text("DROP TABLE appointment"))
+    conn.execute(text("ALTER TABLE appointment_new RENAME TO appointment"))
+
+    newest = conn.execute(text(
+        "SELECT max(id) FROM (SELECT id FROM appointment UNION ALL SELECT id FROM archived_appointment)"
+    )).scalar() or 0
+    conn.execute(text("DELETE FROM sqlite_sequence WHERE name = 'appointment'"))
+    conn.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES ('appointment', :seq)"),
+                 {"seq": newest})
+
+
+# MIGRATION 10: PostgreSQL sync versions come from transaction ids
+# Stores the offset (sync.BASE) that puts the next transaction's version above
+# every version the stat_counter sequence handed out. SQLite keeps its counter.
+def _sync_transaction_versions(conn):
+    if conn.dialect.name != "postgresql":
+        return
+    last = conn.execute(select(StatCounter.value).where(
+        StatCounter.clinic_id == GLOBAL_CLINIC_ID, StatCounter.scope == sync.SCOPE,
+        StatCounter.ref == sync.VERSION, StatCounter.status == "",
+    )).scalar() or 0
+    xid = conn.execute(text("SELECT pg_current_xact_id()::text::bigint")).scalar()
+    if last >= xid:
+        # create_all() and migration 7 make stat_counter with shard in its key (no
+        # server default); only a table made before sharding still lacks the column,
+        # and migration 11 moves its rows to shard 0
+        row = {"clinic_id": GLOBAL_CLINIC_ID, "scope": sync.SCOPE, "ref": sync.BASE,
+               "status": "", "value": last - xid + 1}
+        if "shard" in {c["name"] for c in inspect(conn).get_columns("stat_counter")}:
+            row["shard"] = 0
+        conn.execute(text(
+            f"INSERT INTO stat_counter ({', '.join(row)}) VALUES ({', '.join(':' + k for k in row)})"
+        ), row)
+
+
+# MIGRATION 11: Sharded dashboard counters (shard joins the stat_counter key)
+# Existing rows, sync and directory versions included, move to shard 0.
+def _stat_counter_shards(conn):
+    if "shard" in {c["name"] for c in inspect(conn).get_columns("stat_counter")}:
+        return
+    kept = conn.execute(text(
+        "SELECT clinic_id, scope, ref, status, value FROM stat_counter"
+    )).mappings().all()
+    conn.execute(text("DROP TABLE stat_counter"))
+    StatCounter.__table__.create(conn)
+    if kept:
+        conn.execute(StatCounter.__table__.insert(), [{**r, "shard": 0} for r in kept])
+
+
+# MIGRATION 12: Notifications belong to a clinic (the appointment's), so one
+# clinic's dispatch no longer claims, and skips, another clinic's outbox rows
+def _notification_clinics(conn):
+    table = Notification.__table__
+    if "clinic_id" not in {c["name"] for c in inspect(conn).get_columns("notification")}:
+        reference = "" if conn.dialect.name == "sqlite" else " REFERENCES clinic (id)"
+        conn.execute(text(
+            f"ALTER TABLE notification ADD COLUMN clinic_id INTEGER NOT NULL "
+            f"DEFAULT {DEFAULT_CLINIC_ID}{reference}"
+        ))
+    for source in ("appointment", "archived_appointment"):
+        conn.execute(text(
+            f"UPDATE notification SET clinic_id = (SELECT clinic_id FROM {source} "
+            f"WHERE {source}.id = notification.appointment_id) "
+            f"WHERE EXISTS (SELECT 1 FROM {source} WHERE {source}.id = notification.appointment_id)"
+        ))
+    for index in table.indexes:
+        index.create(conn, checkfirst=True)
+
+
+# SETUP: Ordered migration steps (version, function)
+MIGRATIONS = [
+    (1, _appointment_date_time),
+    (2, _stat_counters),
+    (3, _search_index),
+    (4, _appointment_date_index),
+    (5, _treatment_history),
+    (6, _sync_versions),
+    (7, _clinics),
+    (8, _archive),
+    (9, _appointment_autoincrement),
+    (10, _sync_transaction_versions),
+    (11, _stat_counter_shards),
+    (12, _notification_clinics),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+# FUNCTION: Read / write the stored schema version
+def _get_version(conn):
+    row = conn.execute(schema_version.select()).first()
+    return row.version if row else 0
+
+
+def _set_version(conn, version):
+    conn.execute(schema_version.delete())
+    conn.execute(schema_version.insert().values(version=version))
+
+
+# FUNCTION: Bring the database up to date (idempotent)
+# Fresh databases are created at the latest schema; existing files are
+# migrated in place, one version at a time.
+# `engine` defaults to the primary; each clinic database is upgraded on its own.
+def upgrade(engine=None):
+    engine = engine or db.engine
+    fresh = not inspect(engine).has_table("appointment")
+    db.metadata.create_all(engine)
+
+    with engine.begin() as conn:
+        if fresh:
+            # create_all() cannot make the FTS virtual table
+            search.create_index(conn)
+            _ensure_default_clinic(conn)
+            _set_version(conn, LATEST_VERSION)
+            return
+
+        version = _get_version(conn)
+        if version < 7:
+            _clinic_columns(conn)
+        for number, step in MIGRATIONS:
+            if number > version:
+                step(conn)
+                _set_version(conn, number)
+                print(f"Applied schema migration {number}")
@@ -0,0 +1,401 @@
+# SETUP: Imports
+import json
+import os
+import smtplib
+import threading
+import time as clock
+import uuid
+from collections import Counter
+from datetime import date as date_type, datetime, timedelta
+from email.message import EmailMessage
+from sqlalchemy import and_, event, exists, inspect, or_, tuple_
+from dba import db, User, Appointment, Notification, DATE_FORMAT, TIME_FORMAT, clinic_of
+from config import env_flag
+from jobs import handler
+import tenancy
+
+# SETUP: Dispatcher settings
+# The dispatcher thread drains the outbox every NOTIFY_INTERVAL seconds. Rows
+# wait NOTIFY_DELAY_SECONDS first, so quick successive changes to one
+# appointment (book, then reschedule) go out as a single message.
+NOTIFY_CHANNEL = os.environ.get("NOTIFY_CHANNEL", "file")
+NOTIFY_FILE = os.environ.get("NOTIFY_FILE", "")     # default: instance/notifications.jsonl
+NOTIFY_WORKER = env_flag("NOTIFY_WORKER", True)
+NOTIFY_INTERVAL = float(os.environ.get("NOTIFY_INTERVAL", "5"))
+NOTIFY_DELAY = int(os.environ.get("NOTIFY_DELAY_SECONDS", "30"))
+NOTIFY_BATCH = int(os.environ.get("NOTIFY_BATCH", "200"))
+NOTIFY_MAX_ATTEMPTS = int(os.environ.get("NOTIFY_MAX_ATTEMPTS", "5"))
+NOTIFY_LEASE_SECONDS = int(os.environ.get("NOTIFY_LEASE_SECONDS", "120"))
+NOTIFY_RETENTION_DAYS = int(os.environ.get("NOTIFY_RETENTION_DAYS", "30"))
+
+# SETUP: Reminders go out REMINDER_HOURS before the appointment; the dispatcher
+# looks for due ones every REMINDER_INTERVAL seconds.
+REMINDER_HOURS = int(os.environ.get("REMINDER_HOURS", "24"))
+REMINDER_INTERVAL = int(os.environ.get("REMINDER_INTERVAL", "300"))
+
+# SETUP: SMTP channel (point it at a local stand-in such as MailHog in development)
+SMTP_HOST = os.environ.get("SMTP_HOST", "localhost")
+SMTP_PORT = int(os.environ.get("SMTP_PORT", "1025"))
+SMTP_FROM = os.environ.get("SMTP_FROM", "hms@localhost")
+SMTP_USERNAME = os.environ.get("SMTP_USERNAME", "")
+SMTP_PASSWORD = os.environ.get("SMTP_PASSWORD", "")
+SMTP_STARTTLS = env_flag("SMTP_STARTTLS", False)
+SMTP_TIMEOUT = float(os.environ.get("SMTP_TIMEOUT", "10"))
+
+# Appointment status → event when a change sets it
+STATUS_EVENTS = {"Booked": "booked", "Cancelled": "cancelled", "Completed": "completed"}
+# Events the doctor hears about too (the patient is told about everything)
+DOCTOR_EVENTS = ("booked", "rescheduled", "cancelled", "reassigned")
+SUBJECTS = {
+    "booked": "Appointment booked",
+    "rescheduled": "Appointment rescheduled",
+    "reassigned": "Appointment moved to another doctor",
+    "cancelled": "Appointment cancelled",
+    "completed": "Appointment completed",
+    "reminder": "Appointment reminder",
+}
+DONE_STATUSES = ("sent", "coalesced", "skipped", "failed")
+
+# name → send(app, messages) returning {message id: error} for messages that failed
+CHANNELS = {}
+
+
+# FUNCTION: Register a delivery channel under `name`
+def channel(name):
+    def register(fn):
+        CHANNELS[name] = fn
+        return fn
+    return register
+
+
+# FUNCTION: Outbox rows for one appointment event (patient, plus doctor for some)
+def _rows(event_name, clinic_id, appointment_id, patient_id, doctor_id, date, time):
+    recipients = [patient_id]
+    if event_name in DOCTOR_EVENTS:
+        recipients.append(doctor_id)
+    return [
+        {
+            "clinic_id": clinic_id, "event": event_name, "appointment_id": appointment_id,
+            "recipient_id": recipient, "patient_id": patient_id, "doctor_id": doctor_id,
+            "date": date, "time": time,
+        }
+        for recipient in recipients
+    ]
+
+
+def _appointment_rows(event_name, a):
+    return _rows(event_name, clinic_of(a), a.id, a.patient_id, a.doctor_id, a.date, a.time)
+
+
+# FUNCTION: Event for a flushed change to an existing appointment (None if not notable)
+def _change_event(appt):
+    attrs = inspect(appt).attrs
+    if attrs.status.history.has_changes():
+        return STATUS_EVENTS.get(appt.status)
+    if attrs.doctor_id.history.has_changes():
+        return "reassigned"
+    if attrs.date.history.has_changes() or attrs.time.history.has_changes():
+        return "rescheduled"
+    return None
+
+
+# PROCESS: Write outbox rows on the flush's connection (same transaction)
+def _insert(conn, rows):
+    if rows:
+        conn.execute(Notification.__table__.insert(), rows)
+
+
+# EVENT: Record appointment changes in the outbox as part of every ORM flush
+# Bulk Core deletes call record_removed() themselves.
+@event.listens_for(db.session, "after_flush")
+def _record_changes(session, flush_context):
+    rows = []
+    for obj in session.new:
+        if isinstance(obj, Appointment) and STATUS_EVENTS.get(obj.status or "Booked"):
+            rows += _appointment_rows(STATUS_EVENTS[obj.status or "Booked"], obj)
+    for obj in session.dirty:
+        if isinstance(obj, Appointment):
+            event_name = _change_event(obj)
+            if event_name:
+                rows += _appointment_rows(event_name, obj)
+    for obj in session.deleted:
+        if isinstance(obj, Appointment) and obj.status == "Booked":
+            rows += _appointment_rows("cancelled", obj)
+    _insert(session.connection(), rows)
+
+
+# PROCESS: Tell patients about upcoming appointments about to be bulk-deleted
+# Query.delete() skips flush events, so callers pass the same query here first.
+def record_removed(query):
+    upcoming = query.filter(
+        Appointment.status == "Booked", Appointment.date >= date_type.today()
+    ).with_entities(
+        Appointment.clinic_id, Appointment.id, Appointment.patient_id, Appointment.doctor_id,
+        Appointment.date, Appointment.time,
+    )
+    rows = [
+        {
+            "clinic_id": a.clinic_id, "event": "cancelled", "appointment_id": a.id,
+            "recipient_id": a.patient_id, "patient_id": a.patient_id, "doctor_id": a.doctor_id,
+            "date": a.date, "time": a.time,
+        }
+        for a in upcoming
+    ]
+    _insert(db.session.connection(), rows)
+
+
+# PROCESS: Queue reminders for booked appointments starting within `hours`
+# A range scan on the (date, time) index; each slot is reminded once, so a
+# rescheduled appointment gets a fresh reminder for its new time.
+def schedule_reminders(hours=None, now=None):
+    now = now or datetime.now()
+    until = now + timedelta(hours=hours or REMINDER_HOURS)
+    slot = tuple_(Appointment.date, Appointment.time)
+    reminded = exists().where(
+        Notification.appointment_id == Appointment.id,
+        Notification.event == "reminder",
+        Notification.date == Appointment.date,
+        Notification.time == Appointment.time,
+    )
+    due = db.session.query(
+        Appointment.clinic_id, Appointment.id, Appointment.patient_id, Appointment.doctor_id,
+        Appointment.date, Appointment.time,
+    ).filter(
+        Appointment.date.between(now.date(), until.date()),
+        slot > tuple_(now.date(), now.time()),
+        slot <= tuple_(until.date(), until.time()),
+        Appointment.status == "Booked",
+        ~reminded,
+    )
+    rows = [row for a in due for row in _appointment_rows("reminder", a)]
+    _insert(db.session.connection(), rows)
+    db.session.commit()
+    return len(rows)
+
+
+# PROCESS: Delete delivered rows past the retention period
+def purge():
+    cutoff = datetime.utcnow() - timedelta(days=NOTIFY_RETENTION_DAYS)
+    removed = Notification.query.filter(
+        Notification.status.in_(DONE_STATUSES), Notification.created_at < cutoff
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    return removed
+
+
+# FUNCTION: Claim up to NOTIFY_BATCH due rows for this dispatcher
+# The pending → sending UPDATE re-checks the condition, so concurrent
+# dispatchers (other workers or processes) never claim the same row. Inside a
+# clinic (tenancy.using / a clinic's job) only that clinic's rows are claimed.
+def _claim(delay):
+    now = datetime.utcnow()
+    claimable = or_(
+        and_(
+            Notification.status == "pending",
+            Notification.created_at <= now - timedelta(seconds=delay),
+            or_(Notification.lease_until.is_(None), Notification.lease_until <= now),
+        ),
+        and_(Notification.status == "sending", Notification.lease_until <= now),
+    )
+    ids = [
+        i for (i,) in db.session.query(Notification.id)
+        .filter(claimable).order_by(Notification.id).limit(NOTIFY_BATCH)
+    ]
+    if not ids:
+        return []
+
+    token = uuid.uuid4().hex
+    Notification.query.filter(Notification.id.in_(ids), claimable).update(
+        {
+            "status": "sending",
+            "claim": token,
+            "lease_until": now + timedelta(seconds=NOTIFY_LEASE_SECONDS),
+            "attempts": Notification.attempts + 1,
+        },
+        synchronize_session=False,
+    )
+    db.session.commit()
+    return Notification.query.filter_by(claim=token).order_by(Notification.id).all()
+
+
+# OUTPUT: Message dict for an outbox row
+def render(n, recipient, other):
+    title = SUBJECTS[n.event]
+    when = f"{n.date.strftime(DATE_FORMAT)} at {n.time.strftime(TIME_FORMAT)}"
+    if other is None:
+        with_whom = ""
+    elif n.recipient_id == n.patient_id:
+        with_whom = f" with {other.name}" + (f" ({other.specialization})" if other.specialization else "")
+    else:
+        with_whom = f" with patient {other.name}"
+    return {
+        "id": n.id,
+        "to": recipient.email,
+        "subject": f"{title}: {when}",
+        "body": f"Hello {recipient.name},\n\n{title}: {when}{with_whom}.\n",
+        "event": n.event,
+        "appointment_id": n.appointment_id,
+    }
+
+
+# CLASS: Outbox dispatcher (background thread, also driven by jobs and the CLI)
+class Dispatcher:
+    def __init__(self):
+        self.app = None
+        self._thread = None
+        self._next_reminders = 0.0
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions["notifications"] = self
+
+    # Start the background thread (once the schema exists)
+    def start(self):
+        if not NOTIFY_WORKER or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._loop, name="notify", daemon=True)
+        self._thread.start()
+
+    # Each partition (the primary, then each clinic database) has its own outbox
+    def _loop(self):
+        while True:
+            clock.sleep(NOTIFY_INTERVAL)
+            reminders = clock.monotonic() >= self._next_reminders
+            if reminders:
+                self._next_reminders = clock.monotonic() + REMINDER_INTERVAL
+            try:
+                with self.app.app_context():
+                    partitions = tenancy.partitions()
+                for partition in partitions:
+                    with self.app.app_context(), tenancy.using(partition):
+                        self.tick(reminders)
+            except Exception:
+                self.app.logger.exception("Notification dispatcher failed")
+
+    # PROCESS: One scheduler round: reminders and purge when due, then drain
+    def tick(self, reminders=None):
+        if reminders is None:
+            reminders = clock.monotonic() >= self._next_reminders
+            if reminders:
+                self._next_reminders = clock.monotonic() + REMINDER_INTERVAL
+        if reminders:
+            schedule_reminders()
+            purge()
+        return self.drain()
+
+    # PROCESS: Send batches until nothing due is left; returns outcome counts
+    def drain(self, delay=None):
+        totals = Counter()
+        while True:
+            outcome = self.send_batch(NOTIFY_DELAY if delay is None else delay)
+            if outcome is None:
+                return dict(totals)
+            totals.update(outcome)
+
+    # PROCESS: Claim, coalesce and send one batch (None when nothing was due)
+    # Rows for the same recipient and appointment collapse into the latest
+    # one; a booking cancelled before anything went out is dropped entirely.
+    def send_batch(self, delay):
+        rows = _claim(delay)
+        if not rows:
+            return None
+
+        groups = {}
+        for n in rows:
+            groups.setdefault((n.recipient_id, n.appointment_id), []).append(n)
+        people = {
+            u.id: u for u in User.query.filter(User.id.in_(
+                {n.recipient_id for n in rows} | {n.patient_id for n in rows} | {n.doctor_id for n in rows}
+            ))
+        }
+
+        now = datetime.utcnow()
+        outcome = Counter()
+        pending = {}
+        for group in groups.values():
+            latest = group[-1]
+            for n in group[:-1]:
+                n.status, n.sent_at, n.claim = "coalesced", now, None
+                outcome["coalesced"] += 1
+
+            recipient = people.get(latest.recipient_id)
+            if recipient is None or not recipient.email or (
+                group[0].event == "booked" and latest.event == "cancelled"
+            ):
+                latest.status, latest.claim = "skipped", None
+                outcome["skipped"] += 1
+                continue
+            other_id = latest.doctor_id if latest.recipient_id == latest.patient_id else latest.patient_id
+            pending[latest.id] = (latest, render(latest, recipient, people.get(other_id)))
+
+        failed = {}
+        if pending:
+            try:
+                send = CHANNELS[NOTIFY_CHANNEL]
+                failed = send(self.app, [message for _, message in pending.values()])
+            except Exception as e:
+                self.app.logger.exception("Notification channel %s failed", NOTIFY_CHANNEL)
+                failed = {i: repr(e) for i in pending}
+
+        for i, (n, _) in pending.items():
+            n.claim = None
+            if i in failed:
+                n.error = failed[i][:2000]
+                if n.attempts >= NOTIFY_MAX_ATTEMPTS:
+                    n.status = "failed"
+                    outcome["failed"] += 1
+                else:
+                    # back off; _claim() skips the row until lease_until passes
+                    n.status = "pending"
+                    n.lease_until = now + timedelta(seconds=NOTIFY_INTERVAL * 2 ** n.attempts)
+                    outcome["retrying"] += 1
+            else:
+                n.status, n.sent_at, n.error = "sent", now, None
+                outcome["sent"] += 1
+        db.session.commit()
+        return outcome
+
+
+dispatcher = Dispatcher()
+
+
+# CHANNEL: Append JSON lines to a file (development and audit sink)
+@channel("file")
+def file_channel(app, messages):
+    path = NOTIFY_FILE or os.path.join(app.instance_path, "notifications.jsonl")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    stamp = datetime.utcnow().isoformat() + "Z"
+    with open(path, "a", encoding="utf-8") as f:
+        for m in messages:
+            f.write(json.dumps({**m, "sent_at": stamp}) + "\n")
+    return {}
+
+
+# CHANNEL: Email over one SMTP connection per batch
+@channel("smtp")
+def smtp_channel(app, messages):
+    failed = {}
+    with smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=SMTP_TIMEOUT) as smtp:
+        if SMTP_STARTTLS:
+            smtp.starttls()
+        if SMTP_USERNAME:
+            smtp.login(SMTP_USERNAME, SMTP_PASSWORD)
+        for m in messages:
+            msg = EmailMessage()
+            msg["From"] = SMTP_FROM
+            msg["To"] = m["to"]
+            msg["Subject"] = m["subject"]
+            msg.set_content(m["body"])
+            try:
+                smtp.send_message(msg)
+            except smtplib.SMTPException as e:
+                failed[m["id"]] = repr(e)
+    return failed
+
+
+# JOB: Queue due reminders now and send everything pending
+@handler("reminders")
+def send_reminders(ctx, params):
+    queued = schedule_reminders(params.get("hours"))
+    ctx.progress(50)
+    return {"reminders_queued": queued, **dispatcher.drain(delay=0)}
@@ -0,0 +1,86 @@
+# SETUP: Imports
+import base64
+import json
+from flask import request, jsonify
+from sqlalchemy import tuple_
+
+# SETUP: Page size limits
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# Response header carrying the opaque cursor for the next page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+# ERROR: Bad cursor / limit / filter in the query string
+class PaginationError(ValueError):
+    pass
+
+
+# FUNCTION: Encode key values into an opaque cursor
+def encode_cursor(values):
+    raw = json.dumps(list(values), separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+# FUNCTION: Decode an opaque cursor back into key values
+def decode_cursor(cursor, size):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise PaginationError("Invalid cursor")
+
+    if not isinstance(values, list) or len(values) != size:
+        raise PaginationError("Invalid cursor")
+    return values
+
+
+# FUNCTION: Read ?limit= (clamped to MAX_PAGE_SIZE)
+def page_size():
+    raw = request.args.get("limit")
+    if raw is None:
+        return DEFAULT_PAGE_SIZE
+    try:
+        limit = int(raw)
+    except ValueError:
+        raise PaginationError("Invalid limit")
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+# FUNCTION: Fetch one keyset page
+# `columns` must match the query's ORDER BY (all ascending, or all descending
+# with descending=True). The next page starts strictly after the last row's
+# key, so deep pages cost the same as page one.
+# `key_of` turns a row into JSON-safe key values; `load_key` turns them back
+# into column values (e.g. date strings → date objects).
+def keyset_page(query, columns, key_of, load_key=None, descending=False):
+    cursor = request.args.get("cursor")
+    if cursor:
+        values = decode_cursor(cursor, len(columns))
+        if load_key:
+            try:
+                values = load_key(values)
+            except (TypeError, ValueError):
+                raise PaginationError("Invalid cursor")
+            if any(v is None for v in values):
+                raise PaginationError("Invalid cursor")
+        key, after = tuple_(*columns), tuple_(*values)
+        query = query.filter(key < after if descending else key > after)
+
+    limit = page_size()
+    rows = query.limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(key_of(rows[-1]))
+    return rows, next_cursor
+
+
+# OUTPUT: JSON list + next cursor header
+def page_response(items, next_cursor):
+    resp = jsonify(items)
+    if next_cursor:
+        resp.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return resp
@@ -0,0 +1,96 @@
+# SETUP: Imports
+import csv
+from datetime import date, datetime, timedelta
+from sqlalchemy import case, func, tuple_
+from dba import db, User, Treatment
+from exports import APPOINTMENT_COLUMNS, EXPORT_BATCH, appointment_query, plain
+from archive import all_appointments
+from jobs import handler
+
+
+# FUNCTION: First and last day of a "YYYY-MM" month (defaults to this month)
+def month_range(month=None):
+    first = datetime.strptime(month, "%Y-%m").date() if month else date.today().replace(day=1)
+    last = (first.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+    return first, last
+
+
+# JOB: Monthly per-doctor activity (one grouped query, archived months included)
+# Treatment is append-only (one row per doctor update), so it is reduced to one
+# row per treated appointment before the join; "treatments" counts treated visits.
+@handler("doctor_activity")
+def doctor_activity(ctx, params):
+    first, last = month_range(params.get("month"))
+    visit = all_appointments()
+    treated = (
+        db.session.query(Treatment.appointment_id.label("appointment_id"))
+        .group_by(Treatment.appointment_id)
+        .subquery("treated")
+    )
+
+    def status_count(status):
+        return func.sum(case((visit.status == status, 1), else_=0))
+
+    rows = (
+        db.session.query(
+            User.id, User.name, User.specialization,
+            func.count(visit.id),
+            status_count("Booked"), status_count("Completed"), status_count("Cancelled"),
+            func.count(func.distinct(visit.patient_id)),
+            func.count(treated.c.appointment_id),
+        )
+        .join(visit, visit.doctor_id == User.id)
+        .outerjoin(treated, treated.c.appointment_id == visit.id)
+        .filter(visit.date >= first, visit.date <= last)
+        .group_by(User.id, User.name, User.specialization)
+        .order_by(User.id)
+        .all()
+    )
+    ctx.progress(90)
+
+    return {
+        "month": first.strftime("%Y-%m"),
+        "doctors": [
+            {
+                "doctor_id": doctor_id,
+                "name": name,
+                "specialization": specialization,
+                "total": total,
+                "booked": booked or 0,
+                "completed": completed or 0,
+                "cancelled": cancelled or 0,
+                "patients": patients,
+                "treatments": treatments,
+            }
+            for doctor_id, name, specialization, total, booked, completed,
+            cancelled, patients, treatments in rows
+        ],
+    }
+
+
+# JOB: Appointments CSV export (params: the appointment list filters)
+# Reads in keyset batches so progress commits never interrupt an open cursor.
+@handler("export_appointments")
+def export_appointments(ctx, params):
+    source = all_appointments()
+    query = appointment_query(params, source)
+    total = query.order_by(None).count() or 1
+    order = (source.date, source.time, source.id)
+    written, last_key = 0, None
+
+    with open(ctx.output_file("csv"), "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(APPOINTMENT_COLUMNS)
+        while True:
+            batch = query
+            if last_key:
+                batch = batch.filter(tuple_(*order) > tuple_(*last_key))
+            rows = batch.limit(EXPORT_BATCH).all()
+            if not rows:
+                break
+            writer.writerows([plain(v) for v in r] for r in rows)
+            written += len(rows)
+            last_key = (rows[-1][1], rows[-1][2], rows[-1][0])
+            ctx.progress(written * 100 // total)
+
+    return {"rows": written}
@@ -0,0 +1,145 @@
+# SETUP: Imports
+import os
+import random
+import threading
+import time
+from functools import wraps
+from flask import current_app, g, has_app_context, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import Select, event
+from sqlalchemy.exc import OperationalError
+
+# SETUP: Replica settings
+# Replica engines are SQLALCHEMY_BINDS entries named replica1, replica2, ...
+REPLICA_PREFIX = "replica"
+# Clinics with their own database are binds named clinic<id> (see tenancy.py)
+SHARD_PREFIX = "clinic"
+# After a user writes, their reads stay on the primary for this long
+STICKY_SECONDS = float(os.environ.get("REPLICA_STICKY_SECONDS", "10"))
+# A replica that failed a query is skipped for this long
+RETRY_SECONDS = float(os.environ.get("REPLICA_RETRY_SECONDS", "30"))
+
+# (clinic id, user id) → monotonic deadline (read-your-writes), replica key → deadline (marked down)
+_recent_writers = {}
+_down = {}
+_lock = threading.Lock()
+
+
+# FUNCTION: Is key still before its deadline in table?
+def _active(table, key):
+    with _lock:
+        deadline = table.get(key)
+        if deadline is None:
+            return False
+        if deadline < time.monotonic():
+            del table[key]
+            return False
+        return True
+
+
+def _mark(table, key, seconds):
+    with _lock:
+        table[key] = time.monotonic() + seconds
+
+
+# FUNCTION: Replica bind keys configured on the current app
+def replica_keys():
+    engines = current_app.extensions["sqlalchemy"].engines
+    return [k for k in engines if k and k.startswith(REPLICA_PREFIX)]
+
+
+# FUNCTION: Bind key of a clinic's own database (None → it lives on the primary)
+def shard_key(clinic_id):
+    if clinic_id is None:
+        return None
+    key = f"{SHARD_PREFIX}{clinic_id}"
+    return key if key in current_app.extensions["sqlalchemy"].engines else None
+
+
+# FUNCTION: Read-your-writes key for the request's user
+def _writer_key():
+    user = getattr(request, "current_user", None) if has_request_context() else None
+    return None if user is None else (g.get("clinic_id"), user.id)
+
+
+# FUNCTION: Replica for this request (None → use the primary)
+# Replicas mirror the primary only; sharded clinics always use their own database.
+def pick_replica():
+    writer = _writer_key()
+    if writer is not None and _active(_recent_writers, writer):
+        return None
+    if shard_key(g.get("clinic_id")):
+        return None
+    healthy = [k for k in replica_keys() if not _active(_down, k)]
+    return random.choice(healthy) if healthy else None
+
+
+# SESSION: Sends everything for a sharded clinic to that clinic's database,
+# and plain SELECTs to the request's replica
+# Flushes, INSERT/UPDATE/DELETE and anything after this session has
+# written stay on the primary, so a request always sees its own changes.
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_app_context():
+            shard = shard_key(g.get("clinic_id"))
+            if shard:
+                return self._db.engines[shard]
+        if (
+            bind is None
+            and isinstance(clause, Select)
+            and not self._flushing
+            and not self.info.get("wrote")
+            and has_app_context()
+            and g.get("replica")
+        ):
+            return self._db.engines[g.replica]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+# EVENT: Track writes for read-your-writes
+@event.listens_for(RoutingSession, "after_flush")
+def _after_flush(session, flush_context):
+    session.info["wrote"] = True
+
+
+@event.listens_for(RoutingSession, "do_orm_execute")
+def _bulk_write(state):
+    if state.is_update or state.is_delete:
+        state.session.info["wrote"] = True
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _after_commit(session):
+    if not session.info.pop("wrote", False):
+        return
+    if has_app_context():
+        g.pop("replica", None)
+    writer = _writer_key()
+    if writer is not None:
+        _mark(_recent_writers, writer, STICKY_SECONDS)
+
+
+@event.listens_for(RoutingSession, "after_rollback")
+def _after_rollback(session):
+    session.info.pop("wrote", None)
+
+
+# DECORATOR: Serve a read-only route from a replica when one is configured
+# A replica that errors is marked down and the request is retried once on
+# the primary.
+def read_replica(f):
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        key = pick_replica()
+        if key is None:
+            return f(*args, **kwargs)
+
+        g.replica = key
+        try:
+            return f(*args, **kwargs)
+        except OperationalError:
+            _mark(_down, key, RETRY_SECONDS)
+            g.pop("replica", None)
+            current_app.extensions["sqlalchemy"].session.rollback()
+            return f(*args, **kwargs)
+    return wrapper
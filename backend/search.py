@@ -0,0 +1,285 @@
+# SETUP: Imports
+import re
+from sqlalchemy import (
+    Column, Integer, MetaData, String, Table, and_, delete, event, func, inspect,
+    literal, literal_column, or_, select, text,
+)
+from sqlalchemy.orm import joinedload
+from dba import db, User, Appointment, Treatment, ROLE_DOCTOR, ROLE_PATIENT, DATE_FORMAT, TIME_FORMAT
+from dba import ArchivedAppointment, DEFAULT_CLINIC_ID, current_clinic_id
+from archive import all_appointments
+
+# SETUP: Search index
+# One row per searchable record: kind is "patient" / "doctor" (users),
+# "appointment" (diagnosis, prescription) or "treatment" (+ notes); ref is its id;
+# clinic is the owning clinic (a treatment's is its appointment's).
+# On SQLite this is an FTS5 virtual table, on PostgreSQL a plain table with a
+# GIN tsvector index. It lives outside db.metadata so create_all never makes it.
+index_table = Table(
+    "search_index", MetaData(),
+    Column("kind", String),
+    Column("ref", Integer),
+    Column("title", String),
+    Column("body", String),
+    Column("clinic", Integer),
+)
+COLUMNS = ["kind", "ref", "title", "body", "clinic"]
+
+# Columns whose changes require re-indexing a row
+INDEXED_FIELDS = {
+    User: ("name", "username", "email", "specialization", "role"),
+    Appointment: ("diagnosis", "prescription"),
+    Treatment: ("diagnosis", "prescription", "notes", "appointment_id"),
+}
+
+USER_KINDS = (ROLE_PATIENT, ROLE_DOCTOR)
+KINDS = USER_KINDS + ("appointment", "treatment")
+MAX_TERMS = 8
+
+# FTS5 column weights (kind, ref, title, body, clinic): a name hit outranks a notes hit
+SQLITE_SCORE = "bm25(search_index, 0, 0, 10.0, 1.0, 0)"
+PG_DOCUMENT = "to_tsvector('simple', title || ' ' || body)"
+
+
+# PROCESS: Create the index (migration 3 and fresh databases)
+def create_index(conn):
+    if conn.dialect.name == "sqlite":
+        conn.execute(text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+            "kind UNINDEXED, ref UNINDEXED, title, body, clinic UNINDEXED, "
+            "tokenize='unicode61', prefix='2 3')"
+        ))
+    else:
+        index_table.create(conn, checkfirst=True)
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_search_kind_ref ON search_index (kind, ref)"
+        ))
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_search_clinic_kind ON search_index (clinic, kind)"
+        ))
+        conn.execute(text(
+            f"CREATE INDEX IF NOT EXISTS ix_search_document ON search_index USING gin ({PG_DOCUMENT})"
+        ))
+
+
+# FUNCTION: "a b c" joined with spaces, NULLs as ""
+def _joined(*columns):
+    expr = func.coalesce(columns[0], "")
+    for column in columns[1:]:
+        expr = expr + " " + func.coalesce(column, "")
+    return expr
+
+
+# FUNCTION: Document selects (kind, ref, title, body, clinic) per base table
+def _user_documents():
+    return select(
+        User.role, User.id, _joined(User.name),
+        _joined(User.username, User.email, User.specialization), User.clinic_id,
+    ).where(User.role.in_(USER_KINDS))
+
+
+# Archived appointments keep their documents (archive.py deletes hot rows with
+# Core, which leaves the index alone); rebuilds read both tables.
+def _appointment_documents(model=Appointment):
+    return select(
+        literal("appointment"), model.id, literal(""),
+        _joined(model.diagnosis, model.prescription), model.clinic_id,
+    ).where(or_(
+        func.coalesce(model.diagnosis, "") != "",
+        func.coalesce(model.prescription, "") != "",
+    ))
+
+
+def _archived_appointment_documents():
+    return _appointment_documents(ArchivedAppointment)
+
+
+def _treatment_documents():
+    return select(
+        literal("treatment"), Treatment.id, literal(""),
+        _joined(Treatment.diagnosis, Treatment.prescription, Treatment.notes),
+        func.coalesce(Appointment.clinic_id, ArchivedAppointment.clinic_id, DEFAULT_CLINIC_ID),
+    ).outerjoin(Appointment, Appointment.id == Treatment.appointment_id).outerjoin(
+        ArchivedAppointment, ArchivedAppointment.id == Treatment.appointment_id
+    )
+
+
+# PROCESS: Re-index the given ids (missing rows simply drop out of the index)
+def reindex(conn, users=(), appointments=(), treatments=()):
+    table = index_table
+    for kinds, ids, documents, model in (
+        (USER_KINDS, users, _user_documents, User),
+        (("appointment",), appointments, _appointment_documents, Appointment),
+        (("treatment",), treatments, _treatment_documents, Treatment),
+    ):
+        ids = list(ids)
+        if not ids:
+            continue
+        conn.execute(delete(table).where(table.c.kind.in_(kinds), table.c.ref.in_(ids)))
+        conn.execute(table.insert().from_select(
+            COLUMNS, documents().where(model.id.in_(ids))
+        ))
+
+
+# PROCESS: Rebuild the whole index from the base tables
+def rebuild(conn):
+    conn.execute(delete(index_table))
+    for documents in (
+        _user_documents, _appointment_documents, _archived_appointment_documents,
+        _treatment_documents,
+    ):
+        conn.execute(index_table.insert().from_select(COLUMNS, documents()))
+
+
+# FUNCTION: Did the pending flush change one of these columns?
+def _modified(obj, fields):
+    attrs = inspect(obj).attrs
+    return any(attrs[f].history.has_changes() for f in fields)
+
+
+# EVENT: Keep the index current with every ORM flush (same transaction)
+# Bulk Core writes (imports, bulk deletes) call reindex() themselves.
+@event.listens_for(db.session, "after_flush")
+def _track_changes(session, flush_context):
+    changed = {model: set() for model in INDEXED_FIELDS}
+    for obj in list(session.new) + list(session.deleted):
+        if type(obj) in changed:
+            changed[type(obj)].add(obj.id)
+    for obj in session.dirty:
+        fields = INDEXED_FIELDS.get(type(obj))
+        if fields and _modified(obj, fields):
+            changed[type(obj)].add(obj.id)
+    if any(changed.values()):
+        reindex(
+            session.connection(),
+            users=changed[User],
+            appointments=changed[Appointment],
+            treatments=changed[Treatment],
+        )
+
+
+# FUNCTION: Prefix query from free text (None when there is nothing to search)
+def match_expression(q, dialect):
+    terms = re.findall(r"\w+", (q or "").lower())[:MAX_TERMS]
+    if not terms:
+        return None
+    if dialect == "sqlite":
+        return " ".join(f'"{t}"*' for t in terms)
+    return " & ".join(f"{t}:*" for t in terms)
+
+
+# FUNCTION: Restrict hits to what a doctor may see
+# Doctors see the doctor directory, patients they have an appointment with,
+# and appointments / treatments of their own (archived ones included).
+def _doctor_scope(doctor_id):
+    table = index_table
+    visit = all_appointments()
+    own = select(visit.id).where(visit.doctor_id == doctor_id)
+    return or_(
+        table.c.kind == ROLE_DOCTOR,
+        and_(table.c.kind == ROLE_PATIENT, table.c.ref.in_(
+            select(visit.patient_id).where(visit.doctor_id == doctor_id)
+        )),
+        and_(table.c.kind == "appointment", table.c.ref.in_(own)),
+        and_(table.c.kind == "treatment", table.c.ref.in_(
+            select(Treatment.id).where(Treatment.appointment_id.in_(own))
+        )),
+    )
+
+
+# FUNCTION: Ranked hits of the current clinic as a subquery with columns (score, kind, ref)
+# Lower score is better on both backends, so pages run in ascending order.
+def ranked(q, kinds, doctor_id=None):
+    dialect = db.session.get_bind().dialect.name
+    expression = match_expression(q, dialect)
+    if expression is None:
+        return None
+
+    table = index_table
+    if dialect == "sqlite":
+        score = literal_column(SQLITE_SCORE)
+        matches = text("search_index MATCH :expression").bindparams(expression=expression)
+    else:
+        query = func.to_tsquery("simple", expression)
+        score = -func.ts_rank(literal_column(PG_DOCUMENT), query)
+        matches = literal_column(PG_DOCUMENT).op("@@")(query)
+
+    stmt = select(score.label("score"), table.c.kind, table.c.ref).where(
+        matches, table.c.kind.in_(kinds)
+    )
+    clinic_id = current_clinic_id()
+    if clinic_id is not None:
+        stmt = stmt.where(table.c.clinic == clinic_id)
+    if doctor_id is not None:
+        stmt = stmt.where(_doctor_scope(doctor_id))
+    return stmt.subquery()
+
+
+# FUNCTION: Hits → result dicts (one query per kind present on the page)
+def hydrate(hits):
+    wanted = {}
+    for _, kind, ref in hits:
+        wanted.setdefault(kind, []).append(ref)
+
+    found = {}
+    user_ids = wanted.get(ROLE_PATIENT, []) + wanted.get(ROLE_DOCTOR, [])
+    if user_ids:
+        for u in User.query.filter(User.id.in_(user_ids)):
+            found[(u.role, u.id)] = {
+                "name": u.name,
+                "username": u.username,
+                "email": u.email,
+                "specialization": u.specialization if u.role == ROLE_DOCTOR else None,
+            }
+
+    appt_ids = set(wanted.get("appointment", []))
+    treatments = {}
+    if wanted.get("treatment"):
+        for t in Treatment.query.filter(Treatment.id.in_(wanted["treatment"])):
+            treatments[t.id] = t
+            if t.appointment_id:
+                appt_ids.add(t.appointment_id)
+    appts = {}
+    if appt_ids:
+        visit = all_appointments()
+        appts = {
+            a.id: a
+            for a in db.session.query(visit).options(
+                joinedload(visit.doctor), joinedload(visit.patient)
+            ).filter(visit.id.in_(appt_ids))
+        }
+
+    def appointment_fields(a):
+        return {
+            "appointment_id": a.id,
+            "date": a.date.strftime(DATE_FORMAT),
+            "time": a.time.strftime(TIME_FORMAT),
+            "doctor_id": a.doctor_id,
+            "doctor_name": a.doctor.name if a.doctor else None,
+            "patient_id": a.patient_id,
+            "patient_name": a.patient.name if a.patient else None,
+        }
+
+    for ref in wanted.get("appointment", []):
+        a = appts.get(ref)
+        if a:
+            found[("appointment", ref)] = {
+                **appointment_fields(a),
+                "diagnosis": a.diagnosis,
+                "prescription": a.prescription,
+            }
+    for ref in wanted.get("treatment", []):
+        t = treatments.get(ref)
+        a = appts.get(t.appointment_id) if t else None
+        if t and a:
+            found[("treatment", ref)] = {
+                **appointment_fields(a),
+                "diagnosis": t.diagnosis,
+                "prescription": t.prescription,
+                "notes": t.notes,
+            }
+
+    return [
+        {"kind": kind, "id": ref, **found[(kind, ref)]}
+        for _, kind, ref in hits if (kind, ref) in found
+    ]
@@ -0,0 +1,239 @@
+# SETUP: Imports
+import os
+import threading
+import time as clock
+from bisect import bisect_right
+from datetime import datetime, timedelta, time
+from dba import db, Appointment, SlotHold, DoctorSchedule, DoctorLeave, current_clinic_id
+
+# SETUP: Template used for doctors who have not set their own hours
+# weekday → (start, end, slot minutes, break start, break end); Mon–Fri only
+DEFAULT_TEMPLATE = {
+    day: (time(9, 0), time(17, 0), 30, time(13, 0), time(14, 0)) for day in range(5)
+}
+
+# SETUP: Limits
+MAX_RANGE_DAYS = 62
+CACHE_TTL = int(os.environ.get("SLOT_CACHE_TTL", "300"))
+
+
+# FUNCTION: Minutes since midnight
+def _minutes(t):
+    return t.hour * 60 + t.minute
+
+
+# FUNCTION: Slot start times for one template day (breaks removed)
+def day_grid(start, end, slot_minutes, break_start=None, break_end=None):
+    grid = []
+    cursor = _minutes(start)
+    while cursor + slot_minutes <= _minutes(end):
+        slot_end = cursor + slot_minutes
+        in_break = (
+            break_start and break_end
+            and cursor < _minutes(break_end) and slot_end > _minutes(break_start)
+        )
+        if not in_break:
+            grid.append(time(cursor // 60, cursor % 60))
+        cursor = slot_end
+    return grid
+
+
+# FUNCTION: Index of the grid slot containing time t (None if outside every slot)
+def _slot_index(starts, slot_minutes, t):
+    m = _minutes(t)
+    i = bisect_right(starts, m) - 1
+    if i >= 0 and m < starts[i] + slot_minutes:
+        return i
+    return None
+
+
+# CACHE: Free-slot bitmaps per doctor-day
+# Each entry is (grid, slot_minutes, bitmap); bit i is set while grid[i] is free. The
+# TTL bounds staleness across workers; local writes invalidate immediately.
+# Keys carry the current clinic: doctor ids repeat across clinic databases.
+class DayCache:
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, doctor_id, day):
+        with self._lock:
+            entry = self._data.get((current_clinic_id(), doctor_id, day))
+            if not entry or entry[0] < clock.monotonic():
+                return None
+            return entry[1]
+
+    def put(self, doctor_id, day, value):
+        with self._lock:
+            self._data[(current_clinic_id(), doctor_id, day)] = (clock.monotonic() + self.ttl, value)
+
+    def invalidate(self, doctor_id, day=None):
+        clinic_id = current_clinic_id()
+        with self._lock:
+            if day is not None:
+                self._data.pop((clinic_id, doctor_id, day), None)
+            else:
+                for key in [k for k in self._data if k[:2] == (clinic_id, doctor_id)]:
+                    del self._data[key]
+
+
+cache = DayCache(CACHE_TTL)
+
+
+# FUNCTION: Drop cached availability after a booking / schedule change
+def invalidate(doctor_id, day=None):
+    cache.invalidate(doctor_id, day)
+
+
+# FUNCTION: Weekly template for a doctor (falls back to DEFAULT_TEMPLATE)
+def template_for(doctor_id):
+    rows = DoctorSchedule.query.filter_by(doctor_id=doctor_id).all()
+    if not rows:
+        return DEFAULT_TEMPLATE
+    return {r.weekday: _spec(r) for r in rows}
+
+
+# FUNCTION: Schedule row → (start, end, slot minutes, break start, break end)
+def _spec(row):
+    return (row.start_time, row.end_time, row.slot_minutes, row.break_start, row.break_end)
+
+
+# FUNCTION: (grid, slot_minutes, bitmap) for one working day with `taken` times cleared
+def _day_entry(spec, taken):
+    grid = day_grid(*spec)
+    starts = [_minutes(g) for g in grid]
+    bitmap = (1 << len(grid)) - 1
+    for t in taken:
+        i = _slot_index(starts, spec[2], t)
+        if i is not None:
+            bitmap &= ~(1 << i)
+    return (tuple(grid), spec[2], bitmap)
+
+
+# FUNCTION: Build bitmaps for uncached days
+# One range query fetches every taken slot for the whole span, then each
+# day's bitmap is cleared bit by bit instead of probing slot by slot.
+def _build_days(doctor_id, days, template):
+    leaves = DoctorLeave.query.filter(
+        DoctorLeave.doctor_id == doctor_id,
+        DoctorLeave.start_date <= days[-1],
+        DoctorLeave.end_date >= days[0],
+    ).all()
+
+    taken = {}
+    rows = db.session.query(Appointment.date, Appointment.time).filter(
+        Appointment.doctor_id == doctor_id,
+        Appointment.date >= days[0],
+        Appointment.date <= days[-1],
+    )
+    for day, t in rows:
+        taken.setdefault(day, []).append(t)
+
+    built = {}
+    for day in days:
+        spec = template.get(day.weekday())
+        on_leave = any(l.start_date <= day <= l.end_date for l in leaves)
+        if not spec or on_leave:
+            built[day] = ((), 0, 0)
+            continue
+
+        built[day] = _day_entry(spec, taken.get(day, ()))
+        cache.put(doctor_id, day, built[day])
+    return built
+
+
+# PROCESS: Free slots per day in [start, end]
+# Returns [(date, [time, ...]), ...]; live holds and past slots are removed.
+def free_slots(doctor_id, start, end):
+    days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+
+    found, missing = {}, []
+    for day in days:
+        entry = cache.get(doctor_id, day)
+        if entry is None:
+            missing.append(day)
+        else:
+            found[day] = entry
+    if missing:
+        found.update(_build_days(doctor_id, missing, template_for(doctor_id)))
+
+    held = db.session.query(SlotHold.date, SlotHold.time).filter(
+        SlotHold.doctor_id == doctor_id,
+        SlotHold.date >= start,
+        SlotHold.date <= end,
+        SlotHold.expires_at > datetime.utcnow(),
+    )
+    masks = {}
+    for day, t in held:
+        grid, slot_minutes, _ = found[day]
+        i = _slot_index([_minutes(g) for g in grid], slot_minutes, t)
+        if i is not None:
+            masks[day] = masks.get(day, 0) | 1 << i
+
+    now = datetime.now()
+    result = []
+    for day in days:
+        grid, _, bitmap = found[day]
+        bitmap &= ~masks.get(day, 0)
+        free = [
+            t for i, t in enumerate(grid)
+            if bitmap >> i & 1 and datetime.combine(day, t) > now
+        ]
+        result.append((day, free))
+    return result
+
+
+# PROCESS: Free slots for many doctors at once → {doctor_id: {date: [time, ...]}}
+# Four set-based queries (templates, leave, appointments, holds) cover every
+# doctor and day, for bulk planning where per-doctor lookups would add up.
+def free_slot_map(doctor_ids, start, end):
+    doctor_ids = list(doctor_ids)
+    if not doctor_ids:
+        return {}
+    days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+
+    templates = {}
+    for r in DoctorSchedule.query.filter(DoctorSchedule.doctor_id.in_(doctor_ids)):
+        templates.setdefault(r.doctor_id, {})[r.weekday] = _spec(r)
+
+    leaves = {}
+    for l in DoctorLeave.query.filter(
+        DoctorLeave.doctor_id.in_(doctor_ids),
+        DoctorLeave.start_date <= end,
+        DoctorLeave.end_date >= start,
+    ):
+        leaves.setdefault(l.doctor_id, []).append(l)
+
+    taken = {}
+    booked = db.session.query(Appointment.doctor_id, Appointment.date, Appointment.time).filter(
+        Appointment.doctor_id.in_(doctor_ids),
+        Appointment.date >= start,
+        Appointment.date <= end,
+    )
+    held = db.session.query(SlotHold.doctor_id, SlotHold.date, SlotHold.time).filter(
+        SlotHold.doctor_id.in_(doctor_ids),
+        SlotHold.date >= start,
+        SlotHold.date <= end,
+        SlotHold.expires_at > datetime.utcnow(),
+    )
+    for doctor_id, day, t in booked.union_all(held):
+        taken.setdefault((doctor_id, day), []).append(t)
+
+    now = datetime.now()
+    result = {}
+    for doctor_id in doctor_ids:
+        template = templates.get(doctor_id, DEFAULT_TEMPLATE)
+        free = result[doctor_id] = {}
+        for day in days:
+            spec = template.get(day.weekday())
+            if not spec or any(l.start_date <= day <= l.end_date for l in leaves.get(doctor_id, ())):
+                continue
+            grid, _, bitmap = _day_entry(spec, taken.get((doctor_id, day), ()))
+            times = [
+                t for i, t in enumerate(grid)
+                if bitmap >> i & 1 and datetime.combine(day, t) > now
+            ]
+            if times:
+                free[day] = times
+    return result
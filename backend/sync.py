@@ -0,0 +1,323 @@
+# SETUP: Imports
+import os
+from datetime import datetime, timedelta
+from sqlalchemy import event, func, inspect, literal, literal_column, select, or_
+from dba import db, User, Appointment, StatCounter, SyncTombstone, ROLE_ADMIN, ROLE_DOCTOR
+from dba import GLOBAL_CLINIC_ID, clinic_of
+from pagination import PaginationError, encode_cursor, decode_cursor
+import counters
+
+# SETUP: One database-wide change sequence shared by the clinics of that database.
+# Every flush that changes a mirrored row takes a version and stamps it on the
+# rows (sync_version) and on tombstones. Readers only go up to current_version(),
+# below which every version has committed or rolled back, so a client that has
+# seen version N never misses a change <= N.
+#  - SQLite: a counter row in stat_counter (scope "sync", GLOBAL_CLINIC_ID). It
+#    stays locked until commit, which costs nothing: SQLite runs one writer at a time.
+#  - PostgreSQL: the writing transaction's id (pg_current_xact_id), taken without
+#    any shared row, so concurrent bookings do not queue behind each other. The
+#    low-water mark is the snapshot's xmin: transactions that still run keep
+#    readers just below their version until they finish. BASE (migration 10)
+#    keeps these versions above the ones the counter handed out before.
+SCOPE = "sync"
+VERSION = "version"
+HORIZON = "horizon"     # highest tombstone version purged so far
+BASE = "base"           # PostgreSQL: offset added to transaction ids
+
+SYNC_PAGE_SIZE = int(os.environ.get("SYNC_PAGE_SIZE", "500"))
+SYNC_TOMBSTONE_DAYS = int(os.environ.get("SYNC_TOMBSTONE_DAYS", "30"))
+
+# Columns the mirrors hold; changes to anything else (password hash) are not synced
+USER_FIELDS = ("username", "name", "email", "role", "specialization", "department_id")
+APPOINTMENT_FIELDS = (
+    "doctor_id", "patient_id", "date", "time", "status", "diagnosis", "prescription",
+)
+
+# Snapshot streams, in the order a full sync sends them
+STREAMS = (("users", User), ("appointments", Appointment))
+
+
+# FUNCTION: Stored value of a sync counter
+def _counter(conn, ref):
+    value = conn.execute(
+        select(StatCounter.value).where(
+            StatCounter.clinic_id == GLOBAL_CLINIC_ID, StatCounter.scope == SCOPE,
+            StatCounter.ref == ref, StatCounter.status == "",
+        )
+    ).scalar()
+    return value or 0
+
+
+# FUNCTION: PostgreSQL: a transaction id expression as a version
+def _xact(conn, expression):
+    base = select(StatCounter.value).where(
+        StatCounter.clinic_id == GLOBAL_CLINIC_ID, StatCounter.scope == SCOPE,
+        StatCounter.ref == BASE, StatCounter.status == "",
+    ).scalar_subquery()
+    return conn.execute(select(literal_column(expression) + func.coalesce(base, 0))).scalar()
+
+
+# FUNCTION: Highest version with no change still in flight at or below it
+# (SQLite, inside a writing transaction: its own)
+def current_version(conn):
+    if conn.dialect.name == "postgresql":
+        return _xact(conn, "pg_snapshot_xmin(pg_current_snapshot())::text::bigint - 1")
+    return _counter(conn, VERSION)
+
+
+# FUNCTION: The version this writing transaction stamps (same for all its flushes)
+def transaction_version(conn):
+    if conn.dialect.name == "postgresql":
+        return _xact(conn, "pg_current_xact_id()::text::bigint")
+    return _counter(conn, VERSION)
+
+
+# FUNCTION: Take a version for a change (inside the writing transaction)
+def next_version(conn):
+    if conn.dialect.name != "postgresql":
+        counters.apply(conn, {(GLOBAL_CLINIC_ID, SCOPE, VERSION, ""): 1})
+    return transaction_version(conn)
+
+
+# FUNCTION: Value of an attribute before the pending change
+def _old(obj, attr):
+    history = inspect(obj).attrs[attr].history
+    return history.deleted[0] if history.deleted else getattr(obj, attr)
+
+
+# FUNCTION: Did a pending change touch one of the mirrored columns?
+def _changed(obj, fields):
+    attrs = inspect(obj).attrs
+    return any(attrs[f].history.has_changes() for f in fields)
+
+
+# FUNCTION: Tombstone row for a user or appointment leaving some mirrors
+def _tombstone(obj, kind, version, now, reason="deleted", doctor_id=None, patient_id=None):
+    return {
+        "clinic_id": clinic_of(obj), "kind": kind, "ref_id": obj.id, "reason": reason,
+        "doctor_id": doctor_id, "patient_id": patient_id, "version": version, "created_at": now,
+    }
+
+
+# EVENT: Stamp changed rows and record deletes in the same transaction
+@event.listens_for(db.session, "before_flush")
+def _track_sync(session, flush_context, instances):
+    touched, gone, moved = [], [], []
+    for obj in session.new:
+        if isinstance(obj, (User, Appointment)):
+            touched.append(obj)
+    for obj in session.dirty:
+        if isinstance(obj, User) and _changed(obj, USER_FIELDS):
+            touched.append(obj)
+        elif isinstance(obj, Appointment) and _changed(obj, APPOINTMENT_FIELDS):
+            touched.append(obj)
+            if _old(obj, "doctor_id") != obj.doctor_id:
+                moved.append(obj)
+    for obj in session.deleted:
+        if isinstance(obj, (User, Appointment)):
+            gone.append(obj)
+    if not (touched or gone):
+        return
+
+    conn = session.connection()
+    version, now = next_version(conn), datetime.utcnow()
+    for obj in touched:
+        obj.sync_version = version
+        obj.updated_at = now
+
+    rows = []
+    for obj in gone:
+        if isinstance(obj, User):
+            doctor_id = obj.id if _old(obj, "role") == ROLE_DOCTOR else None
+            rows.append(_tombstone(obj, "user", version, now, doctor_id=doctor_id))
+        else:
+            rows.append(_tombstone(
+                obj, "appointment", version, now,
+                doctor_id=_old(obj, "doctor_id"), patient_id=_old(obj, "patient_id"),
+            ))
+    for obj in moved:
+        rows.append(_tombstone(
+            obj, "appointment", version, now, reason="moved", doctor_id=_old(obj, "doctor_id")
+        ))
+    if rows:
+        conn.execute(SyncTombstone.__table__.insert(), rows)
+
+
+# PROCESS: Tombstones for appointments about to be bulk-deleted
+# Query.delete() skips flush events, so callers pass the same query here first.
+def record_removed(query):
+    conn = db.session.connection()
+    version = next_version(conn)
+    table = SyncTombstone.__table__
+    conn.execute(table.insert().from_select(
+        ["clinic_id", "kind", "ref_id", "reason", "doctor_id", "patient_id", "version", "created_at"],
+        query.with_entities(
+            Appointment.clinic_id, literal("appointment"), Appointment.id, literal("deleted"),
+            Appointment.doctor_id, Appointment.patient_id, literal(version),
+            literal(datetime.utcnow()),
+        ).order_by(None).statement,
+    ))
+
+
+# PROCESS: Stamp rows written with Core inserts (imports), which skip flush events
+def touch(conn, model, ids):
+    if not ids:
+        return
+    version = next_version(conn)
+    table = model.__table__
+    conn.execute(
+        table.update().where(table.c.id.in_(ids))
+        .values(sync_version=version, updated_at=datetime.utcnow())
+    )
+
+
+# PROCESS: Drop tombstones past SYNC_TOMBSTONE_DAYS
+# Clients whose token predates the newest dropped tombstone get a full resync.
+def purge(days=None):
+    days = SYNC_TOMBSTONE_DAYS if days is None else days
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    old = SyncTombstone.query.filter(SyncTombstone.created_at < cutoff)
+    newest = old.with_entities(func.max(SyncTombstone.version)).scalar()
+    if newest is None:
+        return 0
+    conn = db.session.connection()
+    horizon = _counter(conn, HORIZON)
+    if newest > horizon:
+        counters.apply(conn, {(GLOBAL_CLINIC_ID, SCOPE, HORIZON, ""): newest - horizon})
+    removed = old.delete(synchronize_session=False)
+    db.session.commit()
+    return removed
+
+
+# FUNCTION: Rows of `model` this user mirrors
+# Admins mirror everything. Doctors and patients mirror their own
+# appointments, the doctor directory and their own account.
+def _visible(user, model):
+    query = model.query
+    if user.role == ROLE_ADMIN:
+        return query
+    if model is User:
+        return query.filter(or_(User.role == ROLE_DOCTOR, User.id == user.id))
+    if user.role == ROLE_DOCTOR:
+        return query.filter(Appointment.doctor_id == user.id)
+    return query.filter(Appointment.patient_id == user.id)
+
+
+# FUNCTION: Tombstones this user should apply
+def _visible_tombstones(user):
+    query = SyncTombstone.query
+    if user.role == ROLE_ADMIN:
+        return query.filter(SyncTombstone.reason == "deleted")
+    owner = SyncTombstone.doctor_id if user.role == ROLE_DOCTOR else SyncTombstone.patient_id
+    return query.filter(or_(
+        (SyncTombstone.kind == "user") & SyncTombstone.doctor_id.isnot(None),
+        (SyncTombstone.kind == "appointment") & (owner == user.id),
+    ))
+
+
+# FUNCTION: Parse a sync token: (version, stream, last id) or None for a fresh client
+# A token is a delta position (stream None) or a full sync in progress, which
+# still has `stream` rows after `last id` to send before deltas from `version`.
+def parse_token(token):
+    if not token:
+        return None
+    version, stream, last_id = decode_cursor(token, 3)
+    if not isinstance(version, int) or stream not in (None, *dict(STREAMS)):
+        raise PaginationError("Invalid sync token")
+    if stream and not isinstance(last_id, int):
+        raise PaginationError("Invalid sync token")
+    return version, stream, last_id
+
+
+# PROCESS: One page of changes for this user
+# Returns {"reset", "users", "appointments", "removed", "token", "more"} with
+# ORM rows in users / appointments and removed ids per kind. Clients apply
+# `removed`, then upsert the rows, store `token` and call again while `more`.
+def changes(user, token, limit=None, options=()):
+    limit = limit or SYNC_PAGE_SIZE
+    conn = db.session.connection()
+    # read before the rows: anything committed later is re-sent next time, never lost
+    current = current_version(conn)
+    position = parse_token(token)
+    if position and position[1] is None and not (
+        _counter(conn, HORIZON) <= position[0] <= current
+    ):
+        position = None     # tombstones it needs were purged (or a foreign token)
+
+    page = {"reset": position is None, "users": [], "appointments": [],
+            "removed": {"users": [], "appointments": []}, "more": False}
+    if position is None:
+        position = (current, STREAMS[0][0], 0)
+
+    version, stream, last_id = position
+    if stream is not None:
+        return _snapshot_page(user, page, version, stream, last_id, limit, options)
+    return _delta_page(user, page, version, current, limit, options)
+
+
+# PROCESS: Full sync: every visible row by id, one stream after the other
+def _snapshot_page(user, page, version, stream, last_id, limit, options):
+    names = [name for name, _ in STREAMS]
+    model = dict(STREAMS)[stream]
+    query = _visible(user, model).filter(model.id > last_id).order_by(model.id)
+    if model is Appointment:
+        query = query.options(*options)
+    rows = query.limit(limit + 1).all()
+    page[stream] = rows[:limit]
+
+    if len(rows) > limit:
+        page["token"] = encode_cursor([version, stream, rows[limit - 1].id])
+        page["more"] = True
+    elif stream != names[-1]:
+        page["token"] = encode_cursor([version, names[names.index(stream) + 1], 0])
+        page["more"] = True
+    else:
+        page["token"] = encode_cursor([version, None, None])
+    return page
+
+
+# PROCESS: Delta: rows and tombstones with since < version <= upto
+# upto is the `limit`-th smallest changed version, so one version (one
+# transaction) is never split across pages.
+def _delta_page(user, page, since, current, limit, options):
+    sources = [
+        (_visible(user, User), User.sync_version),
+        (_visible(user, Appointment), Appointment.sync_version),
+        (_visible_tombstones(user), SyncTombstone.version),
+    ]
+    # rows above `current` may have committed ahead of an older version: next time
+    pending = sorted(
+        v for query, column in sources
+        for (v,) in query.filter(column > since, column <= current).with_entities(column)
+        .order_by(column).limit(limit + 1)
+    )
+    upto = pending[limit - 1] if len(pending) > limit else current
+    page["more"] = len(pending) > limit
+
+    def window(query, column):
+        return query.filter(column > since, column <= upto)
+
+    users = window(_visible(user, User), User.sync_version).order_by(User.id).all()
+    appointments = (
+        window(_visible(user, Appointment), Appointment.sync_version)
+        .options(*options).order_by(Appointment.id).all()
+    )
+    tombstones = window(_visible_tombstones(user), SyncTombstone.version).all()
+
+    # the latest event per row wins, so clients may apply the lists in any order
+    latest = {}
+    for t in tombstones:
+        key = ("users" if t.kind == "user" else "appointments", t.ref_id)
+        latest[key] = max(latest.get(key, 0), t.version)
+    page["users"] = [u for u in users if u.sync_version >= latest.get(("users", u.id), 0)]
+    page["appointments"] = [
+        a for a in appointments if a.sync_version >= latest.get(("appointments", a.id), 0)
+    ]
+    kept = {("users", u.id) for u in page["users"]} | {
+        ("appointments", a.id) for a in page["appointments"]
+    }
+    for kind, ref_id in sorted(latest):
+        if (kind, ref_id) not in kept:
+            page["removed"][kind].append(ref_id)
+    page["token"] = encode_cursor([upto, None, None])
+    return page
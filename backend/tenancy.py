@@ -0,0 +1,91 @@
+# SETUP: Imports
+from contextlib import contextmanager
+from flask import current_app, g
+from sqlalchemy import event
+from sqlalchemy.orm import with_loader_criteria
+from dba import db, Clinic, TenantScoped, current_clinic_id
+from routing import SHARD_PREFIX
+
+# SETUP: Clinic isolation
+# A request's clinic comes from the token's clinic_id claim (authutils) and
+# sits in g.clinic_id; background work sets it per job / partition. While it
+# is set, every ORM SELECT, UPDATE and DELETE touching a TenantScoped model is
+# limited to that clinic, joins and relationship loads included. Core
+# statements on a raw connection are not rewritten: they pass clinic ids
+# themselves. Queries that must see every clinic (globally unique usernames)
+# opt out with .execution_options(all_clinics=True).
+ALL_CLINICS = "all_clinics"
+
+
+# EVENT: Add the clinic filter to ORM statements
+@event.listens_for(db.session, "do_orm_execute")
+def _scope_to_clinic(state):
+    clinic_id = current_clinic_id()
+    if (
+        clinic_id is None
+        or state.is_column_load
+        or state.is_relationship_load
+        or state.execution_options.get(ALL_CLINICS)
+        or not (state.is_select or state.is_update or state.is_delete)
+    ):
+        return
+    state.statement = state.statement.options(
+        with_loader_criteria(
+            TenantScoped, lambda cls: cls.clinic_id == clinic_id, include_aliases=True
+        )
+    )
+
+
+# FUNCTION: Clinic by id or slug (None if unknown)
+def find_clinic(ref):
+    if ref is None or str(ref).strip() == "":
+        return None
+    ref = str(ref).strip()
+    if ref.isdigit():
+        return db.session.get(Clinic, int(ref))
+    return Clinic.query.filter_by(slug=ref.lower()).first()
+
+
+# FUNCTION: Run with g.clinic_id = clinic_id (None → no clinic filter)
+# The session is closed on the way in and out, since a clinic with its own
+# database needs a fresh connection.
+@contextmanager
+def using(clinic_id):
+    previous = g.get("clinic_id")
+    db.session.remove()
+    g.clinic_id = clinic_id
+    try:
+        yield
+    finally:
+        db.session.remove()
+        g.clinic_id = previous
+
+
+# FUNCTION: Clinics that have their own database (CLINIC_DATABASE_URLS)
+def sharded_clinics():
+    engines = current_app.extensions["sqlalchemy"].engines
+    return sorted(
+        int(key[len(SHARD_PREFIX):])
+        for key in engines if key and key.startswith(SHARD_PREFIX)
+    )
+
+
+# FUNCTION: Partitions background loops walk: None (the primary, every
+# clinic in it) followed by each sharded clinic
+def partitions():
+    return [None] + sharded_clinics()
+
+
+# PROCESS: Create a clinic row (also in the clinic's own database, if it has one)
+def create_clinic(slug, name, clinic_id=None):
+    with using(None):
+        clinic = Clinic(id=clinic_id, slug=slug.lower(), name=name)
+        db.session.add(clinic)
+        db.session.commit()
+        values = {"id": clinic.id, "slug": clinic.slug, "name": clinic.name,
+                  "created_at": clinic.created_at}
+    if values["id"] in sharded_clinics():
+        with using(values["id"]):
+            db.session.execute(Clinic.__table__.insert().values(**values))
+            db.session.commit()
+    return values
@@ -0,0 +1,79 @@
+# SETUP: Archived appointments stay readable through history and exports
+import json
+from datetime import date, timedelta
+
+import pytest
+
+from dba import db, Appointment
+
+DAY = date.today() + timedelta(days=30)
+LONG_AGO = date.today() - timedelta(days=400)
+
+
+@pytest.fixture
+def archived(app, api):
+    doctor_id = api.add_doctor("doctor")
+    alice = api.add_patient("alice")
+    house = api.login("doctor")
+    # booked first, so the archived visits hold the highest ids
+    upcoming = api.book(alice, doctor_id, DAY, "11:00").get_json()["id"]
+    old = []
+    for i, when in enumerate(("09:00", "10:00")):
+        appt = api.book(alice, doctor_id, DAY, when).get_json()["id"]
+        resp = api.client.put(f"/api/doctor/appointments/{appt}", json={
+            "diagnosis": f"Visit {i}", "prescription": "Rest", "notes": f"notes {i}",
+        }, headers=house)
+        assert resp.status_code == 200
+        old.append(appt)
+    # the visits happened long ago
+    with app.app_context():
+        Appointment.query.filter(Appointment.id.in_(old)).update(
+            {"date": LONG_AGO}, synchronize_session=False
+        )
+        db.session.commit()
+
+    resp = api.client.post("/api/admin/tasks/archive", json={"days": 365}, headers=api.admin)
+    assert resp.status_code == 202
+    job = api.wait_for_job(resp.get_json()["id"])
+    assert job["result"]["archived"] == 2
+    patient_id = api.client.get("/api/me", headers=alice).get_json()["id"]
+    return patient_id, old, upcoming, alice, house
+
+
+def history(api, patient_id, headers, query=""):
+    resp = api.client.get(f"/api/patients/{patient_id}/history?{query}", headers=headers)
+    assert resp.status_code == 200, resp.get_json()
+    return resp
+
+
+def test_history_reads_hot_and_archived_visits(api, archived):
+    patient_id, old, upcoming, alice, house = archived
+    hot = [a["id"] for a in api.client.get("/api/admin/appointments", headers=api.admin).get_json()]
+    assert hot == [upcoming]
+
+    for headers in (alice, house, api.admin):
+        visits = history(api, patient_id, headers).get_json()["visits"]
+        assert [v["id"] for v in visits] == [upcoming, old[1], old[0]]
+        assert [t["notes"] for t in visits[1]["treatments"]] == ["notes 1"]
+
+    # newest first, one visit per page, across the hot / archived boundary
+    ids, cursor = [], None
+    while True:
+        resp = history(api, patient_id, alice, "limit=1" + (f"&cursor={cursor}" if cursor else ""))
+        ids += [v["id"] for v in resp.get_json()["visits"]]
+        cursor = resp.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert ids == [upcoming, old[1], old[0]]
+
+
+def test_archived_rows_reach_exports_and_keep_their_ids(api, archived):
+    patient_id, old, upcoming, alice, _ = archived
+    resp = api.client.get("/api/admin/export/appointments?format=ndjson", headers=api.admin)
+    exported = [json.loads(line)["id"] for line in resp.get_data(as_text=True).splitlines()]
+    assert sorted(exported) == sorted(old + [upcoming])
+
+    # archived ids are never handed out again, even the highest ones
+    doctor_id = history(api, patient_id, alice).get_json()["visits"][0]["doctor_id"]
+    newest = api.book(alice, doctor_id, DAY, "12:00").get_json()["id"]
+    assert newest > max(old + [upcoming])
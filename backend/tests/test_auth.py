@@ -0,0 +1,52 @@
+# SETUP: Tokens of removed accounts
+import time
+
+import pytest
+
+from dba import db, User
+import authutils
+
+
+# FUNCTION: Delete a user row the way another worker would (no local cache invalidation)
+def delete_elsewhere(app, username):
+    with app.app_context():
+        db.session.execute(User.__table__.delete().where(User.username == username))
+        db.session.commit()
+
+
+@pytest.fixture
+def short_cache(monkeypatch):
+    monkeypatch.setattr(authutils.profile_cache, "ttl", 0.05)
+
+
+def test_deleting_a_doctor_rejects_their_token_at_once(api):
+    doctor_id = api.add_doctor("doctor")
+    doctor = api.login("doctor")
+    assert api.client.get("/api/doctor/appointments", headers=doctor).status_code == 200
+
+    assert api.client.delete(f"/api/admin/doctors/{doctor_id}", headers=api.admin).status_code == 200
+    assert api.client.get("/api/doctor/appointments", headers=doctor).status_code == 401
+
+
+def test_account_deleted_by_another_worker_is_rejected_after_the_cache_ttl(app, api, short_cache):
+    api.add_doctor("doctor")
+    doctor = api.login("doctor")
+    assert api.client.get("/api/doctor/appointments", headers=doctor).status_code == 200
+
+    delete_elsewhere(app, "doctor")
+    time.sleep(0.1)
+    assert api.client.get("/api/doctor/appointments", headers=doctor).status_code == 401
+
+
+def test_token_does_not_pass_to_a_new_account_with_the_same_id(app, api, short_cache):
+    alice = api.add_patient("alice")
+    alice_id = api.client.get("/api/me", headers=alice).get_json()["id"]
+    delete_elsewhere(app, "alice")
+    bob = api.add_patient("bob")
+    time.sleep(0.1)
+
+    assert api.client.get("/api/me", headers=alice).status_code == 401
+    me = api.client.get("/api/me", headers=bob).get_json()
+    assert me["username"] == "bob"
+    if app.config["SQLALCHEMY_DATABASE_URI"].startswith("sqlite"):
+        assert me["id"] == alice_id     # SQLite handed the id out again
@@ -0,0 +1,83 @@
+# SETUP: Booking and uniqueness paths (run on every backend in conftest.BACKENDS)
+from datetime import date, time, timedelta
+
+import pytest
+from flask import g
+from sqlalchemy.exc import IntegrityError
+
+from dba import db, Appointment, DEFAULT_CLINIC_ID
+
+DAY = date.today() + timedelta(days=30)
+
+
+@pytest.fixture
+def clinic(api):
+    doctor_id = api.add_doctor("doctor")
+    return doctor_id, api.add_patient("alice"), api.add_patient("bob")
+
+
+def test_double_booking_is_rejected(api, clinic):
+    doctor_id, alice, bob = clinic
+    assert api.book(alice, doctor_id, DAY).status_code == 201
+
+    resp = api.book(bob, doctor_id, DAY)
+    assert resp.status_code == 400
+    assert resp.get_json() == {"error": "This time slot is already booked"}
+
+    # the other slots of the day stay bookable
+    assert api.book(bob, doctor_id, DAY, "10:30").status_code == 201
+
+
+def test_hold_blocks_other_patients(api, clinic):
+    doctor_id, alice, bob = clinic
+    resp = api.client.post("/api/patient/slot-holds", json={
+        "doctor_id": doctor_id, "date": DAY.isoformat(), "time": "10:00",
+    }, headers=alice)
+    assert resp.status_code == 201
+
+    assert api.book(bob, doctor_id, DAY).status_code == 400
+    assert api.book(alice, doctor_id, DAY).status_code == 201
+
+
+def test_reschedule_onto_a_booked_slot_is_rejected(api, clinic):
+    doctor_id, alice, bob = clinic
+    assert api.book(alice, doctor_id, DAY).status_code == 201
+    mine = api.book(bob, doctor_id, DAY, "11:00").get_json()["id"]
+
+    resp = api.client.put(f"/api/patient/appointments/{mine}", json={"time": "10:00"}, headers=bob)
+    assert resp.status_code == 400
+
+    resp = api.client.put(f"/api/patient/appointments/{mine}", json={"time": "11:30"}, headers=bob)
+    assert resp.status_code == 200
+    assert resp.get_json()["time"] == "11:30"
+
+
+def test_slot_constraint_is_enforced_by_the_database(app, api, clinic):
+    doctor_id = clinic[0]
+    patient_id = api.client.get("/api/me", headers=clinic[1]).get_json()["id"]
+    with app.test_request_context():
+        g.clinic_id = DEFAULT_CLINIC_ID
+        for _ in range(2):
+            db.session.add(Appointment(
+                doctor_id=doctor_id, patient_id=patient_id,
+                date=DAY, time=time(9, 0), status="Booked",
+            ))
+        with pytest.raises(IntegrityError):
+            db.session.commit()
+        db.session.rollback()
+
+
+def test_usernames_and_emails_are_unique(api):
+    assert api.register("alice").status_code in (200, 201)
+    assert api.register("alice").status_code == 400
+
+    resp = api.client.post("/api/admin/doctors", json={
+        "username": "dralice", "name": "Alice", "email": "alice@example.com", "password": "x",
+    }, headers=api.admin)
+    assert resp.status_code == 400
+    assert resp.get_json() == {"error": "Username or email already exists"}
+
+    resp = api.client.post("/api/admin/doctors", json={
+        "username": "alice", "name": "Alice", "email": "dr.alice@example.com", "password": "x",
+    }, headers=api.admin)
+    assert resp.status_code == 400
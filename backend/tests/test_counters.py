@@ -0,0 +1,41 @@
+# SETUP: Sharded dashboard counters (run on every backend in conftest.BACKENDS)
+from datetime import date, timedelta
+from itertools import count
+
+from dba import db, StatCounter
+import counters
+
+DAY = date.today() + timedelta(days=30)
+
+
+def test_summary_sums_counter_shards(app, api, monkeypatch):
+    shards = count()
+    monkeypatch.setattr(counters, "_shard", lambda conn: next(shards) % 4)
+    doctor_id = api.add_doctor("doctor")
+    alice = api.add_patient("alice")
+    ids = [
+        api.book(alice, doctor_id, DAY, f"{hour}:00").get_json()["id"]
+        for hour in (9, 10, 11, 12, 13)
+    ]
+    resp = api.client.put(f"/api/patient/appointments/{ids[0]}", json={"status": "Cancelled"},
+                          headers=alice)
+    assert resp.status_code == 200
+
+    with app.app_context():
+        used = {s for (s,) in db.session.query(StatCounter.shard).filter_by(scope="status")}
+    assert len(used) > 1
+
+    summary = api.client.get("/api/admin/summary?breakdown=doctor,day", headers=api.admin).get_json()
+    assert (summary["total_appointments"], summary["booked"], summary["cancelled"]) == (5, 4, 1)
+    assert (summary["total_doctors"], summary["total_patients"]) == (1, 1)
+    assert summary["by_doctor"][0]["counts"] == {"Booked": 4, "Cancelled": 1}
+    assert summary["by_day"] == [
+        {"date": DAY.isoformat(), "counts": {"Booked": 4, "Cancelled": 1}, "total": 5}
+    ]
+
+    # a rebuild folds the shards back into one row per key with the same totals
+    with app.app_context(), db.engine.begin() as conn:
+        counters.rebuild(conn)
+    assert api.client.get(
+        "/api/admin/summary?breakdown=doctor,day", headers=api.admin
+    ).get_json() == summary
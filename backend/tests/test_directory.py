@@ -0,0 +1,64 @@
+# SETUP: Doctor directory ETags and 304s
+import pytest
+
+
+@pytest.fixture
+def alice(api):
+    return api.add_patient("alice")
+
+
+def directory(api, headers, etag=None, url="/api/doctors"):
+    if etag:
+        headers = {**headers, "If-None-Match": etag}
+    return api.client.get(url, headers=headers)
+
+
+def test_unchanged_directory_answers_304(api, alice):
+    api.add_doctor("doctor")
+    first = directory(api, alice)
+    assert first.status_code == 200 and first.headers["ETag"]
+    assert [d["username"] for d in first.get_json()] == ["doctor"]
+
+    again = directory(api, alice, first.headers["ETag"])
+    assert again.status_code == 304
+    assert again.get_data() == b""
+    assert again.headers["ETag"] == first.headers["ETag"]
+
+    # writes that do not touch doctors keep the version
+    api.add_patient("bob")
+    assert directory(api, alice, first.headers["ETag"]).status_code == 304
+    assert directory(api, api.admin, first.headers["ETag"], "/api/admin/doctors").status_code == 304
+
+
+def test_doctor_writes_change_the_etag(api, alice):
+    doctor_id = api.add_doctor("doctor")
+    etag = directory(api, alice).headers["ETag"]
+
+    def changed(name):
+        nonlocal etag
+        resp = directory(api, alice, etag)
+        assert resp.status_code == 200, name
+        etag = resp.headers["ETag"]
+        return [d["name"] for d in resp.get_json()]
+
+    api.add_doctor("second")
+    assert changed("add") == ["Doctor", "Second"]
+
+    resp = api.client.put(f"/api/admin/doctors/{doctor_id}", json={"name": "Dr Renamed"}, headers=api.admin)
+    assert resp.status_code == 200
+    assert changed("update") == ["Dr Renamed", "Second"]
+
+    assert api.client.delete(f"/api/admin/doctors/{doctor_id}", headers=api.admin).status_code == 200
+    assert changed("remove") == ["Second"]
+
+
+def test_clinics_have_their_own_etags(api, alice):
+    api.add_doctor("doctor")
+    north = api.add_clinic("north")
+    api.add_doctor("north-doctor", admin=north)
+
+    ours = directory(api, alice)
+    theirs = directory(api, north, url="/api/admin/doctors")
+    assert ours.headers["ETag"] != theirs.headers["ETag"]
+    assert [d["username"] for d in theirs.get_json()] == ["north-doctor"]
+    assert directory(api, north, ours.headers["ETag"], "/api/admin/doctors").status_code == 200
@@ -0,0 +1,41 @@
+# SETUP: Streaming exports honour the list filters
+import json
+
+from dba import db, Department, User
+
+
+def export_ids(api, kind, query=""):
+    resp = api.client.get(f"/api/admin/export/{kind}?format=ndjson{query}", headers=api.admin)
+    assert resp.status_code == 200, resp.get_data(as_text=True)
+    return [json.loads(line)["id"] for line in resp.get_data(as_text=True).splitlines()]
+
+
+def list_ids(api, query=""):
+    resp = api.client.get(f"/api/admin/patients?limit=100{query}", headers=api.admin)
+    assert resp.status_code == 200, resp.get_json()
+    return [p["id"] for p in resp.get_json()]
+
+
+def test_patient_export_applies_the_patient_list_filters(app, api):
+    for name in ("alice", "bob", "carol"):
+        api.add_patient(name)
+    with app.app_context():
+        ward = Department(name="Ward", description="")
+        db.session.add(ward)
+        db.session.flush()
+        ward_id = ward.id
+        User.query.filter_by(username="bob").update({"department_id": ward_id})
+        User.query.filter_by(username="carol").update({"specialization": "Paediatric"})
+        bob, carol = (User.query.filter_by(username=n).one().id for n in ("bob", "carol"))
+        db.session.commit()
+
+    assert len(export_ids(api, "patients")) == 3
+    for query, expected in (
+        (f"&department_id={ward_id}", [bob]),
+        ("&specialization=Paediatric", [carol]),
+        (f"&department_id={ward_id}&specialization=Paediatric", []),
+    ):
+        assert export_ids(api, "patients", query) == list_ids(api, query) == expected
+
+    resp = api.client.get("/api/admin/export/patients?department_id=ward", headers=api.admin)
+    assert resp.status_code == 400
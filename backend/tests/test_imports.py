@@ -0,0 +1,79 @@
+# SETUP: Bulk import reports rejected rows without aborting the batch
+import json
+from datetime import date, timedelta
+
+import pytest
+
+import imports
+
+DAY = date.today() + timedelta(days=30)
+
+
+@pytest.fixture(autouse=True)
+def cheap_hashes(monkeypatch):
+    monkeypatch.setattr(imports, "IMPORT_BCRYPT_ROUNDS", 4)
+
+
+def run_import(api, kind, body, fmt="csv"):
+    resp = api.client.post(
+        f"/api/admin/import/{kind}?format={fmt}", data=body.encode(), headers=api.admin
+    )
+    assert resp.status_code == 202, resp.get_json()
+    job = api.wait_for_job(resp.get_json()["id"])
+    assert job["status"] == "done", job
+    return job["result"]
+
+
+def test_patient_rows_fail_one_by_one(api):
+    api.add_patient("alice")
+    result = run_import(api, "patients", "\n".join([
+        "username,name,email,password",
+        "bob,Bob,bob@example.com,secret",
+        "alice,Alice Again,alice2@example.com,secret",     # taken username
+        "carol,Carol,bob@example.com,secret",              # email used two lines up
+        "dave,Dave,,secret",                               # missing email
+        "erin,Erin,erin@example.com,secret",
+    ]))
+    assert (result["rows"], result["imported"], result["failed"]) == (5, 2, 3)
+    assert [e["row"] for e in result["errors"]] == [3, 4, 5]
+    assert "already exists" in result["errors"][0]["error"]
+    assert result["errors"][2]["error"] == "Missing email"
+
+    # imported passwords work, and the rows show up in the lists
+    api.login("erin")
+    names = [p["username"] for p in api.client.get("/api/admin/patients", headers=api.admin).get_json()]
+    assert names == ["alice", "bob", "erin"]
+
+
+def test_appointment_rows_are_checked_against_the_schedule(api):
+    doctor_id = api.add_doctor("doctor")
+    alice = api.add_patient("alice")
+    assert api.book(alice, doctor_id, DAY).status_code == 201
+    rows = [
+        {"doctor": "doctor", "patient": "alice", "date": DAY.isoformat(), "time": "11:00", "notes": "ok"},
+        {"doctor": "doctor", "patient": "alice", "date": DAY.isoformat(), "time": "10:00"},   # booked
+        {"doctor": "nobody", "patient": "alice", "date": DAY.isoformat(), "time": "12:00"},
+        {"doctor_id": doctor_id, "patient": "alice", "date": "tomorrow", "time": "12:00"},
+        {"doctor": "doctor", "patient": "alice", "date": DAY.isoformat(), "time": "12:00", "status": "Lost"},
+    ]
+    body = "\n".join(json.dumps(r) for r in rows) + "\nnot json\n"
+    result = run_import(api, "appointments", body, fmt="ndjson")
+
+    assert (result["rows"], result["imported"], result["failed"]) == (6, 1, 5)
+    assert {e["row"]: e["error"] for e in result["errors"]} == {
+        2: "Doctor already has an appointment in this slot",
+        3: "Unknown doctor",
+        4: "Invalid date or time",
+        5: "Status must be one of Booked, Completed, Cancelled",
+        6: "Invalid JSON",
+    }
+    times = [a["time"] for a in api.client.get("/api/patient/appointments", headers=alice).get_json()]
+    assert times == ["10:00", "11:00"]
+
+
+def test_upload_without_required_columns_is_400(api):
+    resp = api.client.post(
+        "/api/admin/import/doctors?format=csv", data=b"username,name\nx,X\n", headers=api.admin
+    )
+    assert resp.status_code == 400
+    assert resp.get_json()["error"].startswith("Missing columns: email")
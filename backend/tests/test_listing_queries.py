@@ -0,0 +1,59 @@
+# SETUP: The appointment listings run a fixed number of queries per page
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LISTINGS = ("/api/admin/appointments", "/api/doctor/appointments", "/api/patient/appointments")
+
+
+# FUNCTION: Count the SQL statements run inside the block (any engine)
+@contextmanager
+def count_queries():
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(Engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(Engine, "before_cursor_execute", before_cursor_execute)
+
+
+# FUNCTION: Statements per listing endpoint, after a warm-up request
+def listing_queries(api, headers):
+    counts = {}
+    for url in LISTINGS:
+        api.client.get(url, headers=headers[url])
+        with count_queries() as statements:
+            resp = api.client.get(url, headers=headers[url])
+        assert resp.status_code == 200, resp.get_json()
+        counts[url] = (len(statements), len(resp.get_json()))
+    return counts
+
+
+def test_listing_query_count_does_not_grow_with_rows(api):
+    day = date.today() + timedelta(days=30)
+    doctors = [api.add_doctor(f"doctor{i}") for i in range(3)]
+    patients = [api.add_patient(f"patient{i}") for i in range(4)]
+    headers = {
+        "/api/admin/appointments": api.admin,
+        "/api/doctor/appointments": api.login("doctor0"),
+        "/api/patient/appointments": patients[0],
+    }
+
+    assert api.book(patients[0], doctors[0], day).status_code == 201
+    one = listing_queries(api, headers)
+
+    # every row has a different doctor / patient pair the serializer must resolve
+    for n in range(1, 24):
+        resp = api.book(patients[n % 4], doctors[n % 3], day + timedelta(days=n))
+        assert resp.status_code == 201, resp.get_json()
+    many = listing_queries(api, headers)
+
+    for url in LISTINGS:
+        assert many[url][1] > one[url][1] == 1, url
+        assert many[url][0] == one[url][0], url
@@ -0,0 +1,36 @@
+# SETUP: Live event stream limits and the event process
+from app import create_app
+import live
+
+
+def test_streams_past_the_limit_get_503(api, monkeypatch):
+    monkeypatch.setattr(live, "LIVE_MAX_STREAMS", 1)
+    alice = api.add_patient("alice")
+
+    first = api.client.get("/api/events", headers=alice, buffered=False)
+    assert first.status_code == 200
+
+    resp = api.client.get("/api/events", headers=api.admin, buffered=False)
+    assert resp.status_code == 503
+    assert resp.headers["Retry-After"] == "3"
+
+    # closing a stream (even one never read) frees its slot
+    first.close()
+    again = api.client.get("/api/events", headers=api.admin, buffered=False)
+    assert again.status_code == 200
+    again.close()
+
+
+def test_event_process_serves_only_the_stream(api, app, monkeypatch):
+    alice = api.add_patient("alice")
+    monkeypatch.setattr(live, "LIVE_ONLY", True)
+    events = create_app({"SQLALCHEMY_DATABASE_URI": app.config["SQLALCHEMY_DATABASE_URI"], "TESTING": True})
+    client = events.test_client()
+
+    stream = client.get("/api/events", headers=alice, buffered=False)
+    assert stream.status_code == 200
+    stream.close()
+
+    assert client.get("/api/patient/appointments", headers=alice).status_code == 404
+    assert client.post("/api/login", json={"username": "alice", "password": "secret"}).status_code == 404
+    assert client.options("/api/login").status_code == 200
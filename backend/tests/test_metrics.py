@@ -0,0 +1,53 @@
+# SETUP: /metrics access and SQL accounting
+import itertools
+from types import SimpleNamespace
+
+import pytest
+from flask import g
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+from dba import db
+import metrics
+
+
+def test_metrics_need_an_admin_without_metrics_token(api, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_TOKEN", "")
+    assert api.client.get("/metrics").status_code == 401
+    assert api.client.get("/metrics", headers=api.add_patient("alice")).status_code == 401
+    assert api.client.get("/metrics", headers=api.admin).status_code == 200
+
+
+def test_metrics_token_is_required_when_set(api, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_TOKEN", "scrape-me")
+    assert api.client.get("/metrics", headers=api.admin).status_code == 401
+    resp = api.client.get("/metrics", headers={"Authorization": "Bearer scrape-me"})
+    assert resp.status_code == 200
+    assert "hms_http_requests_total" in resp.get_data(as_text=True)
+
+
+def test_a_failed_statement_does_not_skew_the_next_ones_timing(app, monkeypatch):
+    def failing_then_ok():
+        with pytest.raises(DBAPIError):
+            db.session.execute(text("SELECT * FROM no_such_table"))
+        db.session.rollback()
+        value = db.session.execute(text("SELECT 1")).scalar()
+        return {"queries": g.metrics["queries"], "db": g.metrics["db"], "value": value}
+
+    app.add_url_rule("/test/failing-query", view_func=failing_then_ok)
+    client = app.test_client()
+    client.get("/test/failing-query")  # first request also starts the background work
+    key = ("/test/failing-query",)
+    queries_before = metrics.QUERIES._values[key][1:]
+    time_before = metrics.QUERY_TIME._values[key]
+
+    # each perf_counter() call is one second later, so a statement timed from
+    # its own start takes exactly 1s; a stale start from the failed one takes longer
+    ticks = itertools.count()
+    monkeypatch.setattr(metrics, "time", SimpleNamespace(perf_counter=lambda: float(next(ticks))))
+    for _ in range(2):
+        assert client.get("/test/failing-query").get_json() == {"queries": 1, "db": 1.0, "value": 1}
+
+    # two more requests, one statement each
+    assert metrics.QUERIES._values[key][1:] == [queries_before[0] + 2, queries_before[1] + 2]
+    assert metrics.QUERY_TIME._values[key] == time_before + 2.0
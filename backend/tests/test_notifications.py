@@ -0,0 +1,128 @@
+# SETUP: Notification outbox: recording, coalescing, retries, reminders, clinics
+import json
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from dba import Notification, DEFAULT_CLINIC_ID
+import notifications
+import tenancy
+
+DAY = date.today() + timedelta(days=30)
+
+
+@pytest.fixture(autouse=True)
+def outbox_file(tmp_path, monkeypatch):
+    path = tmp_path / "notifications.jsonl"
+    monkeypatch.setattr(notifications, "NOTIFY_CHANNEL", "file")
+    monkeypatch.setattr(notifications, "NOTIFY_FILE", str(path))
+    return path
+
+
+# FUNCTION: (recipient, event) of every message the file channel wrote
+def delivered(path):
+    if not path.exists():
+        return []
+    return [(m["to"], m["event"]) for m in map(json.loads, path.read_text().splitlines())]
+
+
+def drain(app):
+    with app.app_context():
+        return notifications.dispatcher.drain(delay=0)
+
+
+def statuses(app):
+    with app.app_context(), tenancy.using(None):
+        return sorted(
+            (n.clinic_id, n.status) for n in Notification.query.order_by(Notification.id)
+        )
+
+
+def test_one_clinic_dispatch_leaves_other_clinics_alone(app, api):
+    north_admin = api.add_clinic("north")
+    home_doctor = api.add_doctor("doctor")
+    north_doctor = api.add_doctor("north-doctor", admin=north_admin)
+    assert api.book(api.add_patient("alice"), home_doctor, DAY).status_code == 201
+    assert api.book(api.add_patient("bob", "north"), north_doctor, DAY).status_code == 201
+    north_id = next(c for c, _ in statuses(app) if c != DEFAULT_CLINIC_ID)
+
+    with app.app_context(), tenancy.using(DEFAULT_CLINIC_ID):
+        assert notifications.dispatcher.drain(delay=0) == {"sent": 2}
+    assert statuses(app) == [
+        (DEFAULT_CLINIC_ID, "sent"), (DEFAULT_CLINIC_ID, "sent"),
+        (north_id, "pending"), (north_id, "pending"),
+    ]
+
+    with app.app_context(), tenancy.using(north_id):
+        assert notifications.dispatcher.drain(delay=0) == {"sent": 2}
+    assert {status for _, status in statuses(app)} == {"sent"}
+
+
+def test_reminders_task_leaves_other_clinics_alone(app, api):
+    north_admin = api.add_clinic("north")
+    north_doctor = api.add_doctor("north-doctor", admin=north_admin)
+    assert api.book(api.add_patient("bob", "north"), north_doctor, DAY).status_code == 201
+
+    resp = api.client.post("/api/admin/tasks/reminders", json={"hours": 24 * 60}, headers=api.admin)
+    assert resp.status_code == 202, resp.get_json()
+    job = api.wait_for_job(resp.get_json()["id"])
+    assert job["status"] == "done", job
+    assert {status for _, status in statuses(app)} == {"pending"}
+
+    resp = api.client.post("/api/admin/tasks/reminders", json={"hours": 24 * 60}, headers=north_admin)
+    job = api.wait_for_job(resp.get_json()["id"], north_admin)
+    assert job["result"]["reminders_queued"] == 1
+    # the booking message and its reminder coalesce into one
+    assert {status for _, status in statuses(app)} == {"coalesced", "sent"}
+
+
+def test_changes_are_recorded_with_the_write_and_coalesced(app, api, outbox_file):
+    doctor_id = api.add_doctor("doctor")
+    alice, bob = api.add_patient("alice"), api.add_patient("bob")
+    appt = api.book(alice, doctor_id, DAY).get_json()["id"]
+    assert api.book(bob, doctor_id, DAY).status_code == 400  # rolled back: no rows
+    assert len(statuses(app)) == 2  # patient and doctor hear about the booking
+
+    resp = api.client.put(f"/api/patient/appointments/{appt}", json={"time": "11:00"}, headers=alice)
+    assert resp.status_code == 200
+    assert drain(app) == {"coalesced": 2, "sent": 2}
+    # one message per person, for the latest change only
+    assert sorted(delivered(outbox_file)) == [
+        ("alice@example.com", "rescheduled"), ("doctor@example.com", "rescheduled"),
+    ]
+
+    # a booking cancelled before anything went out is never announced
+    other = api.book(bob, doctor_id, DAY).get_json()["id"]
+    resp = api.client.put(f"/api/patient/appointments/{other}", json={"status": "Cancelled"}, headers=bob)
+    assert resp.status_code == 200
+    assert drain(app) == {"coalesced": 2, "skipped": 2}
+    assert len(delivered(outbox_file)) == 2
+
+
+def test_failed_sends_retry_then_give_up(app, api, monkeypatch):
+    monkeypatch.setitem(notifications.CHANNELS, "broken", lambda app, messages: {m["id"]: "down" for m in messages})
+    monkeypatch.setattr(notifications, "NOTIFY_CHANNEL", "broken")
+    monkeypatch.setattr(notifications, "NOTIFY_MAX_ATTEMPTS", 2)
+    monkeypatch.setattr(notifications, "NOTIFY_INTERVAL", 0)  # no back-off between attempts
+    assert api.book(api.add_patient("alice"), api.add_doctor("doctor"), DAY).status_code == 201
+
+    assert drain(app) == {"retrying": 2, "failed": 2}
+    with app.app_context():
+        assert {(n.status, n.attempts, n.error) for n in Notification.query} == {("failed", 2, "down")}
+
+
+def test_reminders_cover_the_window_once(app, api):
+    doctor_id = api.add_doctor("doctor")
+    alice = api.add_patient("alice")
+    soon = api.book(alice, doctor_id, DAY).get_json()["id"]
+    api.book(alice, doctor_id, DAY + timedelta(days=2))
+    drain(app)
+
+    now = datetime.combine(DAY - timedelta(days=1), datetime.min.time()).replace(hour=12)
+    with app.app_context():
+        assert notifications.schedule_reminders(hours=24, now=now) == 1
+        assert notifications.schedule_reminders(hours=24, now=now) == 0
+        reminders = Notification.query.filter_by(event="reminder").all()
+        assert [(n.appointment_id, n.recipient_id) for n in reminders] == [
+            (soon, reminders[0].patient_id),
+        ]
@@ -0,0 +1,58 @@
+# SETUP: Keyset (cursor) paging of the list endpoints
+import base64
+import json
+from datetime import date, timedelta
+
+DAY = date.today() + timedelta(days=30)
+
+
+# FUNCTION: Follow X-Next-Cursor to the end; returns the pages' ids
+def all_pages(api, url, headers):
+    pages, cursor = [], None
+    while True:
+        sep = "&" if "?" in url else "?"
+        resp = api.client.get(url + (f"{sep}cursor={cursor}" if cursor else ""), headers=headers)
+        assert resp.status_code == 200, resp.get_json()
+        pages.append([row["id"] for row in resp.get_json()])
+        cursor = resp.headers.get("X-Next-Cursor")
+        if not cursor:
+            return pages
+
+
+def test_cursor_pages_cover_ties_once_in_order(api):
+    doctors = [api.add_doctor(f"doctor{i}") for i in range(3)]
+    patients = [api.add_patient(f"patient{i}") for i in range(3)]
+    # three appointments share (date, time): only the id tells them apart
+    for doctor_id, patient in zip(doctors, patients):
+        assert api.book(patient, doctor_id, DAY).status_code == 201
+    assert api.book(patients[0], doctors[0], DAY, "09:00").status_code == 201
+    assert api.book(patients[1], doctors[1], DAY + timedelta(days=1)).status_code == 201
+
+    everything = all_pages(api, "/api/admin/appointments?limit=100", api.admin)
+    assert len(everything) == 1 and len(everything[0]) == 5
+
+    pages = all_pages(api, "/api/admin/appointments?limit=2", api.admin)
+    assert [len(page) for page in pages] == [2, 2, 1]
+    assert sum(pages, []) == everything[0]
+
+    # filters apply on every page
+    pages = all_pages(api, f"/api/admin/appointments?limit=1&doctor_id={doctors[0]}", api.admin)
+    assert len(pages) == 2
+
+
+def test_patient_list_pages_by_id(api):
+    for i in range(5):
+        api.register(f"patient{i}")
+    pages = all_pages(api, "/api/admin/patients?limit=2", api.admin)
+    ids = sum(pages, [])
+    assert [len(page) for page in pages] == [2, 2, 1]
+    assert ids == sorted(ids) and len(set(ids)) == 5
+
+
+def test_bad_cursor_or_limit_is_400(api):
+    wrong_size = base64.urlsafe_b64encode(json.dumps([1]).encode()).decode().rstrip("=")
+    bad_date = base64.urlsafe_b64encode(json.dumps(["soon", "10:00:00", 1]).encode()).decode().rstrip("=")
+    for query in ("cursor=not-a-cursor!", f"cursor={wrong_size}", f"cursor={bad_date}", "limit=ten"):
+        resp = api.client.get(f"/api/admin/appointments?{query}", headers=api.admin)
+        assert resp.status_code == 400, query
+        assert "error" in resp.get_json()
@@ -0,0 +1,94 @@
+# SETUP: Moving a doctor's appointments to colleagues (preview, apply, removal)
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import insert
+
+from dba import db, Appointment, DEFAULT_CLINIC_ID
+import booking
+
+# a Monday a month out (the default template works Mon–Fri)
+MONDAY = date.today() + timedelta(days=35 - date.today().weekday())
+
+
+@pytest.fixture
+def team(api):
+    leaving = api.add_doctor("leaving")
+    colleague = api.add_doctor("colleague")
+    alice, bob = api.add_patient("alice"), api.add_patient("bob")
+    assert api.book(alice, leaving, MONDAY, "10:00").status_code == 201
+    assert api.book(bob, leaving, MONDAY, "11:00").status_code == 201
+    return leaving, colleague, alice, bob
+
+
+def doctors_of(api, patient):
+    return {(a["time"], a["doctor_id"]) for a in api.client.get("/api/patient/appointments", headers=patient).get_json()}
+
+
+def reassign(api, doctor_id, **body):
+    return api.client.post(f"/api/admin/doctors/{doctor_id}/reassign", json=body, headers=api.admin)
+
+
+def test_dry_run_previews_and_apply_moves(api, team):
+    leaving, colleague, alice, bob = team
+    carol = api.add_patient("carol")
+    assert api.book(carol, colleague, MONDAY, "10:00").status_code == 201
+
+    preview = reassign(api, leaving, dry_run=True).get_json()
+    assert preview["applied"] is False and preview["unplaced"] == []
+    targets = {m["from"]["time"]: (m["to"]["doctor_id"], m["to"]["date"], m["to"]["time"]) for m in preview["moves"]}
+    # 10:00 is taken at the colleague's, so alice gets the closest free slot that day
+    assert targets["11:00"] == (colleague, MONDAY.isoformat(), "11:00")
+    assert targets["10:00"][:2] == (colleague, MONDAY.isoformat())
+    assert targets["10:00"][2] in ("09:30", "10:30")
+    assert doctors_of(api, alice) == {("10:00", leaving)}  # nothing moved yet
+
+    applied = reassign(api, leaving).get_json()
+    assert applied["applied"] is True and applied["moves"] == preview["moves"]
+    assert doctors_of(api, alice) == {(targets["10:00"][2], colleague)}
+    assert doctors_of(api, bob) == {("11:00", colleague)}
+
+
+def test_removal_refuses_to_drop_unplaceable_appointments(api, team):
+    leaving, colleague, alice, _ = team
+    loner = api.add_doctor("loner", specialization="Rare")
+    assert api.book(alice, loner, MONDAY, "14:00").status_code == 201
+
+    resp = api.client.delete(f"/api/admin/doctors/{loner}?reassign=1", headers=api.admin)
+    assert resp.status_code == 409
+    assert [u["time"] for u in resp.get_json()["unplaced"]] == ["14:00"]
+    assert ("14:00", loner) in doctors_of(api, alice)
+
+    # dry run leaves the doctor in place; a colleague with room takes the appointments
+    resp = api.client.delete(f"/api/admin/doctors/{leaving}?reassign=1&dry_run=1", headers=api.admin)
+    assert resp.status_code == 200 and len(resp.get_json()["moves"]) == 2
+    resp = api.client.delete(f"/api/admin/doctors/{leaving}?reassign=1", headers=api.admin)
+    assert resp.status_code == 200, resp.get_json()
+    assert ("10:00", colleague) in doctors_of(api, alice)
+
+    # force drops what cannot be placed
+    resp = api.client.delete(f"/api/admin/doctors/{loner}?reassign=1&force=1", headers=api.admin)
+    assert resp.status_code == 200
+    assert doctors_of(api, alice) == {("10:00", colleague)}
+
+
+def test_apply_reports_409_when_a_slot_was_taken_meanwhile(app, api, team, monkeypatch):
+    leaving, _, alice, bob = team
+    carol_id = api.client.get("/api/me", headers=api.add_patient("carol")).get_json()["id"]
+    plan = booking.plan_reassignment
+
+    # another worker books the planned slot between planning and applying
+    def plan_then_race(*args, **kwargs):
+        moves, unplaced = plan(*args, **kwargs)
+        _, doctor_id, day, at = moves[0]
+        with db.engine.begin() as conn:
+            conn.execute(insert(Appointment).values(
+                clinic_id=DEFAULT_CLINIC_ID, doctor_id=doctor_id, patient_id=carol_id,
+                date=day, time=at, status="Booked",
+            ))
+        return moves, unplaced
+    monkeypatch.setattr(booking, "plan_reassignment", plan_then_race)
+
+    resp = reassign(api, leaving)
+    assert resp.status_code == 409
+    assert {d for _, d in doctors_of(api, alice) | doctors_of(api, bob)} == {leaving}
@@ -0,0 +1,53 @@
+# SETUP: Read-replica routing (SQLite replica file copied by sync-replicas)
+import pytest
+
+from app import create_app
+from dba import db
+import routing
+
+
+@pytest.fixture
+def app(app, database_url, tmp_path, monkeypatch):
+    if not database_url.startswith("sqlite"):
+        pytest.skip("sync-replicas copies SQLite files only")
+    # per-process routing state must not leak between tests
+    monkeypatch.setattr(routing, "_recent_writers", {})
+    monkeypatch.setattr(routing, "_down", {})
+    replicated = create_app({
+        "SQLALCHEMY_DATABASE_URI": database_url, "TESTING": True,
+        "SQLALCHEMY_BINDS": {"replica1": {"url": "sqlite:///" + str(tmp_path / "replica.db")}},
+    })
+    yield replicated
+    with replicated.app_context():
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+def sync_replicas(app):
+    result = app.test_cli_runner().invoke(args=["sync-replicas"])
+    assert result.exit_code == 0, result.output
+
+
+def patient_names(api):
+    resp = api.client.get("/api/admin/patients", headers=api.admin)
+    assert resp.status_code == 200, resp.get_json()
+    return sorted(p["username"] for p in resp.get_json())
+
+
+def test_listings_read_the_replica_until_the_reader_writes(app, api):
+    api.add_patient("alice")
+    sync_replicas(app)
+    api.add_patient("bob")  # on the primary only
+
+    assert patient_names(api) == ["alice"]
+
+    # the admin's own write pins their reads to the primary for a while
+    api.add_doctor("doctor")
+    assert patient_names(api) == ["alice", "bob"]
+
+
+def test_a_failing_replica_falls_back_to_the_primary(app, api):
+    api.add_patient("alice")  # the replica file was never synced: no tables
+    assert patient_names(api) == ["alice"]
+    assert routing._active(routing._down, "replica1")
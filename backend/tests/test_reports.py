@@ -0,0 +1,29 @@
+# SETUP: Background reports
+from datetime import date, timedelta
+
+DAY = date.today() + timedelta(days=30)
+
+
+def test_doctor_activity_counts_visits_not_treatment_revisions(api):
+    doctor_id = api.add_doctor("doctor")
+    alice = api.add_patient("alice")
+    treated = api.book(alice, doctor_id, DAY).get_json()["id"]
+    assert api.book(alice, doctor_id, DAY, "11:00").status_code == 201
+
+    doctor = api.login("doctor")
+    for diagnosis in ("flu", "cold", "allergy"):
+        resp = api.client.put(f"/api/doctor/appointments/{treated}", json={
+            "diagnosis": diagnosis, "prescription": "rest", "status": "Completed",
+        }, headers=doctor)
+        assert resp.status_code == 200, resp.get_json()
+
+    resp = api.client.post("/api/admin/tasks", json={
+        "kind": "doctor_activity", "params": {"month": DAY.strftime("%Y-%m")},
+    }, headers=api.admin)
+    assert resp.status_code == 202, resp.get_json()
+    job = api.wait_for_job(resp.get_json()["id"])
+    assert job["status"] == "done", job
+    [row] = job["result"]["doctors"]
+    assert {k: row[k] for k in ("total", "booked", "completed", "cancelled", "patients", "treatments")} == {
+        "total": 2, "booked": 1, "completed": 1, "cancelled": 0, "patients": 1, "treatments": 1,
+    }
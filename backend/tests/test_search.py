@@ -0,0 +1,71 @@
+# SETUP: Full-text search (prefix matching, role scoping, cursor paging)
+from datetime import date, timedelta
+
+import pytest
+
+DAY = date.today() + timedelta(days=30)
+
+
+@pytest.fixture
+def records(api):
+    first, second = api.add_doctor("house"), api.add_doctor("wilson")
+    alice, bob = api.add_patient("alice"), api.add_patient("bob")
+    for patient, doctor_id, username, notes in (
+        (alice, first, "house", "migraine with aura"),
+        (bob, second, "wilson", "chronic migraine"),
+    ):
+        appt = api.book(patient, doctor_id, DAY).get_json()["id"]
+        resp = api.client.put(f"/api/doctor/appointments/{appt}", json={
+            "diagnosis": "Migraine", "prescription": "Rest", "notes": notes,
+        }, headers=api.login(username))
+        assert resp.status_code == 200
+    return first, second
+
+
+def search(api, headers, q, **params):
+    query = "&".join(f"{k}={v}" for k, v in params.items())
+    resp = api.client.get(f"/api/search?q={q}&{query}", headers=headers)
+    assert resp.status_code == 200, resp.get_json()
+    return resp
+
+
+def hits(resp):
+    return [(h["kind"], h.get("patient_name") or h["name"]) for h in resp.get_json()]
+
+
+def test_prefix_search_over_people_and_notes(api, records):
+    found = hits(search(api, api.admin, "migr"))
+    assert sorted(found) == [
+        ("appointment", "Alice"), ("appointment", "Bob"),
+        ("treatment", "Alice"), ("treatment", "Bob"),
+    ]
+    assert hits(search(api, api.admin, "aura")) == [("treatment", "Alice")]
+    assert hits(search(api, api.admin, "wils")) == [("doctor", "Wilson")]
+
+
+def test_doctors_only_find_their_own_patients_and_records(api, records):
+    house = api.login("house")
+    assert sorted(hits(search(api, house, "migraine"))) == [("appointment", "Alice"), ("treatment", "Alice")]
+    assert hits(search(api, house, "alice")) == [("patient", "Alice")]
+    assert hits(search(api, house, "bob")) == []
+
+    # patients only search the doctor directory
+    alice = api.login("alice")
+    assert hits(search(api, alice, "alice")) == []
+    assert hits(search(api, alice, "house")) == [("doctor", "House")]
+
+
+def test_results_page_with_cursors(api, records):
+    everything = search(api, api.admin, "migraine").get_json()
+    pages, cursor = [], None
+    while True:
+        resp = search(api, api.admin, "migraine", limit=1, **({"cursor": cursor} if cursor else {}))
+        pages.append(resp.get_json())
+        cursor = resp.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert [len(p) for p in pages] == [1, 1, 1, 1]
+    assert sum(pages, []) == everything
+
+    bad = api.client.get("/api/search?q=migraine&kinds=secrets", headers=api.admin)
+    assert bad.status_code == 400
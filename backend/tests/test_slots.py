@@ -0,0 +1,79 @@
+# SETUP: Free-slot listing against bookings, holds, schedules and leave
+from datetime import date, timedelta
+
+import pytest
+
+# a Monday a month out (the default template works Mon–Fri)
+MONDAY = date.today() + timedelta(days=35 - date.today().weekday())
+
+
+@pytest.fixture
+def doctor(api):
+    return api.add_doctor("doctor")
+
+
+def free(api, doctor_id, headers, start=MONDAY, end=MONDAY):
+    resp = api.client.get(
+        f"/api/doctors/{doctor_id}/slots?from={start.isoformat()}&to={end.isoformat()}",
+        headers=headers,
+    )
+    assert resp.status_code == 200, resp.get_json()
+    return {day["date"]: day["slots"] for day in resp.get_json()["days"]}
+
+
+def test_default_template_skips_the_break_and_weekend(api, doctor):
+    alice = api.add_patient("alice")
+    days = free(api, doctor, alice, MONDAY, MONDAY + timedelta(days=6))
+    monday = days[MONDAY.isoformat()]
+    assert monday[0] == "09:00" and monday[-1] == "16:30"
+    assert "13:00" not in monday and "13:30" not in monday and len(monday) == 14
+    assert days[(MONDAY + timedelta(days=5)).isoformat()] == []
+
+
+def test_booked_and_held_slots_leave_the_listing(api, doctor):
+    alice, bob = api.add_patient("alice"), api.add_patient("bob")
+    assert "10:00" in free(api, doctor, bob)[MONDAY.isoformat()]  # now cached
+
+    assert api.book(alice, doctor, MONDAY).status_code == 201
+    resp = api.client.post("/api/patient/slot-holds", json={
+        "doctor_id": doctor, "date": MONDAY.isoformat(), "time": "11:00",
+    }, headers=alice)
+    assert resp.status_code == 201
+
+    monday = free(api, doctor, bob)[MONDAY.isoformat()]
+    assert "10:00" not in monday and "11:00" not in monday and "10:30" in monday
+    # the listing and the booking path agree
+    assert api.book(bob, doctor, MONDAY).status_code == 400
+    assert api.book(bob, doctor, MONDAY, "11:00").status_code == 400
+    assert api.book(bob, doctor, MONDAY, "10:30").status_code == 201
+    assert "10:30" not in free(api, doctor, bob)[MONDAY.isoformat()]
+
+
+def test_own_schedule_and_leave(api, doctor):
+    doctor_headers = api.login("doctor")
+    resp = api.client.put(f"/api/doctors/{doctor}/schedule", json={"days": [
+        {"weekday": 0, "start": "08:00", "end": "10:00", "slot_minutes": 60},
+    ]}, headers=doctor_headers)
+    assert resp.status_code == 200, resp.get_json()
+
+    days = free(api, doctor, doctor_headers, MONDAY, MONDAY + timedelta(days=1))
+    assert days == {MONDAY.isoformat(): ["08:00", "09:00"], (MONDAY + timedelta(days=1)).isoformat(): []}
+
+    resp = api.client.post(f"/api/doctors/{doctor}/leave", json={
+        "start_date": MONDAY.isoformat(),
+    }, headers=doctor_headers)
+    assert resp.status_code == 201
+    assert free(api, doctor, doctor_headers) == {MONDAY.isoformat(): []}
+
+
+def test_other_doctors_schedule_and_long_ranges_are_refused(api, doctor):
+    other = api.add_doctor("other")
+    resp = api.client.put(f"/api/doctors/{other}/schedule", json={"days": []}, headers=api.login("doctor"))
+    assert resp.status_code == 403
+
+    too_far = MONDAY + timedelta(days=70)
+    resp = api.client.get(
+        f"/api/doctors/{doctor}/slots?from={MONDAY.isoformat()}&to={too_far.isoformat()}",
+        headers=api.admin,
+    )
+    assert resp.status_code == 400
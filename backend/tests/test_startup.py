@@ -0,0 +1,40 @@
+# SETUP: App factory and the explicit init-db command
+from sqlalchemy import inspect
+
+from app import create_app
+from dba import db, User, ROLE_ADMIN
+import app as app_module
+import migrations
+
+
+def test_create_app_leaves_the_database_alone(database_url, monkeypatch):
+    def no_hashing(*args, **kwargs):
+        raise AssertionError("create_app() must not hash")
+    monkeypatch.setattr(app_module, "hash_password", no_hashing)
+
+    fresh = create_app({"SQLALCHEMY_DATABASE_URI": database_url, "TESTING": True})
+    with fresh.app_context():
+        assert inspect(db.engine).get_table_names() == []
+        db.engine.dispose()
+
+
+def test_init_db_is_idempotent(database_url):
+    fresh = create_app({"SQLALCHEMY_DATABASE_URI": database_url, "TESTING": True})
+    runner = fresh.test_cli_runner()
+
+    first = runner.invoke(args=["init-db", "--admin-password", "first"])
+    assert first.exit_code == 0, first.output
+    assert "Default admin created" in first.output
+    again = runner.invoke(args=["init-db", "--admin-password", "second"])
+    assert again.exit_code == 0, again.output
+    assert "Admin already exists" in again.output
+
+    with fresh.app_context():
+        assert User.query.filter_by(role=ROLE_ADMIN).count() == 1
+        with db.engine.connect() as conn:
+            assert migrations._get_version(conn) == migrations.LATEST_VERSION
+        db.session.remove()
+        db.engine.dispose()
+
+    resp = fresh.test_client().post("/api/login", json={"username": "admin", "password": "first"})
+    assert resp.status_code == 200
@@ -0,0 +1,86 @@
+# SETUP: /api/sync deltas (run on every backend in conftest.BACKENDS)
+from datetime import date, timedelta
+
+import pytest
+
+from sqlalchemy import delete, select
+
+from dba import db, StatCounter, GLOBAL_CLINIC_ID
+import counters
+import migrations
+import sync
+
+DAY = date.today() + timedelta(days=30)
+
+
+# FUNCTION: Follow /api/sync until `more` is false; returns (pages, final token)
+def sync_all(api, headers, token=None):
+    pages = []
+    while True:
+        url = "/api/sync" + (f"?since={token}" if token else "")
+        resp = api.client.get(url, headers=headers)
+        assert resp.status_code == 200, resp.get_json()
+        page = resp.get_json()
+        pages.append(page)
+        token = page["token"]
+        if not page["more"]:
+            return pages, token
+
+
+def appointment_ids(pages):
+    return sorted(a["id"] for page in pages for a in page["appointments"])
+
+
+def test_deltas_carry_new_and_removed_appointments(api):
+    doctor_id = api.add_doctor("doctor")
+    alice = api.add_patient("alice")
+    first = api.book(alice, doctor_id, DAY).get_json()["id"]
+    _, token = sync_all(api, alice)
+
+    second = api.book(alice, doctor_id, DAY, "10:30").get_json()["id"]
+    pages, token = sync_all(api, alice, token)
+    assert appointment_ids(pages) == [second]
+
+    resp = api.client.delete(f"/api/admin/doctors/{doctor_id}", headers=api.admin)
+    assert resp.status_code == 200, resp.get_json()
+    pages, _ = sync_all(api, alice, token)
+    removed = sorted(i for page in pages for i in page["removed"]["appointments"])
+    assert removed == sorted([first, second])
+
+
+def test_in_flight_transaction_holds_back_deltas(app, api, database_url):
+    if not database_url.startswith("postgresql"):
+        pytest.skip("SQLite runs one writer at a time")
+    doctor_id = api.add_doctor("doctor")
+    alice = api.add_patient("alice")
+    _, token = sync_all(api, alice)
+
+    with app.app_context(), db.engine.connect() as slow:
+        version = sync.next_version(slow)
+        booked = api.book(alice, doctor_id, DAY).get_json()["id"]
+        # committed, but behind a transaction that may still stamp a lower version
+        pages, held = sync_all(api, alice, token)
+        assert appointment_ids(pages) == []
+        with db.engine.connect() as reader:
+            assert sync.current_version(reader) == version - 1
+        slow.rollback()
+
+    pages, _ = sync_all(api, alice, held)
+    assert appointment_ids(pages) == [booked]
+
+
+def test_transaction_versions_start_above_the_old_counter(app, database_url):
+    if not database_url.startswith("postgresql"):
+        pytest.skip("SQLite keeps its version counter")
+    last = 10 ** 12
+    with app.app_context():
+        with db.engine.begin() as conn:
+            conn.execute(delete(StatCounter).where(StatCounter.scope == sync.SCOPE))
+            counters.apply(conn, {(GLOBAL_CLINIC_ID, sync.SCOPE, sync.VERSION, ""): last})
+            migrations._sync_transaction_versions(conn)
+        with db.engine.begin() as conn:
+            shards = conn.execute(select(StatCounter.shard).where(
+                StatCounter.scope == sync.SCOPE, StatCounter.ref == sync.BASE,
+            )).scalars().all()
+            assert shards == [0]
+            assert sync.transaction_version(conn) > last
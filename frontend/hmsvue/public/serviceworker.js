@@ -1,8 +1,17 @@
 // serviceworker.js
 
-const CACHE_NAME = "hms-cache-v1";
+const CACHE_NAME = "hms-cache-v2";
+const API_CACHE_NAME = "hms-api-v1";
 const URLS_TO_CACHE = ["/", "/index.html"];
 
+// Directory endpoints served stale-while-revalidate (the server sends ETags,
+// so the background refresh is usually a cheap 304)
+const SWR_PATHS = ["/api/doctors", "/api/admin/doctors", "/api/departments"];
+
+// Appointment lists answered from the IndexedDB sync mirror (src/mirror.js)
+// when the network is unreachable
+const MIRROR_PATHS = ["/api/doctor/appointments", "/api/patient/appointments"];
+
 // Install: cache basic shell
 self.addEventListener("install", (event) => {
   event.waitUntil(
@@ -18,15 +27,104 @@ self.addEventListener("activate", (event) => {
     caches.keys().then((keys) =>
       Promise.all(
         keys
-          .filter((key) => key !== CACHE_NAME)
+          .filter((key) => key !== CACHE_NAME && key !== API_CACHE_NAME)
           .map((key) => caches.delete(key))
       )
     )
   );
 });
 
-// Fetch: network-first, fallback to cache
+// Stale-while-revalidate: answer from cache at once, refresh it in the background
+function staleWhileRevalidate(event) {
+  return caches.open(API_CACHE_NAME).then((cache) =>
+    cache.match(event.request).then((cached) => {
+      const refresh = fetch(event.request).then((response) => {
+        if (response.ok) {
+          cache.put(event.request, response.clone());
+        } else if (response.status === 401 || response.status === 403) {
+          // never keep serving a directory to a user who may not see it
+          cache.delete(event.request);
+        }
+        return response;
+      });
+
+      if (cached) {
+        event.waitUntil(refresh.catch(() => {}));
+        return cached;
+      }
+      return refresh;
+    })
+  );
+}
+
+// Drop cached directories after this client changes a doctor, so the
+// admin's next load is fresh instead of one revision behind
+function writeThrough(event) {
+  return fetch(event.request).then((response) => {
+    if (response.ok) {
+      event.waitUntil(caches.delete(API_CACHE_NAME));
+    }
+    return response;
+  });
+}
+
+// Offline: mirrored appointments in listing order (empty list if never synced)
+function mirrorResponse() {
+  return new Promise((resolve) => {
+    const open = indexedDB.open("hms-mirror");
+    // never synced: do not create the database here (mirror.js owns its schema)
+    open.onupgradeneeded = () => open.transaction.abort();
+    open.onerror = () => resolve([]);
+    open.onsuccess = () => {
+      const db = open.result;
+      const get = db.transaction("appointments").objectStore("appointments").getAll();
+      get.onsuccess = () => {
+        db.close();
+        resolve(get.result);
+      };
+      get.onerror = () => {
+        db.close();
+        resolve([]);
+      };
+    };
+  }).then((rows) => {
+    rows.sort(
+      (a, b) =>
+        a.date.localeCompare(b.date) || a.time.localeCompare(b.time) || a.id - b.id
+    );
+    return new Response(JSON.stringify(rows), {
+      headers: { "Content-Type": "application/json", "X-From-Mirror": "1" },
+    });
+  });
+}
+
+// Fetch: SWR for directory GETs, network-first with cache fallback otherwise
 self.addEventListener("fetch", (event) => {
+  const url = new URL(event.request.url);
+  // long-lived event streams go straight to the network
+  if (url.pathname === "/api/events") {
+    return;
+  }
+  if (
+    event.request.method !== "GET" &&
+    url.pathname.startsWith("/api/admin/doctors")
+  ) {
+    event.respondWith(writeThrough(event));
+    return;
+  }
+  if (
+    event.request.method === "GET" &&
+    event.request.headers.has("Authorization") &&
+    SWR_PATHS.includes(url.pathname)
+  ) {
+    event.respondWith(staleWhileRevalidate(event));
+    return;
+  }
+  if (event.request.method === "GET" && MIRROR_PATHS.includes(url.pathname)) {
+    event.respondWith(fetch(event.request).catch(() => mirrorResponse()));
+    return;
+  }
+
   event.respondWith(
     fetch(event.request).catch(() => caches.match(event.request))
   );
@@ -6,6 +6,10 @@ const api = axios.create({
   baseURL: import.meta.env.VITE_API_URL || "http://localhost:5000",
 });
 
+// SETUP: Clinic this build serves (slug); login and registration name it so
+// clinics with their own database are found. Empty → the default clinic.
+const CLINIC = import.meta.env.VITE_CLINIC || "";
+
 // PROCESS: Attach JWT token
 api.interceptors.request.use((config) => {
   const token = localStorage.getItem("token");
@@ -15,13 +19,34 @@ api.interceptors.request.use((config) => {
   return config;
 });
 
+// PROCESS: Cursor pagination
+// List endpoints return one page; the cursor for the next page comes back in
+// the X-Next-Cursor header. Pass it as `params.cursor` to fetch the next page.
+export function nextCursor(res) {
+  return res.headers["x-next-cursor"] || null;
+}
+
+// PROCESS: Every page of a list endpoint, for lists a view shows whole (doctor
+// pickers, the doctor table). fetchPage(params) is a list helper below.
+// Returns { data } like axios.
+export async function fetchAllPages(fetchPage, params = {}) {
+  const rows = [];
+  let cursor = null;
+  do {
+    const res = await fetchPage(cursor ? { ...params, cursor } : params);
+    rows.push(...res.data);
+    cursor = nextCursor(res);
+  } while (cursor);
+  return { data: rows };
+}
+
 // OUTPUT: API helpers
 export function apiLogin(username, password) {
-  return api.post("/api/login", { username, password });
+  return api.post("/api/login", CLINIC ? { username, password, clinic: CLINIC } : { username, password });
 }
 
 export function apiRegister(payload) {
-  return api.post("/api/register", payload);
+  return api.post("/api/register", CLINIC ? { ...payload, clinic: CLINIC } : payload);
 }
 
 export function apiGetMe() {
@@ -29,24 +54,65 @@ export function apiGetMe() {
 }
 
 //INIT: Admin Controls
-export function apiAdminListDoctors() {
-  return api.get("/api/admin/doctors");
+export function apiAdminListDoctors(params) {
+  return api.get("/api/admin/doctors", { params });
 }
 
 export function apiAdminSummary() {
   return api.get("/api/admin/summary");
 }
 
-export function apiAdminListPatients() {
-  return api.get("/api/admin/patients");
+export function apiAdminListPatients(params) {
+  return api.get("/api/admin/patients", { params });
+}
+
+export function apiAdminListAppointments(params) {
+  return api.get("/api/admin/appointments", { params });
+}
+
+export function apiListDoctors(params) {
+  return api.get("/api/doctors", { params });
 }
 
-export function apiAdminListAppointments() {
-  return api.get("/api/admin/appointments");
+// params: { q, kinds: "patient,doctor,appointment,treatment", limit, cursor }
+export function apiSearch(params) {
+  return api.get("/api/search", { params });
 }
 
-export function apiListDoctors() {
-  return api.get("/api/doctors");
+// Patient chart: { patient, visits: [{ ..., treatments: [...] }] }, newest first
+// params: { limit, cursor, status, date_from, date_to, doctor_id }
+export function apiPatientHistory(patientId, params) {
+  return api.get(`/api/patients/${patientId}/history`, { params });
+}
+
+// Incremental sync: { reset, users, appointments, removed: { users, appointments },
+// token, more }. Pass the previous token as `since`; see src/mirror.js.
+export function apiSync(since, params) {
+  return api.get("/api/sync", { params: { ...params, since: since || undefined } });
+}
+
+export function apiDepartments() {
+  return api.get("/api/departments");
+}
+
+export function apiDoctorSlots(doctorId, params) {
+  return api.get(`/api/doctors/${doctorId}/slots`, { params });
+}
+
+export function apiDoctorSchedule(doctorId) {
+  return api.get(`/api/doctors/${doctorId}/schedule`);
+}
+
+export function apiSetDoctorSchedule(doctorId, payload) {
+  return api.put(`/api/doctors/${doctorId}/schedule`, payload);
+}
+
+export function apiAddDoctorLeave(doctorId, payload) {
+  return api.post(`/api/doctors/${doctorId}/leave`, payload);
+}
+
+export function apiRemoveDoctorLeave(doctorId, leaveId) {
+  return api.delete(`/api/doctors/${doctorId}/leave/${leaveId}`);
 }
 
 export function apiAdminAddDoctor(payload) {
@@ -65,6 +131,19 @@ export function apiAdminTaskStatus(taskId) {
   return api.get(`/api/admin/tasks/${taskId}`);
 }
 
+export function apiAdminTaskResult(taskId) {
+  return api.get(`/api/admin/tasks/${taskId}/result`, { responseType: "blob" });
+}
+
+export function apiAdminCancelTask(taskId) {
+  return api.post(`/api/admin/tasks/${taskId}/cancel`);
+}
+
+// kind: appointments | patients | treatments, params: { format, ...filters }
+export function apiAdminExport(kind, params) {
+  return api.get(`/api/admin/export/${kind}`, { params, responseType: "blob" });
+}
+
 export async function apiAdminUpdateDoctor(id, payload) {
   console.info("[api] UPDATE doctor", id, payload);
   try {
@@ -77,10 +156,11 @@ export async function apiAdminUpdateDoctor(id, payload) {
   }
 }
 
-export async function apiAdminRemoveDoctor(id) {
+// params: { reassign: 1, dry_run: 1, force: 1, target_doctor_ids, window_days }
+export async function apiAdminRemoveDoctor(id, params) {
   console.info("[api] REMOVE doctor", id);
   try {
-    const res = await api.delete(`/api/admin/doctors/${id}`);
+    const res = await api.delete(`/api/admin/doctors/${id}`, { params });
     console.info("[api] REMOVE res", res.status, res.data);
     return res;
   } catch (err) {
@@ -89,13 +169,18 @@ export async function apiAdminRemoveDoctor(id) {
   }
 }
 
+// payload: { date, target_doctor_ids, window_days, dry_run }
+export function apiAdminReassignAppointments(doctorId, payload) {
+  return api.post(`/api/admin/doctors/${doctorId}/reassign`, payload);
+}
+
 //INIT: Doc & Appt
 export function apiDoctorUpdateAppointment(id, payload) {
   return api.put(`/api/doctor/appointments/${id}`, payload);
 }
 
-export function apiDoctorListAppointments() {
-  return api.get("/api/doctor/appointments");
+export function apiDoctorListAppointments(params) {
+  return api.get("/api/doctor/appointments", { params });
 }
 
 
@@ -104,14 +189,22 @@ export function apiPatientBookAppointment(payload) {
   return api.post("/api/patient/appointments", payload);
 }
 
-export function apiPatientListAppointments() {
-  return api.get("/api/patient/appointments");
+export function apiPatientListAppointments(params) {
+  return api.get("/api/patient/appointments", { params });
 }
 
 export function apiPatientUpdateAppointment(id, payload) {
   return api.put(`/api/patient/appointments/${id}`, payload);
 }
 
+export function apiPatientHoldSlot(payload) {
+  return api.post("/api/patient/slot-holds", payload);
+}
+
+export function apiPatientReleaseHold(id) {
+  return api.delete(`/api/patient/slot-holds/${id}`);
+}
+
 //INIT: Simulation
 export function apiAdminRunSimulationTask() {
   return api.get("/api/admin/run-simulation-task");
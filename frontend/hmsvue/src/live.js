@@ -0,0 +1,68 @@
+// SETUP: Live appointment events (GET /api/events, server-sent events)
+// Read with fetch() rather than EventSource so the JWT travels in the
+// Authorization header instead of the URL. Reconnects after the server ends
+// the stream (every LIVE_MAX_SECONDS) or the network drops, and after the
+// Retry-After delay when the server is at its stream limit (503).
+// VITE_EVENTS_URL points at the event process when no proxy routes /api/events.
+const BASE_URL = import.meta.env.VITE_EVENTS_URL || import.meta.env.VITE_API_URL || "http://localhost:5000";
+const DEFAULT_RETRY_MS = 3000;
+
+// FUNCTION: Parse one SSE frame into { event, data } (null for comments / retry only)
+function parseFrame(frame) {
+  let name = "message";
+  const data = [];
+  for (const line of frame.split("\n")) {
+    if (line.startsWith("event:")) name = line.slice(6).trim();
+    else if (line.startsWith("data:")) data.push(line.slice(5).trim());
+  }
+  return data.length ? { event: name, data: JSON.parse(data.join("\n")) } : null;
+}
+
+// PROCESS: Subscribe; onEvent(name, data) gets "appointment" and "resync" events.
+// Returns a function that closes the stream for good.
+export function subscribeLive(onEvent) {
+  let controller = null;
+  let closed = false;
+
+  async function connect() {
+    while (!closed) {
+      controller = new AbortController();
+      let retryMs = DEFAULT_RETRY_MS;
+      try {
+        const res = await fetch(`${BASE_URL}/api/events`, {
+          headers: { Authorization: `Bearer ${localStorage.getItem("token")}` },
+          signal: controller.signal,
+        });
+        if (res.status === 401 || res.status === 403) return;
+        if (!res.ok) {
+          const seconds = Number(res.headers.get("Retry-After"));
+          if (seconds > 0) retryMs = seconds * 1000;
+          throw new Error(`HTTP ${res.status}`);
+        }
+        const reader = res.body.pipeThrough(new TextDecoderStream()).getReader();
+        let buffer = "";
+        for (;;) {
+          const { value, done } = await reader.read();
+          if (done) break;
+          buffer += value;
+          let end;
+          while ((end = buffer.indexOf("\n\n")) >= 0) {
+            const frame = parseFrame(buffer.slice(0, end));
+            buffer = buffer.slice(end + 2);
+            if (frame && frame.event !== "ready") onEvent(frame.event, frame.data);
+          }
+        }
+      } catch (e) {
+        if (closed) return;
+        console.warn("Live events disconnected", e);
+      }
+      await new Promise((resolve) => setTimeout(resolve, retryMs));
+    }
+  }
+
+  connect();
+  return () => {
+    closed = true;
+    if (controller) controller.abort();
+  };
+}
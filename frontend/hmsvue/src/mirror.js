@@ -0,0 +1,109 @@
+// SETUP: Imports
+import { apiSync, fetchAllPages } from "./api";
+
+// SETUP: Local IndexedDB mirror of what /api/sync returns for the logged-in user.
+// The service worker reads the same database to answer appointment lists offline.
+const DB_NAME = "hms-mirror";
+const DB_VERSION = 1;
+const STORES = ["users", "appointments"];
+const META = "meta";
+
+// FUNCTION: Promise for one IndexedDB request
+function done(request) {
+  return new Promise((resolve, reject) => {
+    request.onsuccess = () => resolve(request.result);
+    request.onerror = () => reject(request.error);
+  });
+}
+
+// FUNCTION: Open (and create on first use) the mirror database
+function openMirror() {
+  if (typeof indexedDB === "undefined") {
+    return Promise.reject(new Error("IndexedDB unavailable"));
+  }
+  const request = indexedDB.open(DB_NAME, DB_VERSION);
+  request.onupgradeneeded = () => {
+    const db = request.result;
+    for (const name of STORES) {
+      db.createObjectStore(name, { keyPath: "id" });
+    }
+    db.createObjectStore(META);
+  };
+  return done(request);
+}
+
+// PROCESS: Apply one sync page in a single transaction (all or nothing)
+function applyPage(db, page) {
+  return new Promise((resolve, reject) => {
+    const tx = db.transaction([...STORES, META], "readwrite");
+    tx.oncomplete = () => resolve();
+    tx.onerror = () => reject(tx.error);
+    for (const name of STORES) {
+      const store = tx.objectStore(name);
+      if (page.reset) store.clear();
+      for (const id of page.removed[name]) store.delete(id);
+      for (const row of page[name]) store.put(row);
+    }
+    tx.objectStore(META).put(page.token, "token");
+  });
+}
+
+// PROCESS: Pull changes since the stored token until the server has no more
+export async function syncMirror() {
+  const db = await openMirror();
+  try {
+    let more = true;
+    while (more) {
+      const token = await done(db.transaction(META).objectStore(META).get("token"));
+      const page = (await apiSync(token)).data;
+      await applyPage(db, page);
+      more = page.more;
+    }
+  } finally {
+    db.close();
+  }
+}
+
+// FUNCTION: Every mirrored row of one store
+async function readAll(name) {
+  const db = await openMirror();
+  try {
+    return await done(db.transaction(name).objectStore(name).getAll());
+  } finally {
+    db.close();
+  }
+}
+
+// FUNCTION: Appointments in listing order (date, time, id)
+function byListingOrder(a, b) {
+  return a.date.localeCompare(b.date) || a.time.localeCompare(b.time) || a.id - b.id;
+}
+
+// OUTPUT: The user's appointments, refreshed from the mirror
+// Falls back to the local copy when offline, and to every page of `fallback`
+// (a list API helper) when there is no usable mirror at all. Returns { data } like axios.
+export async function mirroredAppointments(fallback) {
+  let synced = true;
+  try {
+    await syncMirror();
+  } catch (e) {
+    synced = false;
+    console.warn("Sync failed, using local mirror", e);
+  }
+  try {
+    const rows = await readAll("appointments");
+    if (synced || rows.length) {
+      return { data: rows.sort(byListingOrder) };
+    }
+  } catch (e) {
+    console.warn("Mirror unavailable", e);
+  }
+  return fetchAllPages(fallback);
+}
+
+// PROCESS: Forget the mirror (on login / logout: it belongs to one user)
+export function clearMirror() {
+  if (typeof indexedDB !== "undefined") {
+    indexedDB.deleteDatabase(DB_NAME);
+  }
+}